@@ -0,0 +1,9 @@
+"""
+render-bot va telegram-bot uchun umumiy qismlar
+
+- cache - LRU + TTL kesh, kesh snapshot, SingleFlight
+- ratelimit - token bucket va foydalanuvchi + global cheklovchi
+- update_processor - chat bo'yicha tartibli, chatlar orasida parallel update processor
+- log_pipeline - navbat orqali, JSON, tanlab yoziladigan va maxfiy qiymatlarni yashiradigan loglar
+- avatars - foydalanuvchi avatarlarini fon rejimida aniqlash
+"""
@@ -0,0 +1,159 @@
+"""
+Foydalanuvchi avatarlarini fon rejimida aniqlash (users_cache.telegram_photo_url)
+
+Handlerlar faqat request(user_id) ni chaqiradi - navbatga qo'shish, tarmoqsiz.
+Fon taski navbatni o'z TokenBucket tezligida bo'shatadi: har bir foydalanuvchi
+uchun bitta get_user_profile_photos(limit=1) chaqiruvi. Natija keshda saqlanadi
+va refresh_interval o'tgach qayta tekshiriladi; file_unique_id o'zgarmagan
+bo'lsa, Supabase ga hech narsa yozilmaydi.
+
+Telegram fayl havolalari bot tokenini o'z ichiga oladi va ~1 soatda eskiradi,
+shuning uchun saqlanadigan URL - telegram-avatar Edge Function ga imzolangan
+havola (file_id + HMAC). getFile va rasmni yuklash o'sha funksiyada, rasm
+ko'rilganda bajariladi va brauzer/CDN tomonidan keshlanadi.
+"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import logging
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+from urllib.parse import quote
+
+from telegram.error import RetryAfter, TelegramError
+
+from .cache import TTLCache
+from .ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Kamida shu kenglikdagi eng kichik o'lcham (Telegram: 160, 320, 640)
+MIN_WIDTH = 160
+SIGNATURE_SIZE = 16
+
+ChangeFunc = Callable[[int, Optional[str]], None]
+
+
+def sign_file_id(secret: bytes, file_id: str) -> str:
+    """telegram-avatar Edge Function dagi sign() bilan bir xil"""
+    mac = hmac.new(secret, f"ravon-avatar-v1:{file_id}".encode(), hashlib.sha256).digest()[:SIGNATURE_SIZE]
+    return base64.urlsafe_b64encode(mac).rstrip(b'=').decode()
+
+
+class AvatarResolver:
+    """Avatarlarni navbat orqali, cheklangan tezlikda aniqlash"""
+
+    def __init__(self, proxy_url: str, secret: bytes, on_change: ChangeFunc, rate: float = 2.0,
+                 refresh_interval: float = 86400, failure_retry: float = 600, maxsize: int = 50000,
+                 max_pending: int = 10000):
+        self.proxy_url = proxy_url
+        self.secret = secret
+        self.on_change = on_change
+        self.bucket = TokenBucket(rate, max(1.0, rate))
+        self.refresh_interval = refresh_interval
+        self.failure_retry = failure_retry
+        self.max_pending = max_pending
+        # user_id -> (file_unique_id, url, keyingi tekshiruv vaqti)
+        self.cache = TTLCache(maxsize=maxsize, ttl=refresh_interval * 7)
+        self._pending: OrderedDict = OrderedDict()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.bot = None
+        # Hisoblagichlar
+        self.requested = 0
+        self.resolved = 0
+        self.changed = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def url_for(self, file_id: str) -> str:
+        return f"{self.proxy_url}?f={quote(file_id, safe='')}&s={sign_file_id(self.secret, file_id)}"
+
+    def cached_url(self, user_id: int) -> Optional[str]:
+        """Ma'lum avatar URL i (tarmoqsiz; hali aniqlanmagan bo'lsa - None)"""
+        entry = self.cache.get(user_id)
+        return entry[1] if entry else None
+
+    def request(self, user_id: int) -> None:
+        """Handlerdan: kerak bo'lsa tekshirish uchun navbatga qo'shish"""
+        entry = self.cache.get(user_id)
+        if entry is not None and entry[2] > time.monotonic():
+            return
+        if user_id in self._pending:
+            return
+        self.requested += 1
+        self._pending[user_id] = None
+        while len(self._pending) > self.max_pending:
+            self._pending.popitem(last=False)
+            self.dropped += 1
+        self._wakeup.set()
+
+    def start(self, bot) -> None:
+        """Fon taskini ishga tushirish (post_init da)"""
+        self.bot = bot
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="avatar-resolver")
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        logger.info(f"Avatarlar: {self.stats()}")
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._pending:
+                if not self.bucket.try_acquire():
+                    await asyncio.sleep(self.bucket.retry_after())
+                    continue
+                user_id, _ = self._pending.popitem(last=False)
+                try:
+                    await self._resolve(user_id)
+                except RetryAfter as e:
+                    self._pending[user_id] = None
+                    self._pending.move_to_end(user_id, last=False)
+                    retry_after = e.retry_after
+                    if not isinstance(retry_after, (int, float)):
+                        retry_after = retry_after.total_seconds()
+                    await asyncio.sleep(retry_after)
+                except TelegramError as e:
+                    self.failed += 1
+                    logger.debug(f"Avatar {user_id} aniqlanmadi: {e!r}")
+                    entry = self.cache.get(user_id)
+                    unique_id, url = (entry[0], entry[1]) if entry else (None, None)
+                    self.cache.set(user_id, (unique_id, url, time.monotonic() + self.failure_retry))
+
+    async def _resolve(self, user_id: int) -> None:
+        photos = await self.bot.get_user_profile_photos(user_id, limit=1)
+        if photos.photos:
+            sizes = photos.photos[0]
+            size = next((s for s in sizes if s.width >= MIN_WIDTH), sizes[-1])
+            unique_id, url = size.file_unique_id, self.url_for(size.file_id)
+        else:
+            unique_id, url = None, None
+        self.resolved += 1
+
+        entry = self.cache.get(user_id)
+        self.cache.set(user_id, (unique_id, url, time.monotonic() + self.refresh_interval))
+        # Avatarsiz yangi foydalanuvchi uchun ham yozish kerak emas
+        if (entry[0] if entry is not None else None) == unique_id:
+            return
+        self.changed += 1
+        self.on_change(user_id, url)
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "cached": len(self.cache),
+            "requested": self.requested,
+            "resolved": self.resolved,
+            "changed": self.changed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+        }
@@ -0,0 +1,163 @@
+"""
+Xotiradagi keshlar
+
+TTLCache - hajmi cheklangan LRU kesh, har bir yozuv o'z muddatiga ega.
+Hit/miss hisoblagichlari orqali keshning samaradorligini ko'rish mumkin.
+
+snapshot()/restore() - keshni qayta ishga tushishda saqlab qolish uchun
+(muddatlar devor soati bo'yicha, chunki monotonic jarayonlar orasida o'zgaradi).
+
+SingleFlight - bir xil kalit uchun parallel so'rovlarni bitta so'rovga
+birlashtiradi.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Hajmi cheklangan LRU + TTL kesh"""
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Qiymatni olish (muddati o'tgan bo'lsa - default)"""
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING:
+            self.misses += 1
+            return default
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Qiymatni saqlash (ttl berilmasa - standart muddat)"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        """Yozuvni o'chirish"""
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Barcha yozuvlarni o'chirish"""
+        self._data.clear()
+
+    def items(self) -> list:
+        """Amaldagi yozuvlar: (kalit, qiymat, qolgan soniya), eskidan yangiga"""
+        now = time.monotonic()
+        return [(key, value, expires_at - now) for key, (value, expires_at) in self._data.items() if expires_at > now]
+
+    def stats(self) -> dict:
+        """Kesh statistikasi"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+def save_snapshot(path: str, caches: Dict[str, TTLCache]) -> None:
+    """Keshlarni JSON faylga yozish (kalit va qiymatlar JSON ga mos bo'lishi kerak)"""
+    snapshot = {
+        "saved_at": time.time(),
+        "caches": {name: [[key, value, round(ttl, 1)] for key, value, ttl in cache.items()]
+                   for name, cache in caches.items()},
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(snapshot, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(path: str, caches: Dict[str, TTLCache]) -> Dict[str, int]:
+    """save_snapshot faylidan hali eskirmagan yozuvlarni tiklash
+
+    Natija: kesh nomi -> tiklangan yozuvlar soni. Fayl yo'q yoki buzilgan
+    bo'lsa, keshlar bo'sh qoladi.
+    """
+    try:
+        with open(path) as f:
+            snapshot = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Kesh snapshot {path} o'qilmadi: {e!r}")
+        return {}
+
+    elapsed = max(0.0, time.time() - snapshot.get('saved_at', 0))
+    restored = {}
+    for name, cache in caches.items():
+        count = 0
+        for key, value, ttl in snapshot.get('caches', {}).get(name, []):
+            if ttl > elapsed:
+                cache.set(key, value, ttl=ttl - elapsed)
+                count += 1
+        restored[name] = count
+    return restored
+
+
+class SingleFlight:
+    """Bir kalit uchun bir vaqtda faqat bitta so'rov bajariladi"""
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def run(self, key: Hashable, func: Callable[..., Awaitable[Any]], *args) -> Any:
+        """func(*args) ni bajarish yoki shu kalit uchun ketayotgan so'rovni kutish"""
+        task = self._inflight.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(func(*args))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget_task(key, t))
+        else:
+            self.coalesced += 1
+        # shield - bitta kutuvchi bekor qilinsa, umumiy so'rov to'xtamaydi
+        return await asyncio.shield(task)
+
+    def _forget_task(self, key: Hashable, task: asyncio.Future) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    def forget(self, key: Hashable) -> None:
+        """Ketayotgan so'rovni unutish (keyingi chaqiruv yangi so'rov boshlaydi)"""
+        self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        """So'rovlar statistikasi"""
+        return {
+            "inflight": len(self._inflight),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+        }
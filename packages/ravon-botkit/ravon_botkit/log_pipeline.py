@@ -0,0 +1,211 @@
+"""
+Event loopni bloklamaydigan, strukturali va tanlab yoziladigan loglar
+
+- barcha loggerlar (bot, PTB, httpx) QueueHandler orqali navbatga yozadi;
+  formatlash, maxfiy qiymatlarni yashirish va stderr ga yozish alohida
+  QueueListener oqimida bajariladi. Navbat to'lsa yozuv tashlanadi va
+  hisoblanadi - event loop hech qachon kutmaydi
+- har bir yozuvga joriy update_id (correlation id) qo'shiladi: update
+  processor uni update tasklari kontekstiga o'rnatadi (update_id_var)
+- INFO va undan past yozuvlar chaqiruv joyi (fayl:qator) bo'yicha sekundiga
+  sample_rate tadan oshsa tashlanadi; keyingi o'tgan yozuvda "sampled_out" -
+  shu joydan nechta tashlangani. WARNING va yuqorisi doim yoziladi
+- bot tokeni, JWT, kirish kodlari va berilgan maxfiy qiymatlar "***" ga
+  almashtiriladi (httpx har bir so'rov URL ida tokenni yozadi)
+"""
+
+import atexit
+import copy
+import json
+import logging
+import queue
+import re
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, Sequence, Tuple
+
+from .ratelimit import TokenBucket
+
+REDACTED = '***'
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Joriy update (update processor o'rnatadi, handler ichidagi barcha loglarga qo'shiladi)
+update_id_var: ContextVar[Optional[int]] = ContextVar('update_id', default=None)
+
+_PATTERNS = (
+    # Bot tokeni (api.telegram.org/bot<token>/... URL lari)
+    (re.compile(r'(?<!\d)\d{5,}:[A-Za-z0-9_-]{30,}'), REDACTED),
+    # JWT (Supabase kalitlari, sessiya tokenlari)
+    (re.compile(r'\beyJ[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+'), REDACTED),
+    # Imzolangan kirish kodi (login_codes.format_code)
+    (re.compile(r'\b[0-9A-Z]{5,6}(?:-[0-9A-Z]{5,6}){2,3}\b'), REDACTED),
+    # "code"/"kod" dan keyin shu qatordagi 6 xonali son: "code": "123456", <code>123456</code>
+    (re.compile(r'((?:code|kod)[^\d\n]{1,40}?)\b\d{6}\b', re.IGNORECASE), r'\1' + REDACTED),
+)
+
+
+class Redactor:
+    """Maxfiy qiymatlarni matndan olib tashlash"""
+
+    def __init__(self, secrets: Sequence[str] = ()):
+        # Qisqa qiymatlar (masalan bo'sh yoki test qiymatlari) oddiy so'zlarni buzmasligi uchun
+        self.secrets = sorted({s for s in secrets if s and len(s) >= 8}, key=len, reverse=True)
+
+    def __call__(self, text: str) -> str:
+        for secret in self.secrets:
+            if secret in text:
+                text = text.replace(secret, REDACTED)
+        for pattern, replacement in _PATTERNS:
+            text = pattern.sub(replacement, text)
+        return text
+
+
+class ContextFilter(logging.Filter):
+    """Yozuvga joriy update_id ni qo'shish (log chaqirilgan oqimda)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.update_id = update_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """INFO/DEBUG yozuvlarini chaqiruv joyi bo'yicha cheklash"""
+
+    def __init__(self, rate: float, burst: float):
+        super().__init__()
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        # (fayl, qator) -> (bucket, tashlanganlar)
+        self._sites: Dict[Tuple[str, int], list] = {}
+        self.sampled_out = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.rate <= 0:
+            return True
+        key = (record.pathname, record.lineno)
+        site = self._sites.get(key)
+        if site is None:
+            site = self._sites[key] = [TokenBucket(self.rate, self.burst), 0]
+        if not site[0].try_acquire():
+            site[1] += 1
+            self.sampled_out += 1
+            return False
+        if site[1]:
+            record.sampled_out = site[1]
+            site[1] = 0
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Navbatga put_nowait bilan yozish; formatlash listener oqimida"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Faqat argumentlar matnga aylanadi (ular keyin o'zgarishi mumkin);
+        # exc_info traceback formatlash uchun listenerga o'tadi
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """Bir qatorda bitta JSON yozuv"""
+
+    def __init__(self, redact: Redactor):
+        super().__init__()
+        self.redact = redact
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": self.redact(record.getMessage()),
+        }
+        update_id = getattr(record, 'update_id', None)
+        if update_id is not None:
+            entry["update_id"] = update_id
+        sampled_out = getattr(record, 'sampled_out', None)
+        if sampled_out:
+            entry["sampled_out"] = sampled_out
+        if record.exc_info:
+            entry["exc"] = self.redact(self.formatException(record.exc_info))
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """Lokal ishlash uchun oddiy matn (update_id va yashirish bilan)"""
+
+    def __init__(self, redact: Redactor):
+        super().__init__(TEXT_FORMAT)
+        self.redact = redact
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        update_id = getattr(record, 'update_id', None)
+        if update_id is not None:
+            text += f" [update {update_id}]"
+        sampled_out = getattr(record, 'sampled_out', None)
+        if sampled_out:
+            text += f" (+{sampled_out} tashlandi)"
+        return self.redact(text)
+
+
+class LogPipeline:
+    """Root loggerga ulangan navbat, listener va filtrlar"""
+
+    def __init__(self, handler: NonBlockingQueueHandler, sampler: SamplingFilter, listener: QueueListener):
+        self.handler = handler
+        self.sampler = sampler
+        self.listener = listener
+        self._running = True
+
+    def stop(self) -> None:
+        """Navbatdagi yozuvlarni chiqarib, listener oqimini to'xtatish (takroriy chaqiruv xavfsiz)"""
+        if self._running:
+            self._running = False
+            self.listener.stop()
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.handler.queue.qsize(),
+            "dropped": self.handler.dropped,
+            "sampled_out": self.sampler.sampled_out,
+        }
+
+
+def setup_logging(level: str = 'INFO', fmt: str = 'json', sample_rate: float = 20.0, sample_burst: float = 50.0,
+                  queue_size: int = 10000, secrets: Sequence[str] = ()) -> LogPipeline:
+    """Root loggerni navbat orqali ishlaydigan pipeline ga almashtirish"""
+    redact = Redactor(secrets)
+    output = logging.StreamHandler()
+    output.setFormatter(TextFormatter(redact) if fmt == 'text' else JsonFormatter(redact))
+
+    log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    handler = NonBlockingQueueHandler(log_queue)
+    handler.addFilter(ContextFilter())
+    sampler = SamplingFilter(sample_rate, sample_burst)
+    handler.addFilter(sampler)
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+
+    listener = QueueListener(log_queue, output)
+    listener.start()
+    pipeline = LogPipeline(handler, sampler, listener)
+    atexit.register(pipeline.stop)
+    return pipeline
@@ -0,0 +1,95 @@
+"""
+Token bucket asosidagi so'rovlar cheklovchisi
+
+RateLimiter har bir foydalanuvchi uchun alohida va umumiy (global) bucket
+yuritadi. Foydalanuvchi bucketlari soni cheklangan (LRU) - uzoq vaqt faol
+bo'lmaganlar o'chiriladi va keyingi safar to'la bucket bilan boshlanadi.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Hashable
+
+
+class TokenBucket:
+    """rate - soniyasiga qo'shiladigan tokenlar, capacity - maksimal zaxira"""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, amount: float = 1.0) -> bool:
+        """Token olish (yetarli bo'lmasa - False)"""
+        self._refill(time.monotonic())
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return True
+        return False
+
+    def refund(self, amount: float = 1.0) -> None:
+        """Olingan tokenni qaytarish"""
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def retry_after(self, amount: float = 1.0) -> float:
+        """Keyingi token uchun kutish vaqti (soniya)"""
+        self._refill(time.monotonic())
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate if self.rate > 0 else float('inf')
+
+
+class RateLimiter:
+    """Foydalanuvchi + global token bucket cheklovchisi"""
+
+    def __init__(self, user_rate: float, user_burst: float, global_rate: float, global_burst: float,
+                 max_keys: int = 100000):
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.max_keys = max_keys
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self._buckets: OrderedDict = OrderedDict()
+        self.allowed = 0
+        self.limited_user = 0
+        self.limited_global = 0
+
+    def _bucket(self, key: Hashable) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self.user_rate, self.user_burst)
+            self._buckets[key] = bucket
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def check(self, key: Hashable) -> float:
+        """Ruxsat bo'lsa 0, aks holda necha soniyadan keyin qayta urinish mumkin"""
+        bucket = self._bucket(key)
+        if not bucket.try_acquire():
+            self.limited_user += 1
+            return bucket.retry_after()
+        if not self.global_bucket.try_acquire():
+            # Global limit - foydalanuvchining tokeni qaytariladi
+            bucket.refund()
+            self.limited_global += 1
+            return self.global_bucket.retry_after()
+        self.allowed += 1
+        return 0.0
+
+    def stats(self) -> dict:
+        """Cheklovchi statistikasi"""
+        return {
+            "allowed": self.allowed,
+            "limited_user": self.limited_user,
+            "limited_global": self.limited_global,
+            "tracked_users": len(self._buckets),
+        }
@@ -0,0 +1,200 @@
+"""
+Updatelarni parallel, lekin har bir chat ichida tartib bilan qayta ishlash
+
+Turli chatlarning updatelari bir vaqtda (ko'pi bilan `workers` ta) ishlanadi,
+bitta chatdagi updatelar esa kelgan tartibida ketma-ket bajariladi - masalan,
+ikki marta bosilgan "Tekshirish" tugmasi o'zi bilan poyga qilmaydi.
+
+Chatida navbat kutayotgan update ishchi o'rnini band qilmaydi: avval chat
+navbati, keyin ishchi semafori olinadi.
+
+Update process_update ga kirgan paytdan (bazaviy semafor yoki chat navbatini
+kutayotganda ham) kuzatiladi. To'xtashda (drain.py) wait_idle() barcha updatelar
+tugashini muddat bilan kutadi, abandon() esa qolganlarini bekor qiladi.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set, Tuple
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from .log_pipeline import update_id_var
+
+logger = logging.getLogger(__name__)
+
+
+def ordering_key(update: object) -> Optional[Hashable]:
+    """Tartib saqlanadigan kalit: chat, bo'lmasa foydalanuvchi
+
+    Kanal a'zoligi updatelari foydalanuvchi bo'yicha tartiblanadi - aks holda
+    kanalga bir vaqtda qo'shilganlarning barchasi bitta navbatga tushadi.
+    """
+    if isinstance(update, Update):
+        if update.chat_member is not None and update.effective_user is not None:
+            return update.effective_user.id
+        if update.effective_chat is not None:
+            return update.effective_chat.id
+        if update.effective_user is not None:
+            return update.effective_user.id
+    return None
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Chat bo'yicha tartibli, chatlar orasida parallel update processor
+
+    on_arrival(update) - update kelishi bilan (navbatlardan oldin) sinxron chaqiriladi,
+    masalan render-bot dagi recorder.UpdateRecorder.record.
+    """
+
+    def __init__(self, workers: int = 64, max_pending: int = 10000,
+                 on_arrival: Optional[Callable[[object], None]] = None):
+        # Bazaviy semafor faqat kutayotgan updatelar sonini cheklaydi,
+        # haqiqiy parallellik - self._workers
+        super().__init__(max_concurrent_updates=max_pending)
+        self.workers = workers
+        self.on_arrival = on_arrival
+        self._workers = asyncio.Semaphore(workers)
+        # chat -> shu chatdagi oxirgi updatening tugash signali
+        self._tails: Dict[Hashable, asyncio.Future] = {}
+        self._depth: Dict[Hashable, int] = {}
+        # Qabul qilingan (semafor/navbat kutayotgan yoki ishlanayotgan) updatelarning tasklari -> update
+        self._tasks: Dict[asyncio.Task, object] = {}
+        self._running: Set[asyncio.Task] = set()
+        # Gauge va hisoblagichlar
+        self.pending = 0
+        self.active = 0
+        self.processed = 0
+        self.last_update_id: Optional[int] = None
+        self.max_chat_depth = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    async def initialize(self) -> None:
+        """Boshlang'ich holat"""
+
+    async def shutdown(self) -> None:
+        """Yakuniy statistika"""
+        logger.info(f"Update processor: {self.stats()}")
+
+    async def process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        """Updateni bazaviy semafordan oldin ro'yxatga olib, bajarish"""
+        task = asyncio.current_task()
+        self._tasks[task] = update
+        try:
+            await super().process_update(update, coroutine)
+        finally:
+            self._tasks.pop(task, None)
+            if asyncio.iscoroutine(coroutine):
+                # Semaforni kutayotganda bekor qilingan bo'lsa (bajarilgani uchun ta'sirsiz)
+                coroutine.close()
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        """Chat navbatini, keyin ishchi o'rnini kutib, updateni bajarish"""
+        if self.on_arrival is not None:
+            self.on_arrival(update)
+        key = ordering_key(update)
+        arrived = time.monotonic()
+        self.pending += 1
+        if isinstance(update, Update):
+            self.last_update_id = max(self.last_update_id or 0, update.update_id)
+            # Har bir update o'z taskida - handler ichidagi barcha loglarga qo'shiladi
+            update_id_var.set(update.update_id)
+        task = asyncio.current_task()
+
+        previous = None
+        done = None
+        if key is not None:
+            previous = self._tails.get(key)
+            done = asyncio.get_running_loop().create_future()
+            self._tails[key] = done
+            depth = self._depth.get(key, 0) + 1
+            self._depth[key] = depth
+            self.max_chat_depth = max(self.max_chat_depth, depth)
+
+        started = False
+        try:
+            if previous is not None:
+                await asyncio.shield(previous)
+            async with self._workers:
+                started = True
+                waited = time.monotonic() - arrived
+                self.wait_time_total += waited
+                self.wait_time_max = max(self.wait_time_max, waited)
+                self.pending -= 1
+                self.active += 1
+                self._running.add(task)
+                try:
+                    await coroutine
+                finally:
+                    self._running.discard(task)
+                    self.active -= 1
+                    self.processed += 1
+        finally:
+            if not started:
+                self.pending -= 1
+                if asyncio.iscoroutine(coroutine):
+                    coroutine.close()
+            if done is not None:
+                if previous is not None and not previous.done():
+                    # Bekor qilingan update navbatni buzmasligi uchun oldingisini kutadi
+                    previous.add_done_callback(lambda _: done.set_result(None))
+                else:
+                    done.set_result(None)
+                depth = self._depth[key] - 1
+                if depth:
+                    self._depth[key] = depth
+                else:
+                    del self._depth[key]
+                if self._tails.get(key) is done:
+                    del self._tails[key]
+
+    async def wait_idle(self, update_queue: asyncio.Queue, timeout: float,
+                        cancel: Optional[asyncio.Event] = None) -> bool:
+        """update_queue dagi va qabul qilingan barcha updatelar tugashini kutish
+
+        update_queue.join() navbatdan olinib, hali process_update ga yetmagan
+        updatelarni ham qamrab oladi. False - timeout o'tdi yoki cancel o'rnatildi,
+        updatelar hali qolgan.
+        """
+        deadline = time.monotonic() + timeout
+        joined = asyncio.ensure_future(update_queue.join())
+        try:
+            while not joined.done() or update_queue.qsize() or self._tasks:
+                if time.monotonic() >= deadline or (cancel is not None and cancel.is_set()):
+                    return False
+                await asyncio.wait((joined,), timeout=0.05)
+        finally:
+            joined.cancel()
+        return True
+
+    def abandon(self) -> Tuple[int, int]:
+        """Qolgan updatelarni bekor qilish: (ishlanayotgan, navbatda kutgan) soni"""
+        running = waiting = 0
+        update_ids = []
+        for task, update in list(self._tasks.items()):
+            if task in self._running:
+                running += 1
+            else:
+                waiting += 1
+            update_ids.append(getattr(update, 'update_id', None))
+            task.cancel()
+        if update_ids:
+            more = f" va yana {len(update_ids) - 20} ta" if len(update_ids) > 20 else ""
+            logger.warning(f"Tugallanmagan updatelar bekor qilindi: {update_ids[:20]}{more}")
+        return running, waiting
+
+    def stats(self) -> dict:
+        """Navbat chuqurligi va kutish vaqti"""
+        return {
+            "workers": self.workers,
+            "active": self.active,
+            "pending": self.pending,
+            "chats_queued": len(self._tails),
+            "max_chat_depth": self.max_chat_depth,
+            "processed": self.processed,
+            "wait_avg": round(self.wait_time_total / self.processed, 4) if self.processed else 0.0,
+            "wait_max": round(self.wait_time_max, 4),
+        }
@@ -0,0 +1,228 @@
+"""
+Write-behind navbat - yozuvlarni to'plab, bitta so'rov bilan yuborish
+
+Bir kalit bo'yicha takroriy yozuvlar birlashtiriladi (oxirgisi qoladi).
+Navbat `max_batch` ga yetganda yoki har `interval` soniyada flush qilinadi.
+Flush muvaffaqiyatsiz bo'lsa, yozuvlar navbatga qaytariladi (yangiroqlari
+ustidan yozilmaydi) va keyingi safar qayta yuboriladi.
+
+`journal` berilsa, navbat qayta ishga tushishlardan omon qoladi: yozuvlar
+`journal_interval` soniya to'planib JSON qatorlari sifatida faylga qo'shiladi,
+muvaffaqiyatli flushdan keyin fayl qolgan yozuvlar bilan qayta yoziladi,
+start() da esa navbatga tiklanadi. Fayl bilan ishlash asyncio.to_thread da -
+add() event loopni diskka kutdirmaydi (jarayon keskin o'lsa oxirgi
+`journal_interval` dagi yozuvlar yo'qolishi mumkin).
+"""
+
+import asyncio
+import json
+import logging
+import os
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+FlushFunc = Callable[[List[Any]], Awaitable[bool]]
+
+
+class BatchWriter:
+    """Kalit bo'yicha birlashtiruvchi write-behind navbat"""
+
+    def __init__(self, name: str, flush: FlushFunc, max_batch: int = 500, interval: float = 5.0,
+                 max_pending: int = 50000, journal: Optional[str] = None, journal_interval: float = 0.5):
+        self.name = name
+        self._flush_func = flush
+        self.max_batch = max_batch
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending: OrderedDict = OrderedDict()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self.journal = journal
+        self.journal_interval = journal_interval
+        self._journal_file = None
+        # Hali faylga yozilmagan (kalit, yozuv) lar
+        self._journal_buffer: List[Tuple[Hashable, Any]] = []
+        self._journal_wakeup = asyncio.Event()
+        self._journal_lock = asyncio.Lock()
+        self._journal_task: Optional[asyncio.Task] = None
+        # Hisoblagichlar
+        self.added = 0
+        self.coalesced = 0
+        self.flushes = 0
+        self.written = 0
+        self.failures = 0
+        self.dropped = 0
+
+    def add(self, key: Hashable, item: Any) -> None:
+        """Yozuvni navbatga qo'shish (shu kalitdagi eskisi almashtiriladi)"""
+        self.added += 1
+        if key in self._pending:
+            self.coalesced += 1
+            self._pending.move_to_end(key)
+        self._pending[key] = item
+        while len(self._pending) > self.max_pending:
+            self._pending.popitem(last=False)
+            self.dropped += 1
+        if self._journal_file is not None:
+            self._journal_buffer.append((key, item))
+            self._journal_wakeup.set()
+        if len(self._pending) >= self.max_batch:
+            self._wakeup.set()
+
+    # ---------- jurnal ----------
+
+    @staticmethod
+    def _encode(key: Hashable, item: Any) -> str:
+        return json.dumps([key, item], ensure_ascii=False, separators=(',', ':')) + '\n'
+
+    def _append(self, entries: List[Tuple[Hashable, Any]]) -> None:
+        """Yozuvlarni jurnal oxiriga qo'shish (to_thread da)"""
+        try:
+            self._journal_file.write(''.join(self._encode(key, item) for key, item in entries))
+            self._journal_file.flush()
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"{self.name}: jurnalga yozib bo'lmadi: {e!r}")
+
+    async def _sync_journal(self, rewrite: bool = False) -> None:
+        """To'plangan yozuvlarni qo'shish yoki jurnalni navbat bilan almashtirish"""
+        async with self._journal_lock:
+            if self._journal_file is None:
+                return
+            if rewrite:
+                # Navbat nusxasi buferdagi yozuvlarni ham o'z ichiga oladi
+                entries, self._journal_buffer = list(self._pending.items()), []
+                await asyncio.to_thread(self._rewrite_journal, entries)
+            elif self._journal_buffer:
+                entries, self._journal_buffer = self._journal_buffer, []
+                await asyncio.to_thread(self._append, entries)
+
+    async def _journal_loop(self) -> None:
+        while True:
+            await self._journal_wakeup.wait()
+            await asyncio.sleep(self.journal_interval)
+            self._journal_wakeup.clear()
+            await self._sync_journal()
+
+    def _restore(self) -> None:
+        """Oldingi ishga tushirishdan qolgan yozuvlarni navbatga qaytarish"""
+        restored = 0
+        try:
+            with open(self.journal, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        key, item = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._pending[key] = item
+                    restored += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"{self.name}: jurnalni o'qib bo'lmadi: {e!r}")
+        if restored:
+            logger.info(f"{self.name}: jurnaldan {len(self._pending)} ta yozuv tiklandi")
+        self._rewrite_journal(list(self._pending.items()))
+
+    def _rewrite_journal(self, entries: List[Tuple[Hashable, Any]]) -> None:
+        """Jurnalni berilgan yozuvlar bilan almashtirish (atomik; to_thread da yoki ishga tushishda)"""
+        if self._journal_file is not None:
+            self._journal_file.close()
+        tmp_path = f"{self.journal}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(''.join(self._encode(key, item) for key, item in entries))
+            os.replace(tmp_path, self.journal)
+        except (OSError, TypeError, ValueError) as e:
+            logger.error(f"{self.name}: jurnalni yangilab bo'lmadi: {e!r}")
+        self._journal_file = open(self.journal, 'a', encoding='utf-8')
+
+    def start(self) -> None:
+        """Fon flush taskini ishga tushirish"""
+        if self.journal is not None and self._journal_file is None:
+            self._restore()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name=f"batch-writer-{self.name}")
+        if self._journal_file is not None and self._journal_task is None:
+            self._journal_task = asyncio.create_task(self._journal_loop(), name=f"batch-journal-{self.name}")
+
+    async def close(self) -> None:
+        """Taskni to'xtatib, qolgan yozuvlarni yuborish"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._journal_task is not None:
+            # Fayl yozilayotgan paytda emas - lock ushlanganda bekor qilinadi
+            async with self._journal_lock:
+                self._journal_task.cancel()
+            await asyncio.gather(self._journal_task, return_exceptions=True)
+            self._journal_task = None
+        while self._pending:
+            if not await self.flush():
+                logger.warning(f"{self.name}: {len(self._pending)} ta yozuv yuborilmay qoldi")
+                break
+        if self._journal_file is not None:
+            await self._sync_journal(rewrite=True)
+            self._journal_file.close()
+            self._journal_file = None
+        logger.info(f"{self.name}: {self.stats()}")
+
+    async def _run(self) -> None:
+        while True:
+            # wait_for emas: event bilan bir vaqtda kelgan cancel() unda yutilib
+            # qoladi va close() yana `interval` kutadi
+            wakeup = asyncio.ensure_future(self._wakeup.wait())
+            try:
+                await asyncio.wait((wakeup,), timeout=self.interval)
+            finally:
+                wakeup.cancel()
+            self._wakeup.clear()
+            while self._pending:
+                if not await self.flush() or len(self._pending) < self.max_batch:
+                    break
+
+    async def flush(self) -> bool:
+        """Navbatdan bitta paketni yuborish"""
+        async with self._lock:
+            if not self._pending:
+                return True
+            batch = OrderedDict()
+            while self._pending and len(batch) < self.max_batch:
+                key, item = self._pending.popitem(last=False)
+                batch[key] = item
+
+            try:
+                ok = await self._flush_func(list(batch.values()))
+            except Exception as e:
+                logger.error(f"{self.name}: flush xatosi: {e!r}")
+                ok = False
+
+            self.flushes += 1
+            if ok:
+                self.written += len(batch)
+                if self._journal_file is not None:
+                    await self._sync_journal(rewrite=True)
+                return True
+
+            self.failures += 1
+            # Muvaffaqiyatsiz paket navbat boshiga qaytadi, yangiroq yozuvlar saqlanadi
+            for key, item in reversed(batch.items()):
+                if key not in self._pending:
+                    self._pending[key] = item
+                    self._pending.move_to_end(key, last=False)
+            return False
+
+    def stats(self) -> dict:
+        """Navbat statistikasi"""
+        return {
+            "pending": len(self._pending),
+            "added": self.added,
+            "coalesced": self.coalesced,
+            "flushes": self.flushes,
+            "written": self.written,
+            "failures": self.failures,
+            "dropped": self.dropped,
+        }
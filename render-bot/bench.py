@@ -0,0 +1,504 @@
+"""
+Yuk sinovi (benchmark): render-bot va telegram-bot ni bir xil sharoitda solishtirish
+
+Lokal fake Telegram Bot API (fake_telegram.py) va fake Supabase Edge Function lar
+(telegram-auth, check-user-role) ko'tariladi, bot alohida jarayonda ularga
+ulangan holda ishga tushiriladi va berilgan tezlikda (updatelar/s) /start, /help,
+/code va tugma bosish aralashmasi yuboriladi. Har bir update uchun kechikish -
+update navbatga qo'yilgandan bot javobi (sendMessage / editMessageText) kelguncha.
+
+Natija: o'tkazuvchanlik, p50/p95/p99 kechikish, javobsiz qolganlar, bot
+jarayonining maksimal RSS xotirasi va CPU vaqti.
+
+Ishlatish:
+    python bench.py --bot render --rate 200 --duration 30
+    python bench.py --bot both --rate 200 --duration 30 --json bench.json
+    python bench.py --bot render --transport webhook --mix start=30,menu=30,profile=40
+    python bench.py --bot both --baseline bench.json --max-regression 0.2   # CI uchun
+
+--baseline berilsa, o'tkazuvchanlik yoki p95 berilgan ulushdan ko'proq
+yomonlashgan bo'lsa, skript 1 kodi bilan tugaydi.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import resource
+import signal
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict, deque
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+from aiohttp import web
+
+from fake_telegram import FakeTelegram
+
+logger = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BOTS = {
+    'render': os.path.join(ROOT, 'render-bot'),
+    'telegram': os.path.join(ROOT, 'telegram-bot'),
+}
+
+# Amal -> (update turi, matn yoki callback_data). menu va profile faqat render-bot da bor
+ACTIONS = {
+    'start': ('message', '/start'),
+    'referral': ('message', '/start ref_42'),
+    'help': ('message', '/help'),
+    'code': ('message', '/code'),
+    'menu': ('message', '/menu'),
+    'check': ('callback', 'check_membership'),
+    'profile': ('callback', 'menu:profile'),
+}
+# Update turi -> bot ishini tugatganini bildiruvchi javob metodi
+REPLY_METHODS = {'message': 'sendmessage', 'callback': 'editmessagetext'}
+DEFAULT_MIX = 'start=40,help=20,code=10,check=30'
+
+# Cheklovchilar botni emas, benchmarkni o'lchab qo'ymasligi uchun (--production-limits bilan o'chadi)
+UNLIMITED_ENV = {
+    'AUTH_USER_RATE_PER_MIN': '1000000',
+    'AUTH_USER_BURST': '1000000',
+    'AUTH_GLOBAL_RATE_PER_SEC': '1000000',
+    'AUTH_GLOBAL_BURST': '1000000',
+    'SEND_GLOBAL_RATE': '1000000',
+    'SEND_PRIVATE_CHAT_RATE': '1000',
+    'SEND_PRIVATE_CHAT_BURST': '1000',
+}
+
+
+# ==================== FAKE SUPABASE ====================
+
+class FakeSupabase:
+    """telegram-auth va check-user-role Edge Function larining soxta javoblari"""
+
+    def __init__(self, latency: float = 0.05, jitter: float = 0.5, role: str = 'user'):
+        self.latency = latency
+        self.jitter = jitter
+        self.role = role
+        self.calls = Counter()
+
+    async def _sleep(self) -> None:
+        if self.latency:
+            await asyncio.sleep(self.latency * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    async def handle(self, request: web.Request) -> web.Response:
+        endpoint = request.match_info['endpoint']
+        try:
+            body = await request.json()
+        except ValueError:
+            body = {}
+        action = body.get('action', '')
+        self.calls[f"{endpoint}:{action}" if action else endpoint] += 1
+        await self._sleep()
+
+        if endpoint == 'check-user-role':
+            return web.json_response({"role": self.role})
+        if endpoint != 'telegram-auth':
+            return web.json_response({"error": "Not found"}, status=404)
+        if action == 'generate':
+            expires_at = datetime.now(timezone.utc) + timedelta(minutes=5)
+            return web.json_response({
+                "success": True,
+                "code": f"{random.randint(0, 999999):06d}",
+                "expires_at": expires_at.isoformat(),
+            })
+        if action == 'sync_profiles':
+            return web.json_response({"success": True, "count": len(body.get('profiles', []))})
+        if action == 'sync_avatars':
+            return web.json_response({"success": True, "upserted": len(body.get('avatars', []))})
+        if action == 'record_referrals':
+            referrals = body.get('referrals', [])
+            return web.json_response({"success": True, "inserted": len(referrals), "received": len(referrals)})
+        if action == 'list_users':
+            return web.json_response({"success": True, "users": [], "total": 0})
+        return web.json_response({"error": "Invalid action"}, status=400)
+
+    async def handle_preflight(self, request: web.Request) -> web.Response:
+        self.calls[f"{request.match_info['endpoint']}:preflight"] += 1
+        await self._sleep()
+        return web.Response()
+
+    def build_web_app(self) -> web.Application:
+        web_app = web.Application()
+        web_app.router.add_post('/functions/v1/{endpoint}', self.handle)
+        web_app.router.add_route('OPTIONS', '/functions/v1/{endpoint}', self.handle_preflight)
+        return web_app
+
+
+# ==================== YUK VA O'LCHOV ====================
+
+def parse_mix(mix: str) -> Tuple[List[str], List[float]]:
+    """"start=40,help=20" -> (amallar, og'irliklar)"""
+    actions, weights = [], []
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ACTIONS:
+            raise ValueError(f"Noma'lum amal: {name} (mavjud: {', '.join(ACTIONS)})")
+        actions.append(name)
+        weights.append(float(weight or 1))
+    return actions, weights
+
+
+def make_update(kind: str, payload: str, user_id: int, message_id: int) -> dict:
+    """Shaxsiy chatdan xabar yoki tugma bosish updatei (update_id siz)"""
+    user = {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": f"user{user_id}"}
+    chat = {"id": user_id, "type": "private"}
+    if kind == 'message':
+        return {"message": {
+            "message_id": message_id, "date": int(time.time()), "chat": chat, "from": user, "text": payload,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(payload.split()[0])}],
+        }}
+    return {"callback_query": {
+        "id": str(message_id), "chat_instance": str(user_id), "from": user, "data": payload,
+        "message": {"message_id": message_id, "date": int(time.time()), "chat": chat, "text": "..."},
+    }}
+
+
+class LatencyTracker:
+    """Har bir chat uchun javob kutilayotgan updatelar (botlar bitta chatni ketma-ket ishlaydi)"""
+
+    def __init__(self):
+        self.pending: Dict[int, deque] = defaultdict(deque)
+        self.samples: List[float] = []
+        self.unmatched = 0
+
+    def sent(self, chat_id: int, kind: str) -> None:
+        self.pending[chat_id].append((time.perf_counter(), REPLY_METHODS[kind]))
+
+    def on_call(self, method: str, params: dict) -> None:
+        method = method.lower()
+        if method not in ('sendmessage', 'editmessagetext'):
+            return
+        try:
+            chat_id = int(params.get('chat_id') or 0)
+        except (TypeError, ValueError):
+            return
+        queue = self.pending.get(chat_id)
+        if not queue or queue[0][1] != method:
+            self.unmatched += 1
+            return
+        started, _ = queue.popleft()
+        self.samples.append(time.perf_counter() - started)
+        if not queue:
+            del self.pending[chat_id]
+
+    @property
+    def outstanding(self) -> int:
+        return sum(len(queue) for queue in self.pending.values())
+
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(q * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class ProcessSampler:
+    """Bot jarayonining RSS va CPU vaqtini /proc dan o'qish (faqat Linux)"""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.rss_peak = 0
+        self.cpu_start = self._cpu()
+
+    def _cpu(self) -> Optional[float]:
+        try:
+            with open(f'/proc/{self.pid}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+        except (OSError, IndexError, ValueError):
+            return None
+
+    def sample(self) -> None:
+        try:
+            with open(f'/proc/{self.pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        self.rss_peak = max(self.rss_peak, int(line.split()[1]) * 1024)
+                        break
+        except OSError:
+            pass
+
+    def cpu_seconds(self) -> Optional[float]:
+        now = self._cpu()
+        if now is None or self.cpu_start is None:
+            return None
+        return round(now - self.cpu_start, 2)
+
+
+# ==================== BOT JARAYONI ====================
+
+def bot_env(args: argparse.Namespace, telegram_url: str, supabase_url: str, state_dir: str) -> dict:
+    env = dict(os.environ)
+    env.update({
+        'TELEGRAM_BOT_TOKEN': '123456:BENCHMARK',
+        'TELEGRAM_API_BASE_URL': telegram_url,
+        'SUPABASE_URL': supabase_url,
+        'SUPABASE_ANON_KEY': 'benchmark',
+        'BOT_SYNC_SECRET': 'benchmark',
+        'AVATAR_SECRET': 'benchmark',
+        'BROADCAST_STATE_FILE': os.path.join(state_dir, 'broadcast_state.json'),
+        'STATE_DB_FILE': os.path.join(state_dir, 'bot_state.sqlite3'),
+        'CACHE_SNAPSHOT_FILE': os.path.join(state_dir, 'cache_snapshot.json'),
+        'REFERRAL_QUEUE_FILE': os.path.join(state_dir, 'referral_queue.jsonl'),
+        'PYTHONUNBUFFERED': '1',
+    })
+    if not args.production_limits:
+        env.update(UNLIMITED_ENV)
+    if args.transport == 'webhook':
+        env.update({
+            'BOT_MODE': 'webhook',
+            'WEBHOOK_URL': f"http://127.0.0.1:{args.webhook_port}",
+            'WEBHOOK_LISTEN': '127.0.0.1',
+            'PORT': str(args.webhook_port),
+        })
+    else:
+        env['BOT_MODE'] = 'polling'
+    return env
+
+
+async def stop_process(process: asyncio.subprocess.Process, timeout: float = 15.0) -> None:
+    if process.returncode is not None:
+        return
+    process.send_signal(signal.SIGINT)
+    try:
+        await asyncio.wait_for(process.wait(), timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+
+
+async def run_bot(name: str, args: argparse.Namespace) -> dict:
+    """Bitta botni ko'tarib, yuk berish va natijani qaytarish"""
+    random.seed(args.seed)
+    fake = FakeTelegram(member_status='member', latency=args.telegram_latency)
+    supabase = FakeSupabase(latency=args.supabase_latency)
+    tracker = LatencyTracker()
+    fake.on_call = tracker.on_call
+
+    runners = []
+    for web_app, port in ((fake.build_web_app(), args.telegram_port), (supabase.build_web_app(), args.supabase_port)):
+        runner = web.AppRunner(web_app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, '127.0.0.1', port, backlog=2048).start()
+        runners.append(runner)
+
+    state_dir = tempfile.mkdtemp(prefix=f'bench-{name}-')
+    log_path = os.path.join(state_dir, 'bot.log')
+    log_file = open(log_path, 'wb')
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, 'bot.py',
+        cwd=BOTS[name],
+        env=bot_env(args, f"http://127.0.0.1:{args.telegram_port}",
+                    f"http://127.0.0.1:{args.supabase_port}", state_dir),
+        stdout=log_file, stderr=asyncio.subprocess.STDOUT,
+    )
+    sampler = ProcessSampler(process.pid)
+    harness_cpu_start = _own_cpu()
+    session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=args.webhook_concurrency))
+    webhook_errors = 0
+    try:
+        ready = fake.webhook_ready if args.transport == 'webhook' else fake.polling_ready
+        await asyncio.wait_for(ready.wait(), args.startup_timeout)
+        await asyncio.sleep(0.5)
+
+        actions, weights = parse_mix(args.mix)
+        total = int(args.rate * args.duration)
+        headers = {'X-Telegram-Bot-Api-Secret-Token': fake.secret_token}
+        posts = set()
+
+        async def post(update: dict) -> None:
+            nonlocal webhook_errors
+            try:
+                async with session.post(fake.webhook_url, json=update, headers=headers) as response:
+                    if response.status != 200:
+                        webhook_errors += 1
+            except aiohttp.ClientError:
+                webhook_errors += 1
+
+        started = time.perf_counter()
+        next_sample = started
+        for i in range(total):
+            delay = started + i / args.rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if time.perf_counter() >= next_sample:
+                sampler.sample()
+                next_sample += 0.5
+            user_id = 100000 + random.randrange(args.users)
+            kind, payload = ACTIONS[random.choices(actions, weights)[0]]
+            update = make_update(kind, payload, user_id, i + 1)
+            tracker.sent(user_id, kind)
+            if args.transport == 'webhook':
+                task = asyncio.create_task(post(dict(update, update_id=fake.next_update_id())))
+                posts.add(task)
+                task.add_done_callback(posts.discard)
+            else:
+                fake.push_update(update)
+        send_seconds = time.perf_counter() - started
+
+        deadline = time.perf_counter() + args.drain
+        while tracker.outstanding and time.perf_counter() < deadline:
+            sampler.sample()
+            await asyncio.sleep(0.1)
+        if posts:
+            await asyncio.gather(*posts, return_exceptions=True)
+        elapsed = time.perf_counter() - started
+        sampler.sample()
+        cpu_seconds = sampler.cpu_seconds()
+        harness_cpu = round(_own_cpu() - harness_cpu_start, 2)
+    finally:
+        await session.close()
+        await stop_process(process)
+        log_file.close()
+        for runner in runners:
+            await runner.cleanup()
+
+    samples = sorted(tracker.samples)
+    completed = len(samples)
+    return {
+        "bot": name,
+        "transport": args.transport,
+        "rate": args.rate,
+        "sent": total,
+        "completed": completed,
+        "unanswered": tracker.outstanding,
+        "unmatched": tracker.unmatched,
+        "webhook_errors": webhook_errors,
+        "send_seconds": round(send_seconds, 2),
+        "throughput": round(completed / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": _ms(percentile(samples, 0.50)),
+        "p95_ms": _ms(percentile(samples, 0.95)),
+        "p99_ms": _ms(percentile(samples, 0.99)),
+        "max_ms": _ms(samples[-1] if samples else None),
+        "rss_peak_mb": round(sampler.rss_peak / 1048576, 1) if sampler.rss_peak else None,
+        "cpu_seconds": cpu_seconds,
+        # Bot bilan bir mashinada - yig'indisi (yadrolar x vaqt) ga yaqin bo'lsa, natija CPU bilan cheklangan
+        "harness_cpu_seconds": harness_cpu,
+        "elapsed_seconds": round(elapsed, 2),
+        "telegram_calls": dict(fake.calls),
+        "supabase_calls": dict(supabase.calls),
+        "log": log_path,
+    }
+
+
+def _own_cpu() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _ms(value: Optional[float]) -> Optional[float]:
+    return round(value * 1000, 1) if value is not None else None
+
+
+# ==================== HISOBOT ====================
+
+REPORT_ROWS = (
+    ('sent', "Yuborildi"),
+    ('completed', "Javob olindi"),
+    ('unanswered', "Javobsiz"),
+    ('webhook_errors', "Webhook xatolari"),
+    ('throughput', "O'tkazuvchanlik (upd/s)"),
+    ('p50_ms', "p50 (ms)"),
+    ('p95_ms', "p95 (ms)"),
+    ('p99_ms', "p99 (ms)"),
+    ('max_ms', "max (ms)"),
+    ('rss_peak_mb', "RSS max (MB)"),
+    ('cpu_seconds', "CPU (s)"),
+    ('harness_cpu_seconds', "Benchmark CPU (s)"),
+    ('elapsed_seconds', "Vaqt (s)"),
+)
+
+
+def print_report(results: List[dict]) -> None:
+    width = max(len(label) for _, label in REPORT_ROWS) + 2
+    print()
+    print("".ljust(width) + "".join(f"{r['bot']}-bot".rjust(16) for r in results))
+    for key, label in REPORT_ROWS:
+        print(label.ljust(width) + "".join(str(r.get(key)).rjust(16) for r in results))
+    cores = os.cpu_count() or 1
+    for r in results:
+        print(f"\n{r['bot']}-bot log: {r['log']}")
+        if r['cpu_seconds'] is not None and r['cpu_seconds'] + r['harness_cpu_seconds'] > 0.8 * cores * r['elapsed_seconds']:
+            print(f"⚠️  {r['bot']}-bot: CPU to'yingan ({cores} yadro) - natija mashina bilan cheklangan, tezlikni kamaytiring")
+
+
+def check_regressions(results: List[dict], baseline_path: str, max_regression: float) -> List[str]:
+    """Baseline ga nisbatan yomonlashuvlar ro'yxati"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {r['bot']: r for r in json.load(f)}
+    problems = []
+    for result in results:
+        base = baseline.get(result['bot'])
+        if base is None:
+            continue
+        if base.get('throughput') and result['throughput'] < base['throughput'] * (1 - max_regression):
+            problems.append(f"{result['bot']}: throughput {base['throughput']} -> {result['throughput']}")
+        if base.get('p95_ms') and result['p95_ms'] and result['p95_ms'] > base['p95_ms'] * (1 + max_regression):
+            problems.append(f"{result['bot']}: p95 {base['p95_ms']}ms -> {result['p95_ms']}ms")
+        if result['unanswered'] > base.get('unanswered', 0):
+            problems.append(f"{result['bot']}: javobsiz {base.get('unanswered', 0)} -> {result['unanswered']}")
+    return problems
+
+
+async def main(args: argparse.Namespace) -> int:
+    names = list(BOTS) if args.bot == 'both' else [args.bot]
+    if args.transport == 'webhook' and 'telegram' in names:
+        logger.error("telegram-bot faqat polling rejimida ishlaydi")
+        return 2
+    parse_mix(args.mix)
+
+    results = []
+    for name in names:
+        logger.info(f"{name}-bot: {args.rate} upd/s x {args.duration}s, {args.users} foydalanuvchi, mix={args.mix}")
+        results.append(await run_bot(name, args))
+    print_report(results)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    if args.baseline:
+        problems = check_regressions(results, args.baseline, args.max_regression)
+        for problem in problems:
+            logger.error(f"Regressiya: {problem}")
+        if problems:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    parser = argparse.ArgumentParser(description="render-bot / telegram-bot yuk sinovi")
+    parser.add_argument('--bot', choices=('render', 'telegram', 'both'), default='both')
+    parser.add_argument('--transport', choices=('polling', 'webhook'), default='polling',
+                        help="webhook faqat render-bot uchun")
+    parser.add_argument('--rate', type=float, default=100, help="sekundiga updatelar")
+    parser.add_argument('--duration', type=float, default=20, help="yuk berish davomiyligi (s)")
+    parser.add_argument('--users', type=int, default=1000, help="turli foydalanuvchilar soni")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f"amallar aralashmasi, mavjud: {', '.join(ACTIONS)}")
+    parser.add_argument('--telegram-latency', type=float, default=0.03, help="fake Bot API kechikishi (s)")
+    parser.add_argument('--supabase-latency', type=float, default=0.08, help="fake Edge Function kechikishi (s)")
+    parser.add_argument('--production-limits', action='store_true',
+                        help="botlarning haqiqiy AUTH_*/SEND_* cheklovlarini o'chirmaslik")
+    parser.add_argument('--drain', type=float, default=30, help="yuk tugagach javoblarni kutish (s)")
+    parser.add_argument('--startup-timeout', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--telegram-port', type=int, default=8781)
+    parser.add_argument('--supabase-port', type=int, default=8782)
+    parser.add_argument('--webhook-port', type=int, default=8783)
+    parser.add_argument('--webhook-concurrency', type=int, default=100)
+    parser.add_argument('--json', help="natijani JSON faylga yozish (keyin --baseline sifatida)")
+    parser.add_argument('--baseline', help="oldingi --json natijasi bilan solishtirish")
+    parser.add_argument('--max-regression', type=float, default=0.2,
+                        help="ruxsat etilgan yomonlashuv ulushi (0.2 = 20%%)")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -12,21 +12,60 @@ Render.com da deploy:
 - Start Command: python bot.py
 """
 
+import time
+# Ishga tushish vaqti importlardan boshlab o'lchanadi (startup.py)
+PROCESS_STARTED = time.monotonic()
+
 import os
+import asyncio
+import hashlib
 import logging
 import json
-import aiohttp
-from datetime import datetime
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from collections import Counter
+from datetime import datetime, timezone
+from telegram import Update
+from telegram.error import BadRequest
 from telegram.ext import (
-    Application, CommandHandler, CallbackQueryHandler, 
-    MessageHandler, ConversationHandler, ContextTypes, filters
+    Application, ChatMemberHandler, ContextTypes, TypeHandler
 )
 
-# Logging sozlash
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
+from ravon_botkit.avatars import AvatarResolver
+from ravon_botkit.cache import SingleFlight, TTLCache, load_snapshot, save_snapshot
+from ravon_botkit.log_pipeline import setup_logging
+from ravon_botkit.ratelimit import RateLimiter, TokenBucket
+from ravon_botkit.update_processor import ChatOrderedUpdateProcessor
+
+from batch_writer import BatchWriter
+from broadcast import Broadcaster
+from http_client import SupabaseClient
+from login_codes import mint_login_code
+from metrics import Metrics
+from recorder import UpdateRecorder, recording_key
+from send_limiter import SendRateLimiter
+from dispatch import Dispatcher, edit_screen, reply_screen
+from drain import GracefulDrain
+from templates import Screen, Templates
+from startup import StartupTimer
+from state_store import SQLitePersistence
+from update_stats import UpdateStats, derive_allowed_updates
+
+# Logging: navbat + alohida oqim, JSON, chaqiruv joyi bo'yicha tanlash (ravon_botkit.log_pipeline).
+# LOG_FORMAT=text - lokal ishlash uchun oddiy matn
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json').lower()
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '20'))
+LOG_SAMPLE_BURST = float(os.getenv('LOG_SAMPLE_BURST', '50'))
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+log_pipeline = setup_logging(
+    level=LOG_LEVEL,
+    fmt=LOG_FORMAT,
+    sample_rate=LOG_SAMPLE_RATE,
+    sample_burst=LOG_SAMPLE_BURST,
+    queue_size=LOG_QUEUE_SIZE,
+    secrets=[os.getenv(name, '') for name in (
+        'TELEGRAM_BOT_TOKEN', 'LOGIN_CODE_SECRET', 'BOT_SYNC_SECRET', 'AVATAR_SECRET',
+        'UPDATE_RECORD_KEY', 'WEBHOOK_SECRET',
+    )],
 )
 logger = logging.getLogger(__name__)
 
@@ -39,523 +78,1075 @@ SUPABASE_ANON_KEY = os.getenv('SUPABASE_ANON_KEY', 'eyJhbGciOiJIUzI1NiIsInR5cCI6
 CHANNEL_ID = int(os.getenv('CHANNEL_ID', '-1003014655042'))
 CHANNEL_USERNAME = os.getenv('CHANNEL_USERNAME', '@englishwithSanatbek')
 
+# Kanal a'zoligi keshi (soniyada)
+MEMBERSHIP_CACHE_SIZE = int(os.getenv('MEMBERSHIP_CACHE_SIZE', '50000'))
+MEMBERSHIP_POSITIVE_TTL = float(os.getenv('MEMBERSHIP_POSITIVE_TTL', '3600'))
+MEMBERSHIP_NEGATIVE_TTL = float(os.getenv('MEMBERSHIP_NEGATIVE_TTL', '30'))
+
+# Qayta ishga tushishda saqlanadigan a'zolik va rol keshi (bo'sh - o'chirilgan)
+CACHE_SNAPSHOT_FILE = os.getenv('CACHE_SNAPSHOT_FILE', 'cache_snapshot.json')
+
+# Chiquvchi xabarlar cheklovi (Telegram limitlari)
+SEND_GLOBAL_RATE = float(os.getenv('SEND_GLOBAL_RATE', '30'))
+SEND_PRIVATE_CHAT_RATE = float(os.getenv('SEND_PRIVATE_CHAT_RATE', '1'))
+SEND_PRIVATE_CHAT_BURST = float(os.getenv('SEND_PRIVATE_CHAT_BURST', '3'))
+SEND_GROUP_RATE_PER_MIN = float(os.getenv('SEND_GROUP_RATE_PER_MIN', '20'))
+SEND_MAX_RETRIES = int(os.getenv('SEND_MAX_RETRIES', '3'))
+
+# Broadcast (admin ommaviy xabarlari)
+BROADCAST_STATE_FILE = os.getenv('BROADCAST_STATE_FILE', 'broadcast_state.json')
+BROADCAST_CONCURRENCY = int(os.getenv('BROADCAST_CONCURRENCY', '32'))
+BROADCAST_PAGE_SIZE = int(os.getenv('BROADCAST_PAGE_SIZE', '500'))
+
+# user_data/chat_data ombori (bo'sh - o'chirilgan). Xotirada faqat oxirgi faol
+# STATE_MAX_USERS foydalanuvchi/STATE_MAX_CHATS chat, qolgani SQLite faylida
+STATE_DB_FILE = os.getenv('STATE_DB_FILE', 'bot_state.sqlite3')
+STATE_MAX_USERS = int(os.getenv('STATE_MAX_USERS', '10000'))
+STATE_MAX_CHATS = int(os.getenv('STATE_MAX_CHATS', '10000'))
+STATE_FLUSH_INTERVAL = float(os.getenv('STATE_FLUSH_INTERVAL', '30'))
+
+# Updatelarni parallel qayta ishlash (bitta chat ichida tartib saqlanadi)
+UPDATE_WORKERS = int(os.getenv('UPDATE_WORKERS', '64'))
+UPDATE_MAX_PENDING = int(os.getenv('UPDATE_MAX_PENDING', '10000'))
+# To'xtatish signalidan keyin boshlangan updatelarni kutish (Render ~30s dan keyin o'ldiradi)
+DRAIN_TIMEOUT = float(os.getenv('DRAIN_TIMEOUT', '15'))
+
+# Foydalanuvchi rollari keshi
+ROLE_CACHE_SIZE = int(os.getenv('ROLE_CACHE_SIZE', '50000'))
+ROLE_CACHE_TTL = float(os.getenv('ROLE_CACHE_TTL', '600'))
+
+# Kirish kodi so'rovlari cheklovi
+AUTH_USER_RATE_PER_MIN = float(os.getenv('AUTH_USER_RATE_PER_MIN', '3'))
+AUTH_USER_BURST = float(os.getenv('AUTH_USER_BURST', '3'))
+AUTH_GLOBAL_RATE_PER_SEC = float(os.getenv('AUTH_GLOBAL_RATE_PER_SEC', '50'))
+AUTH_GLOBAL_BURST = float(os.getenv('AUTH_GLOBAL_BURST', '100'))
+# Shu muddat ichida qayta so'ralsa, amaldagi kod qayta yuboriladi (soniya)
+AUTH_CODE_REUSE_WINDOW = float(os.getenv('AUTH_CODE_REUSE_WINDOW', '60'))
+AUTH_CODE_TTL = 5 * 60
+
+# Kirish kodlari: table - auth_codes jadvali orqali (Edge Function), signed - bot ichida imzolanadi
+AUTH_CODE_MODE = os.getenv('AUTH_CODE_MODE', 'table').lower()
+# telegram-auth Edge Function dagi LOGIN_CODE_SECRET bilan bir xil bo'lishi kerak
+LOGIN_CODE_SECRET = os.getenv('LOGIN_CODE_SECRET', '')
+
+# users_cache ga profillarni paketlab yozish (telegram-auth, action=sync_profiles)
+# telegram-auth dagi BOT_SYNC_SECRET bilan bir xil; berilmasa profillar yozilmaydi
+BOT_SYNC_SECRET = os.getenv('BOT_SYNC_SECRET', '')
+USERS_CACHE_FLUSH_INTERVAL = float(os.getenv('USERS_CACHE_FLUSH_INTERVAL', '5'))
+USERS_CACHE_BATCH_SIZE = int(os.getenv('USERS_CACHE_BATCH_SIZE', '500'))
+# Profil o'zgarmagan bo'lsa, last_seen_at shu muddatda bir marta yangilanadi (soniya)
+USERS_CACHE_SEEN_RESOLUTION = float(os.getenv('USERS_CACHE_SEEN_RESOLUTION', '300'))
+
+# Avatarlar: telegram-avatar Edge Function dagi AVATAR_SECRET bilan bir xil (bo'sh - o'chirilgan).
+# Fon rejimida, AVATAR_RATE so'rov/s dan oshmasdan; BOT_SYNC_SECRET ham kerak
+AVATAR_SECRET = os.getenv('AVATAR_SECRET', '')
+AVATAR_RATE = float(os.getenv('AVATAR_RATE', '2'))
+AVATAR_REFRESH_INTERVAL = float(os.getenv('AVATAR_REFRESH_INTERVAL', '86400'))
+
+# Referal havolalari (t.me/<bot>?start=ref_<id>) - paketlab telegram-auth (record_referrals) ga
+REFERRAL_FLUSH_INTERVAL = float(os.getenv('REFERRAL_FLUSH_INTERVAL', '5'))
+REFERRAL_BATCH_SIZE = int(os.getenv('REFERRAL_BATCH_SIZE', '500'))
+# Yuborilmagan referallar shu faylda saqlanadi (bo'sh - faqat xotirada)
+REFERRAL_QUEUE_FILE = os.getenv('REFERRAL_QUEUE_FILE', 'referral_queue.jsonl')
+# Bir taklif qilingan foydalanuvchining takroriy /start ref_ lari shu muddat bazaga bormaydi
+REFERRAL_DEDUP_TTL = float(os.getenv('REFERRAL_DEDUP_TTL', '86400'))
+
 # Web sayt URL
 WEB_APP_URL = os.getenv('WEB_APP_URL', 'https://ravonai.vercel.app')
 
 # Admin username
 ADMIN_USERNAME = os.getenv('ADMIN_USERNAME', 'khamidovsanat')
 
+# Bot username (referal havolalari uchun)
+BOT_USERNAME = os.getenv('BOT_USERNAME', 'ravonaiweb_bot')
+
+# Telegram Bot API manzili (test uchun lokal fake server ko'rsatilishi mumkin)
+TELEGRAM_API_BASE_URL = os.getenv('TELEGRAM_API_BASE_URL', 'https://api.telegram.org').rstrip('/')
+
+# Ishga tushirish rejimi: polling, webhook yoki sharded
+BOT_MODE = os.getenv('BOT_MODE', 'polling').lower()
+
+# Webhook sozlamalari (BOT_MODE=webhook bo'lganda)
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')  # masalan: https://ravon-bot.onrender.com
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('PORT', '10000'))
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40'))
+# Berilmasa tokendan hosil qilinadi - barcha replikalarda bir xil bo'ladi
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET') or hashlib.sha256(BOT_TOKEN.encode()).hexdigest()
+
+if AUTH_CODE_MODE == 'signed' and not LOGIN_CODE_SECRET:
+    logger.warning("AUTH_CODE_MODE=signed uchun LOGIN_CODE_SECRET sozlanmagan - auth_codes jadvali ishlatiladi")
+    AUTH_CODE_MODE = 'table'
+# Imzolangan kodda profil yo'q - web sayt uni users_cache dan oladi, uni esa faqat sync_profiles yozadi
+if AUTH_CODE_MODE == 'signed' and not BOT_SYNC_SECRET:
+    logger.warning("AUTH_CODE_MODE=signed uchun BOT_SYNC_SECRET sozlanmagan - auth_codes jadvali ishlatiladi")
+    AUTH_CODE_MODE = 'table'
+
+# Ko'p jarayonli rejim (BOT_MODE=sharded): ishchilar soni va ularning lokal portlari
+SHARD_WORKERS = int(os.getenv('SHARD_WORKERS') or os.cpu_count() or 1)
+SHARD_BASE_PORT = int(os.getenv('SHARD_BASE_PORT', '10100'))
+
+# Kelgan updatelarni (PII tozalangan holda) replay.py uchun yozib olish (bo'sh - o'chirilgan)
+UPDATE_RECORD_FILE = os.getenv('UPDATE_RECORD_FILE', '')
+UPDATE_RECORD_KEY = os.getenv('UPDATE_RECORD_KEY', '')
+
+# Prometheus metrikalari (0 - o'chirilgan). Sharded rejimda ishchi i: METRICS_PORT + 1 + i
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+METRICS_LISTEN = os.getenv('METRICS_LISTEN', '127.0.0.1')
+
+# Supabase HTTP pool sozlamalari
+# Ishga tushishda oldindan ochiladigan Supabase ulanishlari (0 - o'chirilgan)
+HTTP_WARM_CONNECTIONS = int(os.getenv('HTTP_WARM_CONNECTIONS', '4'))
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '100'))
+HTTP_POOL_PER_HOST = int(os.getenv('HTTP_POOL_PER_HOST', '20'))
+HTTP_DNS_CACHE_TTL = int(os.getenv('HTTP_DNS_CACHE_TTL', '300'))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv('HTTP_KEEPALIVE_TIMEOUT', '60'))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '15'))
+HTTP_TOTAL_TIMEOUT = float(os.getenv('HTTP_TOTAL_TIMEOUT', '20'))
+# Bitta chaqiruv (barcha qayta urinishlar bilan) uchun umumiy muddat
+HTTP_DEADLINE = float(os.getenv('HTTP_DEADLINE', '8'))
+HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', '2'))
+HTTP_RETRY_BUDGET_RATIO = float(os.getenv('HTTP_RETRY_BUDGET_RATIO', '0.2'))
+# Ketma-ket shuncha xatodan keyin endpoint BREAKER_RESET_TIMEOUT soniyaga "ochiladi"
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', '5'))
+BREAKER_RESET_TIMEOUT = float(os.getenv('BREAKER_RESET_TIMEOUT', '30'))
+
+supabase_client = SupabaseClient(
+    SUPABASE_URL,
+    SUPABASE_ANON_KEY,
+    pool_size=HTTP_POOL_SIZE,
+    pool_per_host=HTTP_POOL_PER_HOST,
+    dns_cache_ttl=HTTP_DNS_CACHE_TTL,
+    keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+    connect_timeout=HTTP_CONNECT_TIMEOUT,
+    read_timeout=HTTP_READ_TIMEOUT,
+    total_timeout=HTTP_TOTAL_TIMEOUT,
+    deadline=HTTP_DEADLINE,
+    max_retries=HTTP_MAX_RETRIES,
+    retry_budget_ratio=HTTP_RETRY_BUDGET_RATIO,
+    breaker_failure_threshold=BREAKER_FAILURE_THRESHOLD,
+    breaker_reset_timeout=BREAKER_RESET_TIMEOUT,
+)
+
+# A'zo hisoblanadigan statuslar
+MEMBER_STATUSES = ('member', 'administrator', 'creator')
+
+# user_id -> a'zomi (True/False). ChatMember updatelari orqali darhol yangilanadi
+membership_cache = TTLCache(maxsize=MEMBERSHIP_CACHE_SIZE, ttl=MEMBERSHIP_POSITIVE_TTL)
+
+# telegram_user_id -> role. Bir foydalanuvchi uchun parallel so'rovlar birlashtiriladi
+role_cache = TTLCache(maxsize=ROLE_CACHE_SIZE, ttl=ROLE_CACHE_TTL)
+role_lookups = SingleFlight()
+# Har bir invalidatsiyada oshadi - eski so'rov natijasi keshga yozilmasligi uchun
+role_cache_epoch = 0
+# Qayta ishga tushishda CACHE_SNAPSHOT_FILE ga yoziladigan keshlar
+snapshot_caches = {"membership": membership_cache, "role": role_cache}
+
+# Kirish kodi cheklovchisi va yaqinda berilgan kodlar (user_id -> (kod, tugash vaqti))
+auth_limiter = RateLimiter(
+    user_rate=AUTH_USER_RATE_PER_MIN / 60,
+    user_burst=AUTH_USER_BURST,
+    global_rate=AUTH_GLOBAL_RATE_PER_SEC,
+    global_burst=AUTH_GLOBAL_BURST,
+)
+issued_codes = TTLCache(maxsize=ROLE_CACHE_SIZE, ttl=AUTH_CODE_REUSE_WINDOW)
+
+# Chiquvchi Telegram so'rovlari cheklovchisi
+send_limiter = SendRateLimiter(
+    global_rate=SEND_GLOBAL_RATE,
+    private_chat_rate=SEND_PRIVATE_CHAT_RATE,
+    private_chat_burst=SEND_PRIVATE_CHAT_BURST,
+    group_rate_per_min=SEND_GROUP_RATE_PER_MIN,
+    max_retries=SEND_MAX_RETRIES,
+)
+
+# Turli chatlar parallel, bitta chat ichida ketma-ket
+update_recorder = (
+    UpdateRecorder(UPDATE_RECORD_FILE, recording_key(UPDATE_RECORD_KEY, BOT_TOKEN)) if UPDATE_RECORD_FILE else None
+)
+state_store = (
+    SQLitePersistence(STATE_DB_FILE, max_users=STATE_MAX_USERS, max_chats=STATE_MAX_CHATS,
+                      update_interval=STATE_FLUSH_INTERVAL)
+    if STATE_DB_FILE else None
+)
+update_processor = ChatOrderedUpdateProcessor(
+    workers=UPDATE_WORKERS,
+    max_pending=UPDATE_MAX_PENDING,
+    on_arrival=update_recorder.record if update_recorder else None,
+)
+# SIGTERM: yangi updatelar to'xtatiladi, boshlanganlari DRAIN_TIMEOUT ichida tugatiladi
+drain = GracefulDrain(update_processor, timeout=DRAIN_TIMEOUT)
+
+# Ekran shablonlari (import vaqtida bir marta yaratiladi)
+templates = Templates(WEB_APP_URL, ADMIN_USERNAME, CHANNEL_USERNAME, bot_username=BOT_USERNAME,
+                      code_mode=AUTH_CODE_MODE)
+
+# Handler va tashqi chaqiruvlar metrikalari
+metrics = Metrics()
+
+# Komandalar va callback tugmalari jadvali (har bir handler metrikalar bilan o'raladi)
+dispatcher = Dispatcher(middleware=metrics.instrument)
+
+# Update turlari bo'yicha qabul qilingan/qayta ishlangan hisoblagichlar
+update_stats = UpdateStats()
+
+# Ishga tushish bosqichlari va birinchi javobgacha vaqt
+startup = StartupTimer(PROCESS_STARTED)
+send_limiter.on_first_message = startup.first_reply
+
 
 # ==================== HELPER FUNCTIONS ====================
 
-async def supabase_request(endpoint: str, method: str = 'POST', data: dict = None, headers: dict = None):
-    """Supabase Edge Function ga so'rov yuborish"""
-    url = f"{SUPABASE_URL}/functions/v1/{endpoint}"
-    default_headers = {
-        "Content-Type": "application/json",
-        "apikey": SUPABASE_ANON_KEY,
-        "Authorization": f"Bearer {SUPABASE_ANON_KEY}"
-    }
-    if headers:
-        default_headers.update(headers)
-    
-    async with aiohttp.ClientSession() as session:
-        async with session.request(method, url, json=data, headers=default_headers) as response:
-            try:
-                return await response.json()
-            except:
-                return {"error": await response.text()}
+async def supabase_request(endpoint: str, method: str = 'POST', data: dict = None, headers: dict = None,
+                           idempotent: bool = True):
+    """Supabase Edge Function ga so'rov yuborish (umumiy pool orqali)
+
+    idempotent=False - server javobidan keyingi xatoda qayta urinilmaydi
+    (birinchi urinish serverda bajarilgan bo'lishi mumkin).
+    """
+    started = time.perf_counter()
+    result = await supabase_client.request(endpoint, method=method, data=data, headers=headers, idempotent=idempotent)
+    metrics.observe_dependency('supabase', endpoint, time.perf_counter() - started, error='error' in result)
+    return result
+
+
+def remember_membership(user_id: int, is_member: bool) -> None:
+    """A'zolik holatini keshga yozish (a'zo bo'lmaganlar qisqa muddatga)"""
+    ttl = MEMBERSHIP_POSITIVE_TTL if is_member else MEMBERSHIP_NEGATIVE_TTL
+    membership_cache.set(user_id, is_member, ttl=ttl)
+
+
+async def check_channel_membership(bot, user_id: int, trust_negative: bool = True) -> bool:
+    """Foydalanuvchi kanalga a'zo ekanligini tekshirish (avval keshdan)
 
+    trust_negative=False - keshdagi "a'zo emas" javobi Telegramdan qayta tekshiriladi
+    (foydalanuvchi "✅ Tekshirish" ni bosganda).
+    """
+    cached = membership_cache.get(user_id)
+    if cached or (cached is False and trust_negative):
+        return cached
 
-async def check_channel_membership(bot, user_id: int) -> bool:
-    """Foydalanuvchi kanalga a'zo ekanligini tekshirish"""
     try:
-        member = await bot.get_chat_member(chat_id=CHANNEL_ID, user_id=user_id)
-        return member.status in ['member', 'administrator', 'creator']
+        with metrics.timed('telegram', 'get_chat_member'):
+            member = await bot.get_chat_member(chat_id=CHANNEL_ID, user_id=user_id)
     except Exception as e:
         logger.error(f"Kanal a'zoligini tekshirishda xatolik: {e}")
         return False
 
+    is_member = member.status in MEMBER_STATUSES
+    remember_membership(user_id, is_member)
+    return is_member
+
+
+def is_admin(user) -> bool:
+    """Foydalanuvchi bot admini ekanligini tekshirish"""
+    return bool(user and user.username) and user.username.lower() == ADMIN_USERNAME.lower()
+
 
 async def generate_auth_code(user_data: dict) -> dict:
-    """Autentifikatsiya kodini generatsiya qilish"""
-    return await supabase_request('telegram-auth', data={
+    """Autentifikatsiya kodini generatsiya qilish
+
+    generate eski kodni o'chirib yangisini yozadi - qayta urinish ikkinchi kod yaratardi.
+    """
+    return await supabase_request('telegram-auth', idempotent=False, data={
         "action": "generate",
         "telegram_user_id": user_data['id'],
         "telegram_first_name": user_data['first_name'],
         "telegram_last_name": user_data.get('last_name'),
         "telegram_username": user_data.get('username'),
-        "telegram_photo_url": None
+        "telegram_photo_url": avatar_resolver.cached_url(user_data['id']) if avatar_resolver else None
     })
 
 
-async def get_user_role(telegram_user_id: int) -> str:
-    """Foydalanuvchi rolini olish"""
+def mint_auth_code(user) -> dict:
+    """Kirish kodini bot ichida imzolash - Supabase ga so'rovsiz"""
+    code, expires_at = mint_login_code(LOGIN_CODE_SECRET.encode(), user.id, ttl=AUTH_CODE_TTL)
+    return {
+        "success": True,
+        "code": code,
+        "expires_at": datetime.fromtimestamp(expires_at, timezone.utc).isoformat(),
+    }
+
+
+def _code_expiry(result: dict) -> float:
+    """Edge Function javobidagi expires_at ni time.monotonic() ga o'tkazish"""
+    now = time.monotonic()
+    try:
+        expires_at = datetime.fromisoformat(result['expires_at'].replace('Z', '+00:00'))
+        remaining = (expires_at - datetime.now(timezone.utc)).total_seconds()
+    except (KeyError, AttributeError, ValueError):
+        remaining = AUTH_CODE_TTL
+    return now + min(remaining, AUTH_CODE_TTL)
+
+
+async def issue_auth_code(user) -> dict:
+    """Kirish kodini berish: yaqinda berilgan kodni qayta ishlatish yoki cheklov ostida yangisini olish
+
+    Natija: {"success", "code", "valid_minutes"} yoki {"error"} / {"rate_limited", "retry_after"}
+    / {"unavailable", "retry_after"} (Supabase ishlamayapti)
+    """
+    cached = issued_codes.get(user.id)
+    if cached is not None:
+        code, expires = cached
+        remaining = expires - time.monotonic()
+        if remaining > 60:
+            return {"success": True, "code": code, "valid_minutes": int(remaining // 60), "reused": True}
+
+    retry_after = auth_limiter.check(user.id)
+    if retry_after > 0:
+        return {"rate_limited": True, "retry_after": retry_after}
+
+    result = None
+    if AUTH_CODE_MODE == 'signed':
+        try:
+            result = mint_auth_code(user)
+        except ValueError as e:
+            logger.warning(f"Imzolangan kod yaratilmadi, auth_codes jadvali ishlatiladi: {e}")
+    if result is None:
+        result = await generate_auth_code({
+            'id': user.id,
+            'first_name': user.first_name,
+            'last_name': user.last_name,
+            'username': user.username
+        })
+    if result.get('success') and result.get('code'):
+        issued_codes.set(user.id, (result['code'], _code_expiry(result)))
+    return result
+
+
+async def _load_user_role(telegram_user_id: int) -> dict:
+    """Rolni Edge Function dan olish va keshga yozish"""
+    epoch = role_cache_epoch
     result = await supabase_request('check-user-role', data={
         "telegramUserId": str(telegram_user_id)
     })
-    return result.get('role', 'user')
-
-
-def get_main_menu_keyboard():
-    """Asosiy menyu tugmalari"""
-    keyboard = [
-        [
-            InlineKeyboardButton("🎤 Talaffuz testi", callback_data="menu_test"),
-            InlineKeyboardButton("🔊 Matn tinglash", callback_data="menu_tts"),
-        ],
-        [
-            InlineKeyboardButton("👤 Profil", callback_data="menu_profile"),
-            InlineKeyboardButton("📊 Statistika", callback_data="menu_stats"),
-        ],
-        [
-            InlineKeyboardButton("💎 Premium", callback_data="menu_premium"),
-            InlineKeyboardButton("👥 Referal", callback_data="menu_referral"),
-        ],
-        [
-            InlineKeyboardButton("❓ Yordam", callback_data="menu_help"),
-            InlineKeyboardButton("🌐 Web sayt", url=WEB_APP_URL),
-        ],
-    ]
-    return InlineKeyboardMarkup(keyboard)
+    if result.get('unavailable'):
+        return result
+    role = result.get('role')
+    if role and not result.get('error') and epoch == role_cache_epoch:
+        role_cache.set(telegram_user_id, role)
+    return {"role": role or 'user'}
+
+
+async def get_user_role(telegram_user_id: int) -> dict:
+    """Foydalanuvchi rolini olish (avval keshdan)
+
+    Natija: {"role"} yoki {"unavailable", "retry_after"} (Supabase ishlamayapti -
+    admin oddiy foydalanuvchi menyusini ko'rmasligi uchun rol taxmin qilinmaydi)
+    """
+    role = role_cache.get(telegram_user_id)
+    if role is not None:
+        return {"role": role}
+    return await role_lookups.run(telegram_user_id, _load_user_role, telegram_user_id)
+
+
+def invalidate_user_role(telegram_user_id: int = None) -> None:
+    """Rol keshini tozalash (admin rolni o'zgartirganda). ID berilmasa - hammasi"""
+    global role_cache_epoch
+    role_cache_epoch += 1
+    if telegram_user_id is None:
+        role_cache.clear()
+    else:
+        role_cache.invalidate(telegram_user_id)
+        role_lookups.forget(telegram_user_id)
+
+
+# ==================== USERS_CACHE (WRITE-BEHIND) ====================
+
+async def flush_profiles(profiles: list) -> bool:
+    """To'plangan profillarni bitta bulk upsert bilan yozish"""
+    result = await supabase_request(
+        'telegram-auth',
+        data={"action": "sync_profiles", "profiles": profiles},
+        headers={"X-Bot-Secret": BOT_SYNC_SECRET},
+    )
+    if result.get('success'):
+        return True
+    logger.warning(f"users_cache yangilanmadi ({len(profiles)} ta profil): {result.get('error')}")
+    return False
+
+
+profile_writer = BatchWriter(
+    'users_cache',
+    flush_profiles,
+    max_batch=USERS_CACHE_BATCH_SIZE,
+    interval=USERS_CACHE_FLUSH_INTERVAL,
+)
+
+# user_id -> oxirgi navbatga qo'yilgan profil (o'zgarmaganlar qayta yozilmaydi)
+queued_profiles = TTLCache(maxsize=MEMBERSHIP_CACHE_SIZE, ttl=USERS_CACHE_SEEN_RESOLUTION)
+
+
+async def flush_avatars(avatars: list) -> bool:
+    """O'zgargan avatarlarni bitta so'rov bilan users_cache ga yozish"""
+    result = await supabase_request(
+        'telegram-auth',
+        data={"action": "sync_avatars", "avatars": avatars},
+        headers={"X-Bot-Secret": BOT_SYNC_SECRET},
+    )
+    if result.get('success'):
+        return True
+    logger.warning(f"Avatarlar yozilmadi ({len(avatars)} ta): {result.get('error')}")
+    return False
+
+
+avatar_writer = BatchWriter(
+    'avatars',
+    flush_avatars,
+    max_batch=USERS_CACHE_BATCH_SIZE,
+    interval=USERS_CACHE_FLUSH_INTERVAL,
+)
+avatar_resolver = AvatarResolver(
+    f"{SUPABASE_URL.rstrip('/')}/functions/v1/telegram-avatar",
+    AVATAR_SECRET.encode(),
+    lambda user_id, url: avatar_writer.add(user_id, {"telegram_user_id": str(user_id), "telegram_photo_url": url}),
+    rate=AVATAR_RATE,
+    refresh_interval=AVATAR_REFRESH_INTERVAL,
+    maxsize=MEMBERSHIP_CACHE_SIZE,
+) if AVATAR_SECRET and BOT_SYNC_SECRET else None
+
+
+async def remember_user(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """TypeHandler - har bir updatedagi foydalanuvchini users_cache navbatiga qo'shish"""
+    user = update.effective_user if isinstance(update, Update) else None
+    if user is None or user.is_bot:
+        return
+    if avatar_resolver:
+        avatar_resolver.request(user.id)
+    fields = (user.first_name, user.last_name, user.username)
+    if queued_profiles.get(user.id) == fields:
+        return
+    queued_profiles.set(user.id, fields)
+    profile_writer.add(user.id, {
+        "telegram_user_id": str(user.id),
+        "telegram_first_name": user.first_name,
+        "telegram_last_name": user.last_name,
+        "telegram_username": user.username,
+        "last_seen_at": datetime.now(timezone.utc).isoformat(),
+    })
+
+
+# ==================== REFERRALS ====================
+
+REFERRAL_PREFIX = 'ref_'
+
+# attributed - navbatga qo'yilgan, duplicate - shu foydalanuvchi allaqachon taklif qilingan,
+# invalid - noto'g'ri payload yoki o'zini o'zi taklif qilish
+referral_stats = Counter()
+# taklif qilingan user_id -> referrer (takroriy /start lar navbatga tushmaydi)
+referred_users = TTLCache(maxsize=MEMBERSHIP_CACHE_SIZE, ttl=REFERRAL_DEDUP_TTL)
+
+
+async def flush_referrals(referrals: list) -> bool:
+    """To'plangan referallarni bitta so'rov bilan yozish (birinchi referrer saqlanadi)"""
+    result = await supabase_request(
+        'telegram-auth',
+        data={"action": "record_referrals", "referrals": referrals},
+        headers={"X-Bot-Secret": BOT_SYNC_SECRET},
+    )
+    if result.get('success'):
+        # Bazada allaqachon boshqa referrer bilan yozilganlar
+        referral_stats['duplicate'] += len(referrals) - result.get('inserted', len(referrals))
+        return True
+    logger.warning(f"Referallar yozilmadi ({len(referrals)} ta): {result.get('error')}")
+    return False
+
+
+referral_writer = BatchWriter(
+    'referrals',
+    flush_referrals,
+    max_batch=REFERRAL_BATCH_SIZE,
+    interval=REFERRAL_FLUSH_INTERVAL,
+    journal=REFERRAL_QUEUE_FILE or None,
+)
+
+
+def record_referral(user, args: list) -> None:
+    """/start ref_<id> - taklifni navbatga qo'shish (javobni kutdirmaydi)"""
+    if not args or not args[0].startswith(REFERRAL_PREFIX):
+        return
+    try:
+        referrer_id = int(args[0][len(REFERRAL_PREFIX):])
+    except ValueError:
+        referrer_id = 0
+    if referrer_id <= 0 or referrer_id == user.id:
+        referral_stats['invalid'] += 1
+        return
+    if referred_users.get(user.id) is not None:
+        referral_stats['duplicate'] += 1
+        return
+    referred_users.set(user.id, referrer_id)
+    referral_stats['attributed'] += 1
+    referral_writer.add(user.id, {
+        "referred_telegram_user_id": user.id,
+        "referrer_telegram_user_id": referrer_id,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    })
+
+
+# ==================== BROADCAST ====================
+
+async def fetch_broadcast_page(after: str, limit: int) -> tuple:
+    """users_cache dan keyingi sahifa (telegram_user_id bo'yicha tartiblangan)"""
+    for attempt in range(3):
+        result = await supabase_request(
+            'telegram-auth',
+            data={"action": "list_users", "after": after, "limit": limit, "with_count": not after},
+            headers={"X-Bot-Secret": BOT_SYNC_SECRET},
+        )
+        if result.get('success'):
+            return result.get('users', []), result.get('total')
+        logger.warning(f"Broadcast: foydalanuvchilar ro'yxatini olib bo'lmadi: {result.get('error')}")
+        await asyncio.sleep(2 ** attempt)
+    raise RuntimeError("users_cache sahifasini olib bo'lmadi")
+
+
+broadcaster = Broadcaster(
+    fetch_broadcast_page,
+    templates.broadcast_status,
+    BROADCAST_STATE_FILE,
+    concurrency=BROADCAST_CONCURRENCY,
+    page_size=BROADCAST_PAGE_SIZE,
+)
+
+# Navbat va keshlar holati /metrics da gauge sifatida (so'ralganda hisoblanadi)
+BREAKER_STATES = {'closed': 0, 'half_open': 1, 'open': 2}
+metrics.gauge('updates_active', "Hozir qayta ishlanayotgan updatelar",
+              lambda: update_processor.stats()['active'])
+metrics.gauge('updates_pending', "Navbatda kutayotgan updatelar",
+              lambda: update_processor.stats()['pending'])
+metrics.gauge('send_queue', "Telegram yuborish navbati",
+              lambda: {"high": send_limiter.stats()['queue_high'], "low": send_limiter.stats()['queue_low']},
+              label='priority')
+metrics.gauge('supabase_breaker_state', "Circuit breaker: 0 closed, 1 half_open, 2 open",
+              lambda: {endpoint: BREAKER_STATES[breaker.state] for endpoint, breaker in supabase_client.breakers.items()},
+              label='endpoint')
+metrics.gauge('cache_entries', "Kesh yozuvlari soni",
+              lambda: {"membership": len(membership_cache), "role": len(role_cache)},
+              label='cache')
+metrics.gauge('state_resident', "Xotiradagi user_data/chat_data yozuvlari",
+              lambda: {"user": len(state_store.users.resident), "chat": len(state_store.chats.resident)}
+              if state_store else {},
+              label='kind')
+metrics.gauge('startup_seconds', "Ishga tushish bosqichlari, ready va first_reply (jarayon boshidan)",
+              startup.stats, label='phase')
+metrics.gauge('log_records', "Loglar: navbatda, to'lgani uchun tashlangan, tanlashda tashlangan",
+              log_pipeline.stats, label='state')
+metrics.gauge('users_cache_pending', "users_cache ga yozilishini kutayotgan profillar",
+              lambda: profile_writer.stats()['pending'])
+metrics.gauge('avatars', "Avatar navbati va natijalari",
+              lambda: avatar_resolver.stats() if avatar_resolver else {},
+              label='counter')
+metrics.gauge('referrals', "Referallar: attributed, duplicate, invalid, dropped, pending",
+              lambda: {**referral_stats, "dropped": referral_writer.dropped, "pending": referral_writer.stats()['pending']},
+              label='result')
+
+# ==================== SCREENS ====================
+# Har bir ekran ham menyu tugmasi ("menu:<nomi>"), ham komanda orqali ochiladi
+
+@dispatcher.screen("main", command="menu")
+async def main_menu_screen(user) -> Screen:
+    """Asosiy menyu"""
+    return templates.main_menu
+
+
+@dispatcher.screen("test")
+async def test_screen(user) -> Screen:
+    """Talaffuz testi haqida"""
+    return templates.test
+
+
+@dispatcher.screen("tts")
+async def tts_screen(user) -> Screen:
+    """Matnni tinglash (TTS) haqida"""
+    return templates.tts
+
+
+@dispatcher.screen("profile", command="profile")
+async def profile_screen(user) -> Screen:
+    """Profil (rol keshdan yoki Edge Function dan)"""
+    result = await get_user_role(user.id)
+    if result.get('unavailable'):
+        return templates.service_unavailable(result['retry_after'], command='/profile')
+    return templates.profile(user, result['role'])
+
+
+@dispatcher.screen("stats", command="stats")
+async def stats_screen(user) -> Screen:
+    """Statistika"""
+    return templates.stats
+
+
+@dispatcher.screen("premium", command="premium")
+async def premium_screen(user) -> Screen:
+    """Premium rejalar"""
+    return templates.premium
+
+
+@dispatcher.screen("referral", command="referral")
+async def referral_screen(user) -> Screen:
+    """Referal dasturi"""
+    return templates.referral(user.id)
+
+
+@dispatcher.screen("help", command="help")
+async def help_screen(user) -> Screen:
+    """Yordam"""
+    return templates.help
 
 
 # ==================== COMMAND HANDLERS ====================
 
+@dispatcher.command("start")
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """/start komandasi - Kirish kodi va asosiy menyu"""
     user = update.effective_user
+    # Referal havolasi orqali kelgan bo'lsa (a'zolikdan oldin - keyingi /start da payload bo'lmaydi)
+    record_referral(user, context.args)
     
     # Kanal a'zoligini tekshirish
     is_member = await check_channel_membership(context.bot, user.id)
     
     if not is_member:
-        keyboard = [
-            [InlineKeyboardButton("📢 Kanalga a'zo bo'lish", url=f"https://t.me/{CHANNEL_USERNAME.replace('@', '')}")],
-            [InlineKeyboardButton("✅ Tekshirish", callback_data="check_membership")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await update.message.reply_text(
-            f"👋 Salom, {user.first_name}!\n\n"
-            f"🔒 Ravon AI dan foydalanish uchun avval rasmiy kanalimizga a'zo bo'ling:\n\n"
-            f"📢 {CHANNEL_USERNAME}\n\n"
-            f"A'zo bo'lgandan so'ng, \"✅ Tekshirish\" tugmasini bosing.",
-            reply_markup=reply_markup
-        )
+        await reply_screen(update.message, templates.join_channel(user.first_name))
         return
     
-    # Autentifikatsiya kodini generatsiya qilish
-    user_data = {
-        'id': user.id,
-        'first_name': user.first_name,
-        'last_name': user.last_name,
-        'username': user.username
-    }
-    
-    result = await generate_auth_code(user_data)
+    # Autentifikatsiya kodini olish (cheklov va qayta ishlatish bilan)
+    result = await issue_auth_code(user)
     
-    if result.get('success') and result.get('code'):
-        code = result['code']
-        
-        await update.message.reply_text(
-            f"👋 Salom, {user.first_name}!\n\n"
-            f"🎯 <b>Ravon AI</b> - Ingliz tili talaffuzini baholash tizimi\n\n"
-            f"📝 Sizning kirish kodingiz:\n\n"
-            f"<code>{code}</code>\n\n"
-            f"⏰ Kod 5 daqiqa ichida amal qiladi\n\n"
-            f"📌 <b>Qadamlar:</b>\n"
-            f"1️⃣ Kodni nusxalang (bosing)\n"
-            f"2️⃣ Web saytga o'ting\n"
-            f"3️⃣ Kodni kiriting\n\n"
-            f"🔒 Xavfsizlik: Kodni boshqalarga bermang!",
-            parse_mode='HTML',
-            reply_markup=get_main_menu_keyboard()
-        )
+    if result.get('rate_limited'):
+        await reply_screen(update.message, templates.rate_limited(result['retry_after']))
+    elif result.get('unavailable'):
+        await reply_screen(update.message, templates.service_unavailable(result['retry_after']))
+    elif result.get('success') and result.get('code'):
+        await reply_screen(update.message, templates.auth_code(
+            user.first_name, result['code'], result.get('valid_minutes', 5)
+        ))
     else:
         error_msg = result.get('error', "Noma'lum xatolik")
-        await update.message.reply_text(
-            f"❌ Xatolik yuz berdi: {error_msg}\n\n"
-            f"Iltimos, keyinroq qayta urinib ko'ring yoki @{ADMIN_USERNAME} ga murojaat qiling."
-        )
+        await reply_screen(update.message, templates.auth_error(error_msg))
 
 
-async def menu_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """/menu komandasi - Asosiy menyu"""
-    user = update.effective_user
-    await update.message.reply_text(
-        f"📱 <b>Ravon AI - Asosiy menyu</b>\n\n"
-        f"Kerakli bo'limni tanlang:",
-        parse_mode='HTML',
-        reply_markup=get_main_menu_keyboard()
-    )
+@dispatcher.command("code")
+async def code_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/code komandasi - yangi kod olish"""
+    await start(update, context)
 
 
-async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """/help komandasi"""
+@dispatcher.command("cachestats")
+async def cachestats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/cachestats komandasi - kesh statistikasi (faqat admin uchun)"""
+    if not is_admin(update.effective_user):
+        return
+
+    stats = membership_cache.stats()
+    roles = role_cache.stats()
+    lookups = role_lookups.stats()
+    sends = send_limiter.stats()
+    updates = update_processor.stats()
+    profiles = profile_writer.stats()
+    referrals = referral_writer.stats()
+    http = supabase_client.stats()
+    breakers = "\n".join(
+        f"{endpoint}: {b['state']} (xatolar: {b['failures']}, ochilgan: {b['opened']}, rad: {b['rejected']})"
+        for endpoint, b in http['breakers'].items()
+    ) or "-"
+    if state_store:
+        state = state_store.stats()
+        state_text = (
+            f"Xotirada: {state['users']['resident']} / {state['users']['max']} foydalanuvchi, "
+            f"{state['chats']['resident']} / {state['chats']['max']} chat\n"
+            f"Diskdan tiklangan: {state['users']['loads']}, chiqarilgan: {state['users']['evictions']}\n"
+            f"Yozuvlar: {state['rows_written']} ({state['commits']} tranzaksiya, {state['failures']} xato)"
+        )
+    else:
+        state_text = "o'chirilgan"
     await update.message.reply_text(
-        "🎯 <b>Ravon AI Bot Yordam</b>\n\n"
-        "📌 <b>Buyruqlar:</b>\n"
-        "/start - Kirish kodini olish\n"
-        "/menu - Asosiy menyu\n"
-        "/help - Yordam\n"
-        "/code - Yangi kod olish\n"
-        "/profile - Profilim\n"
-        "/stats - Statistikam\n"
-        "/premium - Premium ma'lumoti\n"
-        "/referral - Referal dasturi\n\n"
-        "📌 <b>Qanday foydalanish:</b>\n"
-        "1. /start buyrug'ini yuboring\n"
-        "2. 6 xonali kodni oling\n"
-        "3. Web saytga o'ting va kodni kiriting\n"
-        "4. Talaffuzni test qiling\n\n"
-        "📌 <b>Talaffuz test qilish:</b>\n"
-        "• Web saytda matn tanlang\n"
-        "• Ovozingizni yozib yuborng\n"
-        "• AI tahlil natijasini oling\n\n"
-        "📌 <b>Muammo bo'lsa:</b>\n"
-        f"Admin: @{ADMIN_USERNAME}",
+        f"📦 <b>A'zolik keshi</b>\n\n"
+        f"Yozuvlar: {stats['size']} / {stats['maxsize']}\n"
+        f"Hit: {stats['hits']}\n"
+        f"Miss (Telegram so'rovi): {stats['misses']}\n"
+        f"Hit rate: {stats['hit_rate'] * 100:.1f}%\n\n"
+        f"🎭 <b>Rollar keshi</b>\n\n"
+        f"Yozuvlar: {roles['size']} / {roles['maxsize']}\n"
+        f"Hit rate: {roles['hit_rate'] * 100:.1f}%\n"
+        f"Edge Function so'rovlari: {lookups['calls']}\n"
+        f"Birlashtirilgan so'rovlar: {lookups['coalesced']}\n\n"
+        f"📤 <b>Yuborish navbati</b>\n\n"
+        f"Navbatda: {sends['queue_high']} javob, {sends['queue_low']} ommaviy\n"
+        f"Kechiktirilgan: {sends['delayed']} / {sends['requests']}\n"
+        f"O'rtacha kutish: {sends['wait_avg']:.2f}s (max {sends['wait_max']:.2f}s)\n"
+        f"RetryAfter: {sends['retries']} qayta urinish, {sends['failed']} xato\n\n"
+        f"⚙️ <b>Updatelar</b>\n\n"
+        f"Ishlanmoqda: {updates['active']} / {updates['workers']}\n"
+        f"Kutmoqda: {updates['pending']} (chatlar: {updates['chats_queued']}, "
+        f"max chuqurlik: {updates['max_chat_depth']})\n"
+        f"O'rtacha kutish: {updates['wait_avg']:.2f}s (max {updates['wait_max']:.2f}s)\n\n"
+        f"👤 <b>users_cache navbati</b>\n\n"
+        f"Navbatda: {profiles['pending']}, yozilgan: {profiles['written']} "
+        f"({profiles['flushes']} so'rov, {profiles['failures']} xato)\n\n"
+        f"👥 <b>Referallar</b>\n\n"
+        f"Qabul qilingan: {referral_stats['attributed']}, takroriy: {referral_stats['duplicate']}, "
+        f"noto'g'ri: {referral_stats['invalid']}\n"
+        f"Navbatda: {referrals['pending']}, yozilgan: {referrals['written']}, "
+        f"tashlangan: {referrals['dropped']}\n\n"
+        f"🗄 <b>Holat ombori</b>\n\n"
+        f"{state_text}\n\n"
+        f"🔌 <b>Supabase</b>\n\n"
+        f"{breakers}\n"
+        f"Qayta urinishlar: {http['retry_budget']['granted']} "
+        f"(byudjet tugagan: {http['retry_budget']['exhausted']})",
         parse_mode='HTML'
     )
 
 
-async def code_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """/code komandasi - yangi kod olish"""
-    await start(update, context)
+@dispatcher.command("rolereset")
+async def rolereset_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/rolereset [telegram_id] - rol keshini tozalash (faqat admin uchun)"""
+    if not is_admin(update.effective_user):
+        return
 
+    if context.args:
+        try:
+            telegram_user_id = int(context.args[0])
+        except ValueError:
+            await update.message.reply_text("❌ Telegram ID raqam bo'lishi kerak.")
+            return
+        invalidate_user_role(telegram_user_id)
+        await update.message.reply_text(f"✅ {telegram_user_id} uchun rol keshi tozalandi.")
+    else:
+        invalidate_user_role()
+        await update.message.reply_text("✅ Barcha rollar keshi tozalandi.")
 
-async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """/profile komandasi"""
-    user = update.effective_user
-    role = await get_user_role(user.id)
-    
-    role_emoji = {"admin": "👑", "teacher": "🎓", "user": "👤"}.get(role, "👤")
-    role_name = {"admin": "Admin", "teacher": "O'qituvchi", "user": "Foydalanuvchi"}.get(role, "Foydalanuvchi")
-    
-    keyboard = [
-        [InlineKeyboardButton("🌐 Web saytda ko'rish", url=f"{WEB_APP_URL}/profile")],
-        [InlineKeyboardButton("🔙 Menyu", callback_data="back_to_menu")]
-    ]
-    
-    await update.message.reply_text(
-        f"👤 <b>Mening Profilim</b>\n\n"
-        f"📛 Ism: {user.first_name} {user.last_name or ''}\n"
-        f"👤 Username: @{user.username or 'yo\'q'}\n"
-        f"🆔 Telegram ID: <code>{user.id}</code>\n"
-        f"{role_emoji} Role: {role_name}\n\n"
-        f"📊 Batafsil statistika uchun web saytga o'ting.",
-        parse_mode='HTML',
-        reply_markup=InlineKeyboardMarkup(keyboard)
-    )
 
+@dispatcher.command("broadcast")
+async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/broadcast - barcha foydalanuvchilarga xabar (faqat admin uchun)"""
+    if not is_admin(update.effective_user):
+        return
+
+    message = update.message
+    action = context.args[0].lower() if context.args else ''
 
-async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """/stats komandasi"""
-    keyboard = [
-        [InlineKeyboardButton("📊 Web saytda ko'rish", url=f"{WEB_APP_URL}/stats")],
-        [InlineKeyboardButton("🔙 Menyu", callback_data="back_to_menu")]
-    ]
-    
-    await update.message.reply_text(
-        f"📊 <b>Statistika</b>\n\n"
-        f"Batafsil statistikani ko'rish uchun web saytga o'ting:\n"
-        f"• Jami testlar soni\n"
-        f"• O'rtacha ball\n"
-        f"• Haftalik tahlil\n"
-        f"• So'nggi natijalar\n\n"
-        f"🌐 {WEB_APP_URL}/stats",
-        parse_mode='HTML',
-        reply_markup=InlineKeyboardMarkup(keyboard)
-    )
+    if action == 'status':
+        if broadcaster.state is None:
+            await message.reply_text("Broadcast hali boshlanmagan.")
+        else:
+            await reply_screen(message, templates.broadcast_status(broadcaster.stats()))
+        return
+    if action == 'stop':
+        stopped = await broadcaster.stop()
+        await message.reply_text("⏸ Broadcast to'xtatildi." if stopped else "Hozir broadcast ishlamayapti.")
+        return
+    if action == 'resume':
+        resumed = await broadcaster.resume(context.bot, include_stopped=True)
+        await message.reply_text("▶️ Broadcast davom ettirildi." if resumed else "Davom ettiriladigan broadcast yo'q.")
+        return
 
+    if not BOT_SYNC_SECRET:
+        await message.reply_text("❌ BOT_SYNC_SECRET sozlanmagan - foydalanuvchilar ro'yxatini olib bo'lmaydi.")
+        return
 
-async def premium_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """/premium komandasi"""
-    keyboard = [
-        [InlineKeyboardButton("💳 Premium sotib olish", url=f"{WEB_APP_URL}/premium")],
-        [InlineKeyboardButton(f"📞 Admin: @{ADMIN_USERNAME}", url=f"https://t.me/{ADMIN_USERNAME}")],
-        [InlineKeyboardButton("🔙 Menyu", callback_data="back_to_menu")]
-    ]
-    
-    await update.message.reply_text(
-        "💎 <b>Premium Rejalar</b>\n\n"
-        "🌟 <b>Premium imkoniyatlari:</b>\n"
-        "✅ Kunlik 100 ta talaffuz testi (bepul: 10)\n"
-        "✅ Kunlik 50 ta TTS (bepul: 5)\n"
-        "✅ 2000 belgigacha matn tinglash\n"
-        "✅ Batafsil tahlil va tavsiyalar\n"
-        "✅ PDF hisobot yuklab olish\n"
-        "✅ Prioritet qo'llab-quvvatlash\n\n"
-        "💰 <b>Narxlar:</b>\n"
-        "📅 Haftalik: 15,000 so'm\n"
-        "📅 Oylik: 45,000 so'm\n"
-        "📅 Yillik: 300,000 so'm\n\n"
-        f"📞 Sotib olish uchun: @{ADMIN_USERNAME}",
-        parse_mode='HTML',
-        reply_markup=InlineKeyboardMarkup(keyboard)
-    )
+    if message.reply_to_message is not None:
+        source = {"type": "copy", "from_chat_id": message.chat_id,
+                  "message_id": message.reply_to_message.message_id}
+    else:
+        parts = message.text.split(maxsplit=1)
+        if len(parts) < 2:
+            await reply_screen(message, templates.broadcast_usage)
+            return
+        source = {"type": "text", "text": parts[1]}
 
+    try:
+        started = await broadcaster.start(context.bot, message.chat_id, source)
+    except BadRequest as e:
+        await message.reply_text(f"❌ Matnni HTML sifatida yuborib bo'lmadi: {e.message}\n"
+                                 f"<, > va & belgilarini &lt; &gt; &amp; ko'rinishida yozing.")
+        return
+    if not started:
+        await message.reply_text("⏳ Boshqa broadcast ishlamoqda. /broadcast status yoki /broadcast stop")
 
-async def referral_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """/referral komandasi"""
-    user = update.effective_user
-    referral_link = f"https://t.me/ravonaiweb_bot?start=ref_{user.id}"
-    
-    keyboard = [
-        [InlineKeyboardButton("📤 Havolani ulashish", switch_inline_query=f"Men Ravon AI orqali ingliz tili talaffuzimni yaxshilayapman! Sen ham sinab ko'r: {referral_link}")],
-        [InlineKeyboardButton("🌐 Web saytda ko'rish", url=f"{WEB_APP_URL}/referral")],
-        [InlineKeyboardButton("🔙 Menyu", callback_data="back_to_menu")]
-    ]
-    
-    await update.message.reply_text(
-        f"👥 <b>Referal Dasturi</b>\n\n"
-        f"Do'stlaringizni taklif qiling va bonus oling!\n\n"
-        f"🔗 <b>Sizning havolangiz:</b>\n"
-        f"<code>{referral_link}</code>\n\n"
-        f"🎁 <b>Bonuslar:</b>\n"
-        f"• 1 do'st = +1 bonus limit\n"
-        f"• 3 do'st = +3 bonus limit\n"
-        f"• 10 do'st = +1 hafta premium\n\n"
-        f"📤 Havolani ulashing va bonus oling!",
-        parse_mode='HTML',
-        reply_markup=InlineKeyboardMarkup(keyboard)
-    )
+
+# ==================== CHAT MEMBER HANDLERS ====================
+
+async def channel_member_update(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Kanalga qo'shilish/chiqishda a'zolik keshini darhol yangilash"""
+    new_member = update.chat_member.new_chat_member
+    remember_membership(new_member.user.id, new_member.status in MEMBER_STATUSES)
 
 
 # ==================== CALLBACK HANDLERS ====================
 
+@dispatcher.callback("auth", "check")
 async def check_membership_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Kanal a'zoligini qayta tekshirish"""
     query = update.callback_query
     await query.answer()
     
     user = query.from_user
-    is_member = await check_channel_membership(context.bot, user.id)
+    is_member = await check_channel_membership(context.bot, user.id, trust_negative=False)
     
     if is_member:
-        user_data = {
-            'id': user.id,
-            'first_name': user.first_name,
-            'last_name': user.last_name,
-            'username': user.username
-        }
-        
-        result = await generate_auth_code(user_data)
+        result = await issue_auth_code(user)
         
-        if result.get('success') and result.get('code'):
-            code = result['code']
-            
-            await query.edit_message_text(
-                f"✅ A'zolik tasdiqlandi!\n\n"
-                f"📝 Sizning kirish kodingiz:\n\n"
-                f"<code>{code}</code>\n\n"
-                f"⏰ Kod 5 daqiqa ichida amal qiladi\n\n"
-                f"📌 Qadamlar:\n"
-                f"1️⃣ Kodni nusxalang (bosing)\n"
-                f"2️⃣ Web saytga o'ting\n"
-                f"3️⃣ Kodni kiriting",
-                parse_mode='HTML',
-                reply_markup=get_main_menu_keyboard()
-            )
+        if result.get('rate_limited'):
+            await edit_screen(query, templates.rate_limited(result['retry_after']))
+        elif result.get('unavailable'):
+            await edit_screen(query, templates.service_unavailable(result['retry_after']))
+        elif result.get('success') and result.get('code'):
+            await edit_screen(query, templates.membership_confirmed(
+                result['code'], result.get('valid_minutes', 5)
+            ))
         else:
-            await query.edit_message_text(
-                f"❌ Kod generatsiya qilishda xatolik.\n"
-                f"Iltimos, /start buyrug'ini qayta yuboring."
-            )
+            await edit_screen(query, templates.auth_retry)
     else:
-        await query.answer(
-            "❌ Siz hali kanalga a'zo emassiz. Avval kanalga a'zo bo'ling!",
-            show_alert=True
-        )
+        await query.answer(templates.not_member_alert, show_alert=True)
 
 
-async def menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Menyu tugmalari callback"""
-    query = update.callback_query
-    await query.answer()
-    
-    user = query.from_user
-    data = query.data
-    
-    if data == "back_to_menu":
-        await query.edit_message_text(
-            f"📱 <b>Ravon AI - Asosiy menyu</b>\n\n"
-            f"Kerakli bo'limni tanlang:",
-            parse_mode='HTML',
-            reply_markup=get_main_menu_keyboard()
-        )
+# ==================== LIFECYCLE ====================
+
+async def warm_supabase() -> None:
+    """Birinchi /start TLS handshake va Edge Function sovuq startini kutmasligi uchun"""
+    opened = await supabase_client.warmup(('telegram-auth', 'check-user-role'), HTTP_WARM_CONNECTIONS)
+    logger.info(f"Supabase: {opened} / {HTTP_WARM_CONNECTIONS} ulanish oldindan ochildi")
+
+
+async def resolve_channel(bot) -> None:
+    """CHANNEL_ID ni tekshirish: kanal mavjudmi va bot unda adminmi"""
+    chat, member = await asyncio.gather(bot.get_chat(CHANNEL_ID), bot.get_chat_member(CHANNEL_ID, bot.id))
+    logger.info(f"📢 Kanal: {chat.title} ({'@' + chat.username if chat.username else CHANNEL_ID})")
+    if member.status not in ('administrator', 'creator'):
+        logger.warning("Bot kanalda admin emas - a'zolik o'zgarishlari kelmaydi, har safar getChatMember so'raladi")
+
+
+def restore_caches() -> None:
+    """Oldingi jarayondan qolgan a'zolik/rol keshini tiklash"""
+    if CACHE_SNAPSHOT_FILE:
+        restored = load_snapshot(CACHE_SNAPSHOT_FILE, snapshot_caches)
+        if restored:
+            logger.info(f"Kesh snapshot dan tiklandi: {restored}")
+
+
+def save_caches() -> None:
+    if not CACHE_SNAPSHOT_FILE:
         return
-    
-    if data == "menu_test":
-        keyboard = [
-            [InlineKeyboardButton("🎤 Web saytda test qilish", url=f"{WEB_APP_URL}/test")],
-            [InlineKeyboardButton("🔙 Menyu", callback_data="back_to_menu")]
-        ]
-        await query.edit_message_text(
-            "🎤 <b>Talaffuz Testi</b>\n\n"
-            "Talaffuzingizni AI yordamida tahlil qiling!\n\n"
-            "📌 <b>Qanday ishlaydi:</b>\n"
-            "1. Matn tanlang yoki o'zingiz yozing\n"
-            "2. Ovozingizni yozib yuboring\n"
-            "3. AI tahlil natijasini oling\n\n"
-            "📊 <b>Baholash ko'rsatkichlari:</b>\n"
-            "• 🎯 Accuracy (To'g'rilik)\n"
-            "• 🌊 Fluency (Ravonlik)\n"
-            "• ✅ Completeness (To'liqlik)\n"
-            "• 🎵 Prosody (Ohang)\n\n"
-            "⏱️ Maks. audio: 30 soniya\n"
-            "📊 Bepul: 10 ta/kun | Premium: 100 ta/kun",
-            parse_mode='HTML',
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
-    
-    elif data == "menu_tts":
-        keyboard = [
-            [InlineKeyboardButton("🔊 Web saytda tinglash", url=f"{WEB_APP_URL}/tts")],
-            [InlineKeyboardButton("🔙 Menyu", callback_data="back_to_menu")]
-        ]
-        await query.edit_message_text(
-            "🔊 <b>Matnni Tinglash (TTS)</b>\n\n"
-            "Inglizcha matnni tinglang va talaffuzni o'rganing!\n\n"
-            "📌 <b>Imkoniyatlar:</b>\n"
-            "• Inglizcha matn kiriting\n"
-            "• Brauzer ovozi bilan tinglang\n"
-            "• Takrorlang va mashq qiling\n\n"
-            "📊 Bepul: 5 ta/kun (200 belgi)\n"
-            "💎 Premium: 50 ta/kun (2000 belgi)",
-            parse_mode='HTML',
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
-    
-    elif data == "menu_profile":
-        role = await get_user_role(user.id)
-        role_emoji = {"admin": "👑", "teacher": "🎓", "user": "👤"}.get(role, "👤")
-        role_name = {"admin": "Admin", "teacher": "O'qituvchi", "user": "Foydalanuvchi"}.get(role, "Foydalanuvchi")
-        
-        keyboard = [
-            [InlineKeyboardButton("🌐 Web saytda ko'rish", url=f"{WEB_APP_URL}/profile")],
-            [InlineKeyboardButton("🔙 Menyu", callback_data="back_to_menu")]
-        ]
-        await query.edit_message_text(
-            f"👤 <b>Mening Profilim</b>\n\n"
-            f"📛 Ism: {user.first_name} {user.last_name or ''}\n"
-            f"👤 Username: @{user.username or 'yoq'}\n"
-            f"🆔 Telegram ID: <code>{user.id}</code>\n"
-            f"{role_emoji} Role: {role_name}",
-            parse_mode='HTML',
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
-    
-    elif data == "menu_stats":
-        keyboard = [
-            [InlineKeyboardButton("📊 Web saytda ko'rish", url=f"{WEB_APP_URL}/stats")],
-            [InlineKeyboardButton("🔙 Menyu", callback_data="back_to_menu")]
-        ]
-        await query.edit_message_text(
-            "📊 <b>Statistika</b>\n\n"
-            "Batafsil statistikani web saytda ko'ring:\n"
-            "• Jami testlar soni\n"
-            "• O'rtacha ball\n"
-            "• Haftalik tahlil\n"
-            "• So'nggi natijalar",
-            parse_mode='HTML',
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
-    
-    elif data == "menu_premium":
-        keyboard = [
-            [InlineKeyboardButton("💳 Sotib olish", url=f"{WEB_APP_URL}/premium")],
-            [InlineKeyboardButton(f"📞 @{ADMIN_USERNAME}", url=f"https://t.me/{ADMIN_USERNAME}")],
-            [InlineKeyboardButton("🔙 Menyu", callback_data="back_to_menu")]
-        ]
-        await query.edit_message_text(
-            "💎 <b>Premium</b>\n\n"
-            "🌟 Imkoniyatlar:\n"
-            "✅ 100 ta talaffuz test/kun\n"
-            "✅ 50 ta TTS/kun\n"
-            "✅ 2000 belgigacha matn\n"
-            "✅ PDF hisobot\n\n"
-            "💰 Haftalik: 15,000 so'm\n"
-            "💰 Oylik: 45,000 so'm\n"
-            "💰 Yillik: 300,000 so'm",
-            parse_mode='HTML',
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
-    
-    elif data == "menu_referral":
-        referral_link = f"https://t.me/ravonaiweb_bot?start=ref_{user.id}"
-        keyboard = [
-            [InlineKeyboardButton("📤 Ulashish", switch_inline_query=f"Ravon AI bilan talaffuzingizni yaxshilang: {referral_link}")],
-            [InlineKeyboardButton("🌐 Web saytda ko'rish", url=f"{WEB_APP_URL}/referral")],
-            [InlineKeyboardButton("🔙 Menyu", callback_data="back_to_menu")]
-        ]
-        await query.edit_message_text(
-            f"👥 <b>Referal Dasturi</b>\n\n"
-            f"🔗 Havolangiz:\n"
-            f"<code>{referral_link}</code>\n\n"
-            f"🎁 3 do'st = +3 bonus limit\n"
-            f"🎁 10 do'st = +1 hafta premium",
-            parse_mode='HTML',
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
-    
-    elif data == "menu_help":
-        keyboard = [
-            [InlineKeyboardButton("🌐 Yordam markazi", url=f"{WEB_APP_URL}/help")],
-            [InlineKeyboardButton(f"📞 @{ADMIN_USERNAME}", url=f"https://t.me/{ADMIN_USERNAME}")],
-            [InlineKeyboardButton("🔙 Menyu", callback_data="back_to_menu")]
-        ]
-        await query.edit_message_text(
-            "❓ <b>Yordam</b>\n\n"
-            "📌 <b>Buyruqlar:</b>\n"
-            "/start - Kirish kodi\n"
-            "/menu - Menyu\n"
-            "/help - Yordam\n"
-            "/profile - Profil\n"
-            "/stats - Statistika\n"
-            "/premium - Premium\n"
-            "/referral - Referal\n\n"
-            "❓ <b>FAQ:</b>\n"
-            "• Bepul: 10 test/kun, 5 TTS/kun\n"
-            "• Premium: 100 test/kun, 50 TTS/kun\n"
-            "• Limitlar har kuni 12:00 da yangilanadi\n"
-            "• Maks. audio: 30 soniya\n\n"
-            f"📞 Muammo bo'lsa: @{ADMIN_USERNAME}",
-            parse_mode='HTML',
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
+    try:
+        save_snapshot(CACHE_SNAPSHOT_FILE, snapshot_caches)
+    except OSError as e:
+        logger.warning(f"Kesh snapshot {CACHE_SNAPSHOT_FILE} yozilmadi: {e!r}")
+
+
+async def post_init(application: Application) -> None:
+    """Bot ishga tushganda umumiy resurslarni ochish va qizdirish"""
+    startup.mark('initialize')
+    if application.updater is not None:
+        # Polling: signal -> drain -> stop_running (webhook rejimida serve_webhook o'zi)
+        drain.install(application)
+    await supabase_client.start()
+    if state_store:
+        state_store.attach(application)
+    if update_recorder:
+        update_recorder.open()
+    if BOT_SYNC_SECRET:
+        profile_writer.start()
+        referral_writer.start()
+        avatar_writer.start()
+        if avatar_resolver:
+            avatar_resolver.start(application.bot)
+    else:
+        logger.warning("BOT_SYNC_SECRET sozlanmagan - profillar users_cache ga yozilmaydi")
+    if METRICS_PORT:
+        await metrics.start_server(METRICS_LISTEN, METRICS_PORT)
+
+    # Birinchi foydalanuvchilar sovuq keshlar va ulanishlarni kutmasligi uchun
+    with startup.phase('caches'):
+        restore_caches()
+    with startup.phase('templates'):
+        templates.warm()
+    warmups = [startup.run('channel', resolve_channel(application.bot))]
+    if HTTP_WARM_CONNECTIONS:
+        warmups.append(startup.run('supabase', warm_supabase()))
+    await asyncio.gather(*warmups)
+
+    # Bot qayta ishga tushganda tugallanmagan broadcast davom etadi
+    await broadcaster.resume(application.bot)
+    startup.ready()
+
+
+async def post_stop(application: Application) -> None:
+    """Updatelar to'xtatilgandan keyin - broadcast holatini saqlab to'xtatish"""
+    await broadcaster.shutdown()
+
+
+async def post_shutdown(application: Application) -> None:
+    """Bot to'xtaganda umumiy resurslarni yopish"""
+    if avatar_resolver:
+        await avatar_resolver.close()
+    await avatar_writer.close()
+    await profile_writer.close()
+    await referral_writer.close()
+    logger.info(f"Referallar: {dict(referral_stats)}")
+    await supabase_client.close()
+    await metrics.stop_server()
+    if update_recorder:
+        update_recorder.close()
+    save_caches()
+    logger.info(f"A'zolik keshi: {membership_cache.stats()}")
+    logger.info(f"Rollar keshi: {role_cache.stats()}, so'rovlar: {role_lookups.stats()}")
+    logger.info(f"Kirish kodi cheklovchisi: {auth_limiter.stats()}")
+    logger.info(f"Updatelar (qabul qilingan/qayta ishlangan): {update_stats.stats()}")
 
 
 # ==================== MAIN ====================
 
+def build_application(use_updater: bool = True) -> Application:
+    """Application yaratish va handlerlarni ro'yxatdan o'tkazish"""
+    builder = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .base_url(f"{TELEGRAM_API_BASE_URL}/bot")
+        .base_file_url(f"{TELEGRAM_API_BASE_URL}/file/bot")
+        .rate_limiter(send_limiter)
+        .concurrent_updates(update_processor)
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .post_shutdown(post_shutdown)
+    )
+    if state_store:
+        builder = builder.persistence(state_store)
+    if not use_updater:
+        # Webhook rejimida updatelarni o'zimizning server qabul qiladi
+        builder = builder.updater(None)
+    application = builder.build()
+    
+    # Komandalar va callback tugmalari (bitta jadvaldan)
+    dispatcher.install(application)
+
+    # Kanal a'zoligi o'zgarishlari (bot kanalda admin bo'lishi kerak)
+    application.add_handler(ChatMemberHandler(
+        metrics.instrument(channel_member_update), ChatMemberHandler.CHAT_MEMBER, chat_id=CHANNEL_ID
+    ))
+
+    # Hisoblagichlar barcha handlerlar qo'shilgandan keyin ulanadi
+    update_stats.install(application)
+
+    # Foydalanuvchi profillari (barcha komanda va callbacklar uchun)
+    application.add_handler(TypeHandler(Update, remember_user), group=-90)
+    startup.mark('build')
+    return application
+
+
+def run_worker(index: int, shards: int, port: int) -> None:
+    """Sharded rejimdagi ishchi jarayon - ingressdan updatelarni qabul qiladi"""
+    from webhook import serve_webhook
+
+    startup.mark('imports')
+    # Telegram va Supabase ga umumiy chegaralar ishchilar orasida bo'linadi
+    send_limiter.global_bucket = TokenBucket(SEND_GLOBAL_RATE / shards, SEND_GLOBAL_RATE / shards)
+    auth_limiter.global_bucket = TokenBucket(AUTH_GLOBAL_RATE_PER_SEC / shards, AUTH_GLOBAL_BURST / shards)
+    if avatar_resolver:
+        avatar_resolver.bucket = TokenBucket(AVATAR_RATE / shards, max(1.0, AVATAR_RATE / shards))
+    # Har bir ishchi faqat o'zi boshlagan broadcastni davom ettiradi
+    root, ext = os.path.splitext(BROADCAST_STATE_FILE)
+    broadcaster.state_path = f"{root}.{index}{ext}"
+    if state_store:
+        root, ext = os.path.splitext(STATE_DB_FILE)
+        state_store.path = f"{root}.{index}{ext}"
+    if REFERRAL_QUEUE_FILE:
+        root, ext = os.path.splitext(REFERRAL_QUEUE_FILE)
+        referral_writer.journal = f"{root}.{index}{ext}"
+    if update_recorder:
+        root, ext = os.path.splitext(UPDATE_RECORD_FILE)
+        update_recorder.path = f"{root}.{index}{ext}"
+    global CACHE_SNAPSHOT_FILE, METRICS_PORT
+    if CACHE_SNAPSHOT_FILE:
+        root, ext = os.path.splitext(CACHE_SNAPSHOT_FILE)
+        CACHE_SNAPSHOT_FILE = f"{root}.{index}{ext}"
+    if METRICS_PORT:
+        METRICS_PORT += 1 + index
+
+    application = build_application(use_updater=False)
+    logger.info(f"Ishchi {index}/{shards} 127.0.0.1:{port} da ishga tushdi")
+    asyncio.run(serve_webhook(
+        application,
+        webhook_url='',
+        secret_token=WEBHOOK_SECRET,
+        listen='127.0.0.1',
+        port=port,
+        url_path=WEBHOOK_PATH,
+        set_webhook=False,
+        drain=drain,
+    ))
+
+
 def main() -> None:
     """Botni ishga tushirish"""
+    startup.mark('imports')
     if BOT_TOKEN == 'YOUR_BOT_TOKEN_HERE':
         logger.error("TELEGRAM_BOT_TOKEN sozlanmagan! .env faylida sozlang.")
         return
-    
-    # Application yaratish
-    application = Application.builder().token(BOT_TOKEN).build()
-    
-    # Command handlerlar
-    application.add_handler(CommandHandler("start", start))
-    application.add_handler(CommandHandler("menu", menu_command))
-    application.add_handler(CommandHandler("help", help_command))
-    application.add_handler(CommandHandler("code", code_command))
-    application.add_handler(CommandHandler("profile", profile_command))
-    application.add_handler(CommandHandler("stats", stats_command))
-    application.add_handler(CommandHandler("premium", premium_command))
-    application.add_handler(CommandHandler("referral", referral_command))
-    
-    # Callback query handlerlar
-    application.add_handler(CallbackQueryHandler(check_membership_callback, pattern="^check_membership$"))
-    application.add_handler(CallbackQueryHandler(menu_callback, pattern="^(menu_|back_to_menu)"))
-    
+
+    if BOT_MODE in ('webhook', 'sharded') and not WEBHOOK_URL:
+        logger.error(f"BOT_MODE={BOT_MODE} uchun WEBHOOK_URL sozlanmagan!")
+        return
+
+    if BOT_MODE == 'sharded':
+        # Webhook serveri (aiohttp.web) faqat kerakli rejimda import qilinadi
+        from sharding import serve_sharded
+
+        allowed_updates = derive_allowed_updates(
+            build_application(use_updater=False), update_stats, observers=(remember_user,)
+        )
+        logger.info(f"🤖 Ravon AI Bot ishga tushdi (sharded rejim, {SHARD_WORKERS} ishchi)...")
+        asyncio.run(serve_sharded(
+            run_worker,
+            bot_token=BOT_TOKEN,
+            webhook_url=WEBHOOK_URL,
+            secret_token=WEBHOOK_SECRET,
+            shards=SHARD_WORKERS,
+            base_port=SHARD_BASE_PORT,
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=allowed_updates,
+            api_base_url=TELEGRAM_API_BASE_URL,
+            # Ishchilar drain + post_shutdown dagi Supabase yozuvlari bilan shu muddatga sig'adi
+            shutdown_timeout=DRAIN_TIMEOUT + HTTP_DEADLINE,
+        ))
+        return
+
+    if BOT_MODE == 'webhook':
+        from webhook import serve_webhook
+
+        application = build_application(use_updater=False)
+        allowed_updates = derive_allowed_updates(application, update_stats, observers=(remember_user,))
+        logger.info("🤖 Ravon AI Bot ishga tushdi (webhook rejimi)...")
+        logger.info(f"📢 Kanal: {CHANNEL_USERNAME}")
+        logger.info(f"🌐 Web App: {WEB_APP_URL}")
+        asyncio.run(serve_webhook(
+            application,
+            webhook_url=WEBHOOK_URL,
+            secret_token=WEBHOOK_SECRET,
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=allowed_updates,
+            drain=drain,
+        ))
+        return
+
     # Botni polling rejimida ishga tushirish
+    application = build_application()
+    allowed_updates = derive_allowed_updates(application, update_stats, observers=(remember_user,))
     logger.info("🤖 Ravon AI Bot ishga tushdi (polling rejimi)...")
     logger.info(f"📢 Kanal: {CHANNEL_USERNAME}")
     logger.info(f"🌐 Web App: {WEB_APP_URL}")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    # To'xtatish signallari drain orqali (post_init da o'rnatiladi)
+    application.run_polling(allowed_updates=allowed_updates, stop_signals=None)
 
 
 if __name__ == '__main__':
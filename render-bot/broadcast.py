@@ -0,0 +1,304 @@
+"""
+Admin ommaviy xabar yuborish (broadcast)
+
+- Qabul qiluvchilar users_cache dan sahifalab olinadi (keyset: telegram_user_id)
+- Xabarlar SendRateLimiter orqali past ustuvorlikda yuboriladi: foydalanuvchilarga
+  javoblar oldin o'tadi, global chegara va 429 (RetryAfter) limiterda hisobga olinadi
+- Botni bloklagan / o'chirilgan foydalanuvchilar o'tkazib yuboriladi
+- Holat JSON faylga (asyncio.to_thread da) yoziladi: qayta ishga tushganda
+  yuborilganlarga qayta yuborilmaydi. Bot to'xtayotganda yangi yuborishlar
+  to'xtatiladi, boshlanganlari `shutdown_grace` ichida tugab holatga yoziladi
+- Bitta status xabari muntazam tahrirlanadi (tezlik va ETA bilan)
+- Matn (HTML) boshlashdan oldin adminga namuna sifatida yuboriladi - belgilash
+  xato bo'lsa broadcast boshlanmaydi (har bir qabul qiluvchida BadRequest bo'lmaydi)
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from telegram import Bot
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+
+from templates import Screen
+
+logger = logging.getLogger(__name__)
+
+# after, limit -> (telegram_user_id lar, jami soni yoki None)
+FetchPage = Callable[[str, int], Awaitable[Tuple[List[str], Optional[int]]]]
+StatusRenderer = Callable[[dict], Screen]
+
+LOW_PRIORITY = {"priority": "low"}
+
+
+class Broadcaster:
+    """Bitta vaqtda bitta broadcast - sahifalab, parallel va tiklanadigan"""
+
+    def __init__(self, fetch_page: FetchPage, render_status: StatusRenderer, state_path: str,
+                 concurrency: int = 32, page_size: int = 500, status_interval: float = 5.0,
+                 checkpoint_interval: float = 1.0, shutdown_grace: float = 5.0):
+        self.fetch_page = fetch_page
+        self.render_status = render_status
+        self.state_path = state_path
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self.status_interval = status_interval
+        self.checkpoint_interval = checkpoint_interval
+        self.shutdown_grace = shutdown_grace
+        self.state: Optional[dict] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        # Bot to'xtamoqda (admin emas) - status "running" qoladi
+        self._shutting_down = False
+        self._save_lock = asyncio.Lock()
+        self._run_started = 0.0
+        self._run_sent_base = 0
+        self._saved_at = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    # ---------- holat fayli ----------
+
+    def _load(self) -> Optional[dict]:
+        try:
+            with open(self.state_path, encoding='utf-8') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.error(f"Broadcast holatini o'qib bo'lmadi: {e!r}")
+            return None
+        # Faylda ro'yxat, xotirada to'plam
+        state["page_done"] = set(state.get("page_done", ()))
+        return state
+
+    def _write(self, data: str) -> None:
+        """Holatni faylga yozish (to_thread da)"""
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        # Atomar almashtirish - yarim yozilgan fayl qolmaydi
+        os.replace(tmp_path, self.state_path)
+
+    async def _save(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and (now - self._saved_at < self.checkpoint_interval or self._save_lock.locked()):
+            return
+        self._saved_at = now
+        async with self._save_lock:
+            # Nusxa event loopda olinadi - yozish paytida holat o'zgarishi mumkin
+            data = json.dumps(dict(self.state, page_done=list(self.state["page_done"])))
+            write = asyncio.ensure_future(asyncio.to_thread(self._write, data))
+            try:
+                await asyncio.shield(write)
+            except asyncio.CancelledError:
+                # Fayl yozilib bo'lguncha lock qo'yib yuborilmaydi
+                await asyncio.gather(write, return_exceptions=True)
+                raise
+
+    # ---------- boshqaruv ----------
+
+    async def start(self, bot: Bot, admin_chat_id: int, source: dict) -> bool:
+        """Yangi broadcastni boshlash (boshqasi ishlayotgan bo'lsa - False)
+
+        Matn HTML sifatida o'qilmasa BadRequest (broadcast boshlanmaydi).
+        """
+        if self.running:
+            return False
+        if source["type"] == "text":
+            # Namuna: Telegram HTML ni qabul qilmasa shu yerda to'xtaydi
+            await bot.send_message(admin_chat_id, source["text"], parse_mode='HTML')
+        status = await bot.send_message(admin_chat_id, "📣 Broadcast boshlanmoqda...")
+        self.state = {
+            "source": source,
+            "admin_chat_id": admin_chat_id,
+            "status_message_id": status.message_id,
+            "status": "running",
+            "cursor": "",
+            "page_done": set(),
+            "total": None,
+            "sent": 0,
+            "skipped": 0,
+            "failed": 0,
+            "started_at": time.time(),
+        }
+        await self._save(force=True)
+        self._launch(bot)
+        return True
+
+    async def resume(self, bot: Bot, include_stopped: bool = False) -> bool:
+        """Tugallanmagan broadcastni davom ettirish
+
+        Bot ishga tushganda "running" holatdagisi avtomatik davom etadi;
+        include_stopped=True - admin to'xtatgan yoki xato bilan tugaganini ham.
+        """
+        if self.running:
+            return False
+        state = self._load()
+        statuses = ("running", "stopped", "failed") if include_stopped else ("running",)
+        if not state or state.get("status") not in statuses:
+            return False
+        state["status"] = "running"
+        self.state = state
+        logger.info(f"Broadcast davom ettirilmoqda: {state['sent']} ta yuborilgan, cursor={state['cursor']!r}")
+        self._launch(bot)
+        return True
+
+    async def stop(self) -> bool:
+        """Broadcastni to'xtatish (holat saqlanadi)"""
+        if not self.running:
+            return False
+        self._stopping = True
+        await self._task
+        return True
+
+    async def shutdown(self) -> None:
+        """Bot to'xtayotganda - joriy holatni saqlab, keyin davom ettirish uchun qoldirish
+
+        Yangi yuborishlar to'xtatiladi; boshlanganlari shutdown_grace ichida tugab
+        page_done ga yoziladi (bekor qilinganlari keyin qayta yuborilishi mumkin).
+        """
+        if not self.running:
+            return
+        self._shutting_down = True
+        self._stopping = True
+        await asyncio.wait((self._task,), timeout=self.shutdown_grace)
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+    def _launch(self, bot: Bot) -> None:
+        self._stopping = False
+        self._shutting_down = False
+        self._run_started = time.monotonic()
+        self._run_sent_base = self.state["sent"] + self.state["skipped"] + self.state["failed"]
+        self._task = asyncio.create_task(self._run(bot), name="broadcast")
+
+    # ---------- yuborish ----------
+
+    async def _deliver(self, bot: Bot, chat_id: int) -> str:
+        source = self.state["source"]
+        try:
+            if source["type"] == "copy":
+                await bot.copy_message(chat_id, source["from_chat_id"], source["message_id"],
+                                       rate_limit_args=LOW_PRIORITY)
+            else:
+                await bot.send_message(chat_id, source["text"], parse_mode='HTML',
+                                       rate_limit_args=LOW_PRIORITY)
+            return "sent"
+        except Forbidden:
+            # Botni bloklagan yoki akkaunti o'chirilgan
+            return "skipped"
+        except BadRequest as e:
+            if 'chat not found' in e.message.lower():
+                return "skipped"
+            if "can't parse entities" in e.message.lower():
+                # Matnning o'zi xato - qolganlariga ham yuborilmaydi
+                logger.error(f"Broadcast matni HTML sifatida o'qilmadi, to'xtatildi: {e.message}")
+                self._stopping = True
+                return "failed"
+            logger.warning(f"Broadcast {chat_id}: {e.message}")
+            return "failed"
+        except RetryAfter:
+            # Limiter qayta urinishlari tugadi
+            return "failed"
+        except TelegramError as e:
+            logger.warning(f"Broadcast {chat_id}: {e!r}")
+            return "failed"
+
+    async def _send_page(self, bot: Bot, user_ids: List[str]) -> None:
+        done = self.state["page_done"]
+        pending = iter([uid for uid in user_ids if uid not in done])
+
+        async def worker() -> None:
+            for uid in pending:
+                if self._stopping:
+                    return
+                outcome = await self._deliver(bot, int(uid))
+                self.state[outcome] += 1
+                done.add(uid)
+                await self._save()
+
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+
+    async def _run(self, bot: Bot) -> None:
+        reporter = asyncio.create_task(self._report_loop(bot))
+        try:
+            while not self._stopping:
+                user_ids, total = await self.fetch_page(self.state["cursor"], self.page_size)
+                if total is not None:
+                    self.state["total"] = total
+                if not user_ids:
+                    self.state["status"] = "done"
+                    break
+                await self._send_page(bot, user_ids)
+                if self._stopping:
+                    break
+                # Sahifa to'liq yuborildi - cursor keyingi sahifaga o'tadi
+                self.state["cursor"] = user_ids[-1]
+                self.state["page_done"] = set()
+                await self._save(force=True)
+            if self._stopping and not self._shutting_down:
+                self.state["status"] = "stopped"
+        except asyncio.CancelledError:
+            # Bot to'xtatilmoqda - status "running" qoladi, keyingi ishga tushishda davom etadi
+            await self._save(force=True)
+            raise
+        except Exception as e:
+            logger.error(f"Broadcast xatosi: {e!r}")
+            self.state["status"] = "failed"
+        finally:
+            reporter.cancel()
+            await asyncio.gather(reporter, return_exceptions=True)
+        await self._save(force=True)
+        await self._update_status(bot)
+        logger.info(f"Broadcast yakunlandi: {self.stats()}")
+
+    # ---------- status ----------
+
+    def stats(self) -> dict:
+        """Joriy broadcast ko'rsatkichlari (tezlik va ETA bilan)"""
+        if self.state is None:
+            return {}
+        state = self.state
+        processed = state["sent"] + state["skipped"] + state["failed"]
+        elapsed = time.monotonic() - self._run_started if self._run_started else 0.0
+        rate = (processed - self._run_sent_base) / elapsed if elapsed > 0 else 0.0
+        eta = None
+        if state["total"] and rate > 0:
+            eta = max(0.0, (state["total"] - processed) / rate)
+        return {
+            "status": state["status"],
+            "total": state["total"],
+            "processed": processed,
+            "sent": state["sent"],
+            "skipped": state["skipped"],
+            "failed": state["failed"],
+            "rate": round(rate, 1),
+            "eta": eta,
+        }
+
+    async def _update_status(self, bot: Bot) -> None:
+        screen = self.render_status(self.stats())
+        try:
+            await bot.edit_message_text(
+                screen.text,
+                chat_id=self.state["admin_chat_id"],
+                message_id=self.state["status_message_id"],
+                parse_mode='HTML',
+                reply_markup=screen.keyboard,
+            )
+        except BadRequest as e:
+            if 'not modified' not in e.message.lower():
+                logger.warning(f"Broadcast status xabarini tahrirlab bo'lmadi: {e.message}")
+        except TelegramError as e:
+            logger.warning(f"Broadcast status xabarini tahrirlab bo'lmadi: {e!r}")
+
+    async def _report_loop(self, bot: Bot) -> None:
+        while True:
+            await asyncio.sleep(self.status_interval)
+            await self._update_status(bot)
@@ -0,0 +1,120 @@
+"""
+Circuit breaker va qayta urinishlar byudjeti
+
+CircuitBreaker ketma-ket xatolar `failure_threshold` ga yetganda ochiladi va
+`reset_timeout` soniya davomida so'rovlarni darhol rad etadi - ishlamayotgan
+backendga yangi so'rovlar to'planib qolmaydi. Keyin bitta sinov so'rovi
+o'tkaziladi (half-open): muvaffaqiyatli bo'lsa yopiladi, aks holda yana ochiladi.
+
+RetryBudget qayta urinishlarni asosiy so'rovlar ulushi bilan cheklaydi
+(masalan 20%): backend sekinlashganda qayta urinishlar yukni ko'paytirmaydi.
+"""
+
+import random
+import time
+from typing import Optional
+
+from ravon_botkit.ratelimit import TokenBucket
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """Bitta endpoint uchun holatlar: closed -> open -> half_open -> closed"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_started = 0.0
+        # Hisoblagichlar
+        self.opened = 0
+        self.rejected = 0
+
+    def retry_after(self) -> float:
+        """Ochiq bo'lsa - sinov so'rovigacha qolgan vaqt"""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self) -> bool:
+        """So'rov yuborish mumkinmi (False - darhol rad etish)"""
+        if self.state == OPEN and self.retry_after() == 0.0:
+            self.state = HALF_OPEN
+        if self.state == CLOSED:
+            return True
+        # Sinov so'rovi bekor qilinib natija yozilmasa ham, breaker qotib qolmaydi
+        now = time.monotonic()
+        if self.state == HALF_OPEN and now - self._probe_started >= self.reset_timeout:
+            self._probe_started = now
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self) -> None:
+        self.state = CLOSED
+        self.failures = 0
+        self._probe_started = 0.0
+
+    def record_failure(self) -> None:
+        self._probe_started = 0.0
+        self.failures += 1
+        if self.state == OPEN:
+            # Ochilishdan oldin yuborilgan so'rovlar ochiq vaqtni uzaytirmaydi
+            return
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened += 1
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "opened": self.opened,
+            "rejected": self.rejected,
+            "retry_after": round(self.retry_after(), 1),
+        }
+
+
+class RetryBudget:
+    """Qayta urinishlar = asosiy so'rovlarning `ratio` ulushi + soniyasiga `min_per_sec`"""
+
+    def __init__(self, ratio: float = 0.2, min_per_sec: float = 1.0, max_balance: float = 100.0):
+        self.ratio = ratio
+        self.max_balance = max_balance
+        self.balance = 0.0
+        # Trafik kam bo'lganda ham bir nechta qayta urinishga ruxsat
+        self.floor = TokenBucket(min_per_sec, max(1.0, min_per_sec * 10))
+        self.granted = 0
+        self.exhausted = 0
+
+    def deposit(self) -> None:
+        """Har bir asosiy so'rovda chaqiriladi"""
+        self.balance = min(self.max_balance, self.balance + self.ratio)
+
+    def try_withdraw(self) -> bool:
+        """Qayta urinishga ruxsat bormi"""
+        if self.balance >= 1.0:
+            self.balance -= 1.0
+        elif not self.floor.try_acquire():
+            self.exhausted += 1
+            return False
+        self.granted += 1
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "balance": round(self.balance, 1),
+            "granted": self.granted,
+            "exhausted": self.exhausted,
+        }
+
+
+def backoff_delay(attempt: int, base: float = 0.2, cap: float = 2.0, rng: Optional[random.Random] = None) -> float:
+    """"Full jitter" eksponensial kutish: [0, min(cap, base * 2^attempt)]"""
+    return (rng or random).uniform(0.0, min(cap, base * (2 ** attempt)))
@@ -0,0 +1,142 @@
+"""
+Jadval asosidagi dispatcher - komandalar va callback tugmalari uchun yagona ro'yxat
+
+callback_data formati: "<namespace>:<action>[:<arg>]", masalan "menu:profile".
+Eski formatdagi tugmalar ("menu_profile", "back_to_menu", "check_membership")
+oldin yuborilgan xabarlarda qolgani uchun ular ham tushuniladi.
+
+Callback lar bitta CallbackQueryHandler orqali qabul qilinadi va lug'atdan
+O(1) da topiladi - menyu kattalashganda ham dispatch narxi o'zgarmaydi.
+"""
+
+import logging
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+
+from telegram import Update
+from telegram.ext import Application, CallbackQueryHandler, CommandHandler, ContextTypes
+
+from templates import Screen
+
+logger = logging.getLogger(__name__)
+
+# Eski callback_data -> (namespace, action)
+LEGACY_CALLBACKS = {
+    "back_to_menu": ("menu", "main"),
+    "check_membership": ("auth", "check"),
+}
+
+
+class CallbackData(NamedTuple):
+    """Tahlil qilingan callback_data"""
+    namespace: str
+    action: str
+    arg: str = ''
+
+
+def build_callback_data(namespace: str, action: str, arg: str = '') -> str:
+    """callback_data satrini yaratish (Telegram chegarasi - 64 bayt)"""
+    data = f"{namespace}:{action}:{arg}" if arg else f"{namespace}:{action}"
+    if len(data.encode()) > 64:
+        raise ValueError(f"callback_data 64 baytdan uzun: {data}")
+    return data
+
+
+def parse_callback_data(data: str) -> Optional[CallbackData]:
+    """callback_data ni (namespace, action, arg) ga ajratish"""
+    if not data:
+        return None
+    if ':' in data:
+        parts = data.split(':', 2)
+        if len(parts) == 2:
+            return CallbackData(parts[0], parts[1])
+        return CallbackData(*parts)
+    if data in LEGACY_CALLBACKS:
+        return CallbackData(*LEGACY_CALLBACKS[data])
+    if data.startswith('menu_'):
+        return CallbackData('menu', data[len('menu_'):])
+    return None
+
+
+async def reply_screen(message, screen: Screen) -> None:
+    """Ekranni yangi xabar sifatida yuborish"""
+    await message.reply_text(screen.text, parse_mode='HTML', reply_markup=screen.keyboard)
+
+
+async def edit_screen(query, screen: Screen) -> None:
+    """Callback xabarini ekran bilan almashtirish"""
+    await query.edit_message_text(screen.text, parse_mode='HTML', reply_markup=screen.keyboard)
+
+
+HandlerCallback = Callable[[Update, ContextTypes.DEFAULT_TYPE], Awaitable[None]]
+ScreenRenderer = Callable[..., Awaitable[Screen]]
+
+
+class Dispatcher:
+    """Komanda va callback marshrutlari jadvali
+
+    middleware berilsa, har bir handler ro'yxatdan o'tishda u bilan o'raladi
+    (masalan metrics.instrument) - dekorator esa asl funksiyani qaytaradi.
+    """
+
+    def __init__(self, middleware: Optional[Callable[[HandlerCallback], HandlerCallback]] = None):
+        self.middleware = middleware
+        self.commands: Dict[str, HandlerCallback] = {}
+        self.routes: Dict[Tuple[str, str], HandlerCallback] = {}
+
+    def _wrap(self, callback: HandlerCallback) -> HandlerCallback:
+        return self.middleware(callback) if self.middleware else callback
+
+    def command(self, name: str):
+        """Slash komanda handlerini ro'yxatdan o'tkazish"""
+        def decorator(callback: HandlerCallback) -> HandlerCallback:
+            self.commands[name] = self._wrap(callback)
+            return callback
+        return decorator
+
+    def callback(self, namespace: str, action: str):
+        """Callback tugma handlerini ro'yxatdan o'tkazish"""
+        def decorator(callback: HandlerCallback) -> HandlerCallback:
+            self.routes[(namespace, action)] = self._wrap(callback)
+            return callback
+        return decorator
+
+    def screen(self, name: str, command: Optional[str] = None):
+        """Menyu ekranini ro'yxatdan o'tkazish
+
+        renderer(user) -> Screen. Tugma ("menu:<name>") xabarni tahrirlaydi,
+        komanda (agar berilgan bo'lsa) yangi xabar yuboradi.
+        """
+        def decorator(render: ScreenRenderer) -> ScreenRenderer:
+            async def on_button(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+                query = update.callback_query
+                await query.answer()
+                await edit_screen(query, await render(query.from_user))
+
+            async def on_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+                await reply_screen(update.message, await render(update.effective_user))
+
+            on_button.__name__ = f"{render.__name__}_button"
+            on_command.__name__ = f"{render.__name__}_command"
+            self.routes[('menu', name)] = self._wrap(on_button)
+            if command:
+                self.commands[command] = self._wrap(on_command)
+            return render
+        return decorator
+
+    async def handle_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Barcha callback querylar uchun yagona kirish nuqtasi"""
+        query = update.callback_query
+        parsed = parse_callback_data(query.data)
+        handler = self.routes.get((parsed.namespace, parsed.action)) if parsed else None
+        if handler is None:
+            logger.warning(f"Noma'lum callback_data: {query.data!r}")
+            await query.answer()
+            return
+        context.callback_args = parsed
+        await handler(update, context)
+
+    def install(self, application: Application) -> None:
+        """Barcha komandalar va bitta CallbackQueryHandler ni qo'shish"""
+        for name, callback in self.commands.items():
+            application.add_handler(CommandHandler(name, callback))
+        application.add_handler(CallbackQueryHandler(self.handle_callback))
@@ -0,0 +1,119 @@
+"""
+Deploy paytida to'xtash: yangi updatelarni to'xtatib, boshlanganlarini tugatish
+
+Render servisni qayta ishga tushirganda SIGTERM yuboradi va ~30 soniyadan keyin
+jarayonni o'ldiradi. Drain tartibi:
+
+1. yangi updatelar qabul qilinmaydi - polling: getUpdates to'xtatiladi va
+   olingan updatelar offseti Telegramga tasdiqlanadi (yangi instansiya ularni
+   qayta olmaydi va eski bilan poyga qilmaydi); webhook: yangi POST larga 503,
+   Telegram ularni keyinroq (yangi instansiyaga) qayta yuboradi
+2. navbatdagi va ishlanayotgan updatelar `timeout` ichida tugatiladi
+3. muddat o'tsa (yoki ikkinchi signal kelsa) qolganlari bekor qilinadi
+4. keyin odatdagi to'xtash: persistence flush, post_shutdown dagi BatchWriter lar
+
+Natija (drained/abandoned) logga va stats() orqali /metrics ga chiqadi.
+"""
+
+import asyncio
+import logging
+import signal
+import time
+from typing import Optional
+
+from telegram.ext import Application
+
+from ravon_botkit.update_processor import ChatOrderedUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+STOP_SIGNALS = (signal.SIGINT, signal.SIGTERM)
+
+
+class GracefulDrain:
+    """SIGTERM da updatelarni muddat bilan tugatib to'xtash"""
+
+    def __init__(self, processor: ChatOrderedUpdateProcessor, timeout: float = 15.0):
+        self.processor = processor
+        self.timeout = timeout
+        self.draining = False
+        self._force = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        # Natija
+        self.rejected = 0
+        self.drained = 0
+        self.abandoned_running = 0
+        self.abandoned_waiting = 0
+        self.duration = 0.0
+
+    def install(self, application: Application) -> None:
+        """Polling rejimi: run_polling(stop_signals=None) bilan, post_init da chaqiriladi"""
+        loop = asyncio.get_running_loop()
+        for sig in STOP_SIGNALS:
+            try:
+                loop.add_signal_handler(sig, self.signal, application)
+            except NotImplementedError:
+                pass
+
+    def signal(self, application: Application) -> None:
+        """Birinchi signal - drain, keyingisi - kutmasdan to'xtash"""
+        if self.draining:
+            self.force()
+            return
+        self._task = asyncio.create_task(self._drain_and_stop(application), name="drain")
+
+    def force(self) -> None:
+        logger.warning("Takroriy to'xtatish signali - qolgan updatelar kutilmaydi")
+        self._force.set()
+
+    async def _drain_and_stop(self, application: Application) -> None:
+        try:
+            await self.drain(application)
+        finally:
+            application.stop_running()
+
+    async def drain(self, application: Application) -> None:
+        """Yangi updatelarni to'xtatish va boshlanganlarini kutish (ko'pi bilan timeout)"""
+        self.draining = True
+        started = time.monotonic()
+        processed = self.processor.processed
+        logger.info(f"To'xtatish signali: navbatdagi updatelar {self.timeout:.0f}s gacha tugatiladi")
+
+        if application.updater is not None and application.updater.running:
+            await application.updater.stop()
+            if self.processor.last_update_id is not None:
+                logger.info(f"Polling to'xtatildi, offset {self.processor.last_update_id + 1} tasdiqlandi")
+
+        idle = await self.processor.wait_idle(application.update_queue, self.timeout, self._force)
+        self.drained = self.processor.processed - processed
+        if not idle:
+            queued = self._drop_queued(application.update_queue)
+            self.abandoned_running, waiting = self.processor.abandon()
+            self.abandoned_waiting = queued + waiting
+            # Bekor qilingan tasklar update_queue.task_done() ni chaqirib ulgurishi uchun
+            await self.processor.wait_idle(application.update_queue, 1.0)
+
+        self.duration = time.monotonic() - started
+        logger.info(f"Drain: {self.stats()}")
+
+    @staticmethod
+    def _drop_queued(update_queue: asyncio.Queue) -> int:
+        """Hali processorga yetib bormagan updatelarni tashlash"""
+        dropped = 0
+        while True:
+            try:
+                update_queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return dropped
+            update_queue.task_done()
+            dropped += 1
+
+    def stats(self) -> dict:
+        return {
+            "draining": self.draining,
+            "drained": self.drained,
+            "abandoned_running": self.abandoned_running,
+            "abandoned_waiting": self.abandoned_waiting,
+            "rejected": self.rejected,
+            "seconds": round(self.duration, 2),
+        }
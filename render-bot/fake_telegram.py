@@ -0,0 +1,243 @@
+"""
+Lokal fake Telegram Bot API server - sharded/webhook rejimlarini sinash uchun
+
+Bot TELEGRAM_API_BASE_URL=http://127.0.0.1:8081 bilan ishga tushiriladi. Server
+getMe, setWebhook, sendMessage va boshqa metodlarga soxta javob qaytaradi,
+getUpdates (long polling) push_update() bilan qo'shilgan updatelarni beradi.
+--updates berilsa o'rnatilgan webhookka sintetik /help, /menu, /premium
+updatelarini yuboradi va bot javoblari sonini kutib, natijani chiqaradi.
+To'liq yuk sinovi uchun bench.py ga qarang.
+
+Ishlatish:
+    python fake_telegram.py --port 8081
+    python fake_telegram.py --port 8081 --updates 5000 --users 500 --concurrency 64
+"""
+
+import argparse
+import asyncio
+import itertools
+import logging
+import time
+from collections import Counter, deque
+from typing import Callable, Optional
+
+import aiohttp
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+COMMANDS = ('/help', '/menu', '/premium')
+
+# getMe dagi bot - kanalda admin (a'zolik updatelari shu holatda keladi)
+BOT_ID = 1
+BOT_ADMIN = {
+    "status": "administrator",
+    "user": {"id": BOT_ID, "is_bot": True, "first_name": "Fake"},
+    "can_be_edited": False, "is_anonymous": False, "can_manage_chat": True, "can_delete_messages": False,
+    "can_manage_video_chats": False, "can_restrict_members": False, "can_promote_members": False,
+    "can_change_info": False, "can_invite_users": True, "can_post_stories": False, "can_edit_stories": False,
+    "can_delete_stories": False,
+}
+
+
+class FakeTelegram:
+    """Bot API metodlariga soxta javoblar va statistika"""
+
+    def __init__(self, member_status: str = 'member', latency: float = 0.0):
+        self.member_status = member_status
+        # Har bir metod javobidan oldingi sun'iy kechikish (getUpdates dan tashqari)
+        self.latency = latency
+        # on_call(method, params) - har bir so'rovda chaqiriladi (benchmark uchun)
+        self.on_call: Optional[Callable[[str, dict], None]] = None
+        self.webhook_url: Optional[str] = None
+        self.secret_token = ''
+        self.calls = Counter()
+        self.sent = Counter()  # chat_id -> yuborilgan xabarlar
+        self.sent_total = 0
+        self._message_id = 0
+        self.webhook_ready = asyncio.Event()
+        self.polling_ready = asyncio.Event()
+        self._updates: deque = deque()
+        self._update_ids = itertools.count(1)
+        self._updates_ready = asyncio.Event()
+
+    def next_update_id(self) -> int:
+        return next(self._update_ids)
+
+    def push_update(self, update: dict) -> int:
+        """getUpdates navbatiga update qo'shish (update_id shu yerda beriladi)"""
+        update_id = self.next_update_id()
+        self._updates.append(dict(update, update_id=update_id))
+        self._updates_ready.set()
+        return update_id
+
+    async def _get_updates(self, params: dict) -> list:
+        self.polling_ready.set()
+        offset = int(params.get('offset') or 0)
+        # offset dan kichiklari bot tomonidan tasdiqlangan
+        while self._updates and self._updates[0]['update_id'] < offset:
+            self._updates.popleft()
+        timeout = float(params.get('timeout') or 0)
+        if not self._updates and timeout > 0:
+            self._updates_ready.clear()
+            try:
+                await asyncio.wait_for(self._updates_ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        limit = int(params.get('limit') or 100)
+        return list(itertools.islice(self._updates, limit))
+
+    def _message(self, chat_id, text: str) -> dict:
+        self._message_id += 1
+        return {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id), "type": "private"},
+            "text": text,
+        }
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        if request.content_type == 'application/json':
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+        self.calls[method] += 1
+        if method.lower() == 'getupdates':
+            return web.json_response({"ok": True, "result": await self._get_updates(params)})
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        result = self._result(method, params)
+        if self.on_call is not None:
+            self.on_call(method, params)
+        return web.json_response({"ok": True, "result": result})
+
+    def _result(self, method: str, params: dict):
+        name = method.lower()
+        if name == 'getme':
+            return {"id": BOT_ID, "is_bot": True, "first_name": "Fake", "username": "fake_bot",
+                    "can_join_groups": False, "can_read_all_group_messages": False,
+                    "supports_inline_queries": False}
+        if name == 'setwebhook':
+            self.webhook_url = params.get('url')
+            self.secret_token = params.get('secret_token', '')
+            self.webhook_ready.set()
+            logger.info(f"Webhook o'rnatildi: {self.webhook_url}")
+            return True
+        if name == 'getchat':
+            return {"id": int(params.get('chat_id', 0)), "type": "channel", "title": "Fake kanal",
+                    "accent_color_id": 0, "max_reaction_count": 11}
+        if name == 'getchatmember':
+            if int(params.get('user_id', 0)) == BOT_ID:
+                return BOT_ADMIN
+            return {"status": self.member_status,
+                    "user": {"id": int(params.get('user_id', 0)), "is_bot": False, "first_name": "U"}}
+        if name == 'getuserprofilephotos':
+            # Juft ID li foydalanuvchilarda avatar bor
+            user_id = int(params.get('user_id', 0))
+            if user_id % 2:
+                return {"total_count": 0, "photos": []}
+            return {"total_count": 1, "photos": [[
+                {"file_id": f"photo-{user_id}-{width}", "file_unique_id": f"u{user_id}-{width}",
+                 "width": width, "height": width} for width in (160, 320, 640)
+            ]]}
+        if name.startswith('send') or name.startswith('edit'):
+            chat_id = params.get('chat_id', 0)
+            self.sent[chat_id] += 1
+            self.sent_total += 1
+            return self._message(chat_id, params.get('text', ''))
+        return True
+
+    def build_web_app(self) -> web.Application:
+        web_app = web.Application()
+        web_app.router.add_post('/bot{token}/{method}', self.handle)
+        web_app.router.add_get('/bot{token}/{method}', self.handle)
+        return web_app
+
+
+def make_update(update_id: int, user_id: int, text: str) -> dict:
+    """Sintetik shaxsiy chat xabari"""
+    user = {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"}
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": user,
+            "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(text)}],
+        },
+    }
+
+
+async def send_updates(fake: FakeTelegram, updates: int, users: int, concurrency: int,
+                       timeout: float = 120.0) -> dict:
+    """Webhookka updatelarni yuborish va barcha javoblarni kutish"""
+    await fake.webhook_ready.wait()
+    headers = {'X-Telegram-Bot-Api-Secret-Token': fake.secret_token}
+    semaphore = asyncio.Semaphore(concurrency)
+    sent_before = fake.sent_total
+    errors = 0
+
+    async with aiohttp.ClientSession() as session:
+        async def post(update_id: int) -> None:
+            nonlocal errors
+            user_id = 1000 + update_id % users
+            update = make_update(update_id, user_id, COMMANDS[update_id % len(COMMANDS)])
+            async with semaphore:
+                async with session.post(fake.webhook_url, json=update, headers=headers) as response:
+                    if response.status != 200:
+                        errors += 1
+
+        started = time.monotonic()
+        await asyncio.gather(*(post(i) for i in range(1, updates + 1)))
+        ingested = time.monotonic() - started
+
+        deadline = started + timeout
+        while fake.sent_total - sent_before < updates and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        elapsed = time.monotonic() - started
+
+    replies = fake.sent_total - sent_before
+    return {
+        "updates": updates,
+        "users": users,
+        "webhook_errors": errors,
+        "replies": replies,
+        "ingest_seconds": round(ingested, 3),
+        "total_seconds": round(elapsed, 3),
+        "updates_per_second": round(replies / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    fake = FakeTelegram(member_status=args.member_status)
+    runner = web.AppRunner(fake.build_web_app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, args.host, args.port, backlog=1024).start()
+    logger.info(f"Fake Telegram {args.host}:{args.port} da tinglayapti")
+    try:
+        if args.updates:
+            result = await send_updates(fake, args.updates, args.users, args.concurrency)
+            logger.info(f"Natija: {result}")
+            logger.info(f"Metodlar: {dict(fake.calls)}")
+        else:
+            await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Lokal fake Telegram Bot API server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--member-status', default='member')
+    parser.add_argument('--updates', type=int, default=0, help="webhookka yuboriladigan updatelar soni")
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=64)
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
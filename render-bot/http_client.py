@@ -0,0 +1,216 @@
+"""
+Supabase Edge Function lar uchun umumiy HTTP klient
+
+Bitta aiohttp.ClientSession butun bot davomida qayta ishlatiladi:
+- keep-alive ulanishlar puli (har so'rovda yangi TLS handshake yo'q)
+- host bo'yicha ulanishlar chegarasi
+- DNS kesh
+- sozlanadigan timeoutlar
+- har bir endpoint uchun circuit breaker, qayta urinishlar byudjeti va
+  har bir chaqiruv uchun umumiy muddat (deadline)
+
+Sessiya Application lifecycle ga bog'langan: post_init da ochiladi,
+post_shutdown da yopiladi.
+"""
+
+import asyncio
+import logging
+from typing import Dict, Optional, Sequence, Tuple
+
+import aiohttp
+
+from circuit import CLOSED, CircuitBreaker, RetryBudget, backoff_delay
+
+logger = logging.getLogger(__name__)
+
+# Backend nosozligi hisoblanadigan javoblar (qayta urinish mumkin)
+RETRY_STATUSES = frozenset({500, 502, 503, 504})
+UNAVAILABLE_ERROR = "Server vaqtincha ishlamayapti"
+# Breaker yopiq, lekin urinishlar tugaganda foydalanuvchiga taklif qilinadigan kutish
+UNAVAILABLE_RETRY_AFTER = 5.0
+# Deadline gacha shundan kam vaqt qolsa, qayta urinish befoyda
+MIN_ATTEMPT_TIME = 0.25
+
+
+class SupabaseClient:
+    """Supabase Edge Function lar uchun pool qilingan klient"""
+
+    def __init__(
+        self,
+        base_url: str,
+        anon_key: str,
+        pool_size: int = 100,
+        pool_per_host: int = 20,
+        dns_cache_ttl: int = 300,
+        keepalive_timeout: float = 60.0,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 15.0,
+        total_timeout: float = 20.0,
+        deadline: float = 8.0,
+        max_retries: int = 2,
+        retry_budget_ratio: float = 0.2,
+        breaker_failure_threshold: int = 5,
+        breaker_reset_timeout: float = 30.0,
+    ):
+        self.base_url = base_url.rstrip('/')
+        self.default_headers = {
+            "Content-Type": "application/json",
+            "apikey": anon_key,
+            "Authorization": f"Bearer {anon_key}"
+        }
+        self.pool_size = pool_size
+        self.pool_per_host = pool_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = aiohttp.ClientTimeout(
+            total=total_timeout,
+            connect=connect_timeout,
+            sock_read=read_timeout,
+        )
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.breaker_failure_threshold = breaker_failure_threshold
+        self.breaker_reset_timeout = breaker_reset_timeout
+        self.retry_budget = RetryBudget(ratio=retry_budget_ratio)
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """Ochiq sessiya (kerak bo'lsa yaratiladi)"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                limit_per_host=self.pool_per_host,
+                ttl_dns_cache=self.dns_cache_ttl,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout,
+                headers=self.default_headers,
+            )
+        return self._session
+
+    async def start(self) -> None:
+        """Sessiyani ochish (post_init da chaqiriladi)"""
+        _ = self.session
+        logger.info(
+            f"Supabase HTTP pool ochildi: limit={self.pool_size}, "
+            f"per_host={self.pool_per_host}, dns_ttl={self.dns_cache_ttl}s"
+        )
+
+    async def warmup(self, endpoints: Sequence[str], connections: int) -> int:
+        """Ishga tushishda keep-alive ulanishlarni oldindan ochish
+
+        Parallel OPTIONS (CORS preflight) so'rovlari har biri alohida TCP+TLS
+        ulanish ochadi va Edge Function larni uyg'otadi, hech narsa o'zgartirmaydi.
+        Breaker va qayta urinishlar byudjetiga ta'sir qilmaydi. Natija -
+        javob bergan so'rovlar soni.
+        """
+        async def probe(endpoint: str) -> bool:
+            try:
+                async with self.session.options(f"{self.base_url}/functions/v1/{endpoint}") as response:
+                    await response.read()
+                    return response.status < 500
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning(f"Supabase {endpoint} ga oldindan ulanib bo'lmadi: {e!r}")
+                return False
+
+        results = await asyncio.gather(*(probe(endpoints[i % len(endpoints)]) for i in range(connections)))
+        return sum(results)
+
+    async def close(self) -> None:
+        """Sessiyani yopish (post_shutdown da chaqiriladi)"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        logger.info("Supabase HTTP pool yopildi")
+
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        """Endpoint ning circuit breaker i (kerak bo'lsa yaratiladi)"""
+        breaker = self.breakers.get(endpoint)
+        if breaker is None:
+            breaker = CircuitBreaker(self.breaker_failure_threshold, self.breaker_reset_timeout)
+            self.breakers[endpoint] = breaker
+        return breaker
+
+    async def request(self, endpoint: str, method: str = 'POST', data: dict = None, headers: dict = None,
+                      deadline: Optional[float] = None, idempotent: bool = True) -> dict:
+        """Edge Function ga so'rov yuborish
+
+        Xatoda {"error"}. Breaker ochiq bo'lsa yoki backend muddat ichida javob
+        bermasa {"error", "unavailable": True, "retry_after"} - foydalanuvchiga
+        darhol "biroz keyin urinib ko'ring" javobi berish uchun.
+
+        idempotent=False - so'rov serverga yetib borgan bo'lsa (timeout, 5xx)
+        qayta yuborilmaydi: birinchi urinish bajarilib ulgurgan bo'lishi mumkin.
+        Ulanib bo'lmagan holatda (so'rov yuborilmagan) qayta urinish xavfsiz.
+        """
+        url = f"{self.base_url}/functions/v1/{endpoint}"
+        breaker = self.breaker(endpoint)
+        if not breaker.allow():
+            return self._unavailable(breaker)
+
+        self.retry_budget.deposit()
+        loop = asyncio.get_running_loop()
+        deadline_at = loop.time() + (deadline if deadline is not None else self.deadline)
+        attempt = 0
+        while True:
+            result, failed, sent = await self._attempt(endpoint, method, url, data, headers, deadline_at - loop.time())
+            if not failed:
+                breaker.record_success()
+                return result
+            breaker.record_failure()
+
+            delay = backoff_delay(attempt)
+            if ((sent and not idempotent)
+                    or attempt >= self.max_retries
+                    or deadline_at - loop.time() <= delay + MIN_ATTEMPT_TIME
+                    or not self.retry_budget.try_withdraw()
+                    or not breaker.allow()):
+                logger.warning(f"Supabase {endpoint}: {attempt + 1} urinish muvaffaqiyatsiz, breaker={breaker.state}")
+                return self._unavailable(breaker)
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def _attempt(self, endpoint: str, method: str, url: str, data: Optional[dict],
+                       headers: Optional[dict], remaining: float) -> Tuple[dict, bool, bool]:
+        """Bitta urinish: (natija, backend nosozligimi, so'rov serverga yuborilganmi)"""
+        timeout = aiohttp.ClientTimeout(
+            total=max(0.1, min(self.timeout.total, remaining)),
+            connect=self.timeout.connect,
+            sock_read=self.timeout.sock_read,
+        )
+        try:
+            async with self.session.request(method, url, json=data, headers=headers, timeout=timeout) as response:
+                try:
+                    result = await response.json(content_type=None)
+                except ValueError:
+                    result = None
+                failed = response.status in RETRY_STATUSES
+                if failed:
+                    logger.warning(f"Supabase {endpoint}: HTTP {response.status}")
+                if isinstance(result, dict):
+                    return result, failed, True
+                return {"error": await response.text() or f"HTTP {response.status}"}, failed, True
+        except aiohttp.ClientConnectorError as e:
+            logger.error(f"Supabase ga ulanib bo'lmadi ({endpoint}): {e!r}")
+            return {"error": "Server bilan bog'lanib bo'lmadi"}, True, False
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Supabase so'rovida xatolik ({endpoint}): {e!r}")
+            return {"error": "Server bilan bog'lanib bo'lmadi"}, True, True
+
+    def _unavailable(self, breaker: CircuitBreaker) -> dict:
+        return {
+            "error": UNAVAILABLE_ERROR,
+            "unavailable": True,
+            "retry_after": breaker.retry_after() if breaker.state != CLOSED else UNAVAILABLE_RETRY_AFTER,
+        }
+
+    def stats(self) -> dict:
+        """Endpointlar bo'yicha breaker holati va qayta urinishlar byudjeti"""
+        return {
+            "breakers": {endpoint: breaker.stats() for endpoint, breaker in self.breakers.items()},
+            "retry_budget": self.retry_budget.stats(),
+        }
@@ -0,0 +1,138 @@
+"""
+Imzolangan (stateless) kirish kodlari
+
+Kod bot ichida yaratiladi - Edge Function va auth_codes jadvaliga so'rov yo'q.
+Tarkibi (bitlar, Crockford base32):
+
+    telegram_user_id | tugash vaqti, daqiqa mod 4096 (12 bit) | HMAC-SHA256 (48 bit)
+
+- qisqa shakl, 20 belgi (XXXXX-XXXXX-XXXXX-XXXXX): user id 40 bitgacha - hozirgi
+  barcha Telegram idlari shunga sig'adi
+- uzun shakl, 23 belgi (XXXXXX-XXXXXX-XXXXXX-XXXXX): user id 55 bitgacha (Bot API
+  52 bitgacha bo'lishi mumkinligini aytadi)
+
+Tugash vaqti to'liq yozilmaydi: tekshiruvchi uni joriy vaqtga eng yaqin
+kelajakdagi daqiqa sifatida tiklaydi, HMAC esa to'liq qiymatni imzolaydi.
+Tekshiruvchi sozlangan ttl dan (daqiqaga yaxlitlash va CLOCK_SKEW bilan)
+uzoqroq amal qiladigan kodni rad etadi. Imzo uzunligi tekshiruv so'rovlari
+cheklanmaganini hisobga oladi: ma'lum user id uchun kodni taxmin qilish
+o'rtacha ~2^47 onlayn urinish talab qiladi. Qayta ishlatilmasligi
+login_code_redemptions jadvaliga bitta INSERT bilan ta'minlanadi.
+Algoritm supabase/functions/telegram-auth/index.ts bilan bir xil.
+"""
+
+import hashlib
+import hmac
+import struct
+import time
+from typing import Optional, Tuple
+
+# Crockford base32 - 0/O, 1/I/L chalkashmaydi
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+_DECODE = {char: index for index, char in enumerate(ALPHABET)}
+_DECODE.update({'O': 0, 'I': 1, 'L': 1})
+
+MAC_BITS = 48
+MAC_BYTES = (MAC_BITS + 7) // 8
+EXPIRY_BITS = 12
+# Kod uzunligi -> user id uchun bitlar
+ID_BITS = {20: 40, 23: 55}
+MAX_GROUP_SIZE = 6
+# Tugash vaqti daqiqa mod 4096 - ko'pi bilan yarim aylana kelajakda tiklanadi
+MAX_TTL = ((1 << (EXPIRY_BITS - 1)) - 2) * 60
+# Bot va tekshiruvchi soatlari orasidagi ruxsat etilgan farq (soniya)
+CLOCK_SKEW = 60
+CONTEXT = b'ravon-login-v3'
+
+
+def _mac(secret: bytes, telegram_user_id: int, expires_minute: int) -> int:
+    digest = hmac.new(secret, CONTEXT + struct.pack('>QI', telegram_user_id, expires_minute), hashlib.sha256).digest()
+    return int.from_bytes(digest[:MAC_BYTES], 'big') >> (MAC_BYTES * 8 - MAC_BITS)
+
+
+def _encode(value: int, length: int) -> str:
+    chars = []
+    for _ in range(length):
+        chars.append(ALPHABET[value & 31])
+        value >>= 5
+    return ''.join(reversed(chars))
+
+
+def _decode(code: str) -> Optional[int]:
+    value = 0
+    for char in code:
+        digit = _DECODE.get(char)
+        if digit is None:
+            return None
+        value = (value << 5) | digit
+    return value
+
+
+def normalize_code(code: str) -> str:
+    """Foydalanuvchi kiritgan kodni tozalash (chiziqcha, bo'sh joy, kichik harflar)"""
+    return ''.join(code.split()).replace('-', '').upper()
+
+
+def format_code(code: str) -> str:
+    """Ko'rsatish uchun teng guruhlar: 20 -> XXXXX-XXXXX-XXXXX-XXXXX, 23 -> XXXXXX-XXXXXX-XXXXXX-XXXXX"""
+    groups = -(-len(code) // MAX_GROUP_SIZE)
+    size, longer = divmod(len(code), groups)
+    parts, start = [], 0
+    for index in range(groups):
+        end = start + size + (1 if index < longer else 0)
+        parts.append(code[start:end])
+        start = end
+    return '-'.join(parts)
+
+
+def mint_login_code(secret: bytes, telegram_user_id: int, ttl: int = 300,
+                    now: Optional[float] = None) -> Tuple[str, int]:
+    """Yangi kod va uning tugash vaqti (unix soniya, daqiqaga yaxlitlangan)
+
+    user id 55 bitdan katta yoki ttl MAX_TTL dan uzun bo'lsa ValueError.
+    """
+    if not 0 < telegram_user_id < 1 << max(ID_BITS.values()):
+        raise ValueError(f"telegram_user_id imzolangan kodga sig'maydi: {telegram_user_id}")
+    if not 0 < ttl <= MAX_TTL:
+        raise ValueError(f"ttl 1..{MAX_TTL} soniya bo'lishi kerak: {ttl}")
+    expires_minute = -(-(int(now if now is not None else time.time()) + ttl) // 60)
+    length = min(length for length, bits in ID_BITS.items() if telegram_user_id < 1 << bits)
+    value = (telegram_user_id << EXPIRY_BITS | expires_minute % (1 << EXPIRY_BITS)) << MAC_BITS
+    value |= _mac(secret, telegram_user_id, expires_minute)
+    return format_code(_encode(value, length)), expires_minute * 60
+
+
+def verify_login_code(secret: bytes, code: str, ttl: int = 300,
+                      now: Optional[float] = None) -> Optional[Tuple[int, int]]:
+    """Kod to'g'ri va amal qilsa (telegram_user_id, expires_at), aks holda None
+
+    ttl - mint_login_code dagi bilan bir xil: tugashiga undan ko'p qolgan kod rad
+    etiladi. Qayta ishlatishni tekshirmaydi - buni verify tomoni (jadval) bajaradi.
+    """
+    code = normalize_code(code)
+    id_bits = ID_BITS.get(len(code))
+    if id_bits is None:
+        return None
+    value = _decode(code)
+    if value is None:
+        return None
+    mac = value & ((1 << MAC_BITS) - 1)
+    expiry_low = (value >> MAC_BITS) & ((1 << EXPIRY_BITS) - 1)
+    telegram_user_id = value >> (MAC_BITS + EXPIRY_BITS)
+    # Bitta (id, muddat) uchun faqat bitta kod satri: qisqa shaklga sig'adigan id uzun shaklda qabul qilinmaydi
+    if telegram_user_id == 0 or any(telegram_user_id < 1 << bits for bits in ID_BITS.values() if bits < id_bits):
+        return None
+
+    now = now if now is not None else time.time()
+    now_minute = int(now // 60)
+    ahead = (expiry_low - now_minute) % (1 << EXPIRY_BITS)
+    if ahead >= 1 << (EXPIRY_BITS - 1):
+        return None
+    expires_minute = now_minute + ahead
+    # Tugash vaqti daqiqaga yuqoriga yaxlitlanadi: ttl + 60 gacha
+    if not 0 < expires_minute * 60 - now < ttl + 60 + CLOCK_SKEW:
+        return None
+    expected = _mac(secret, telegram_user_id, expires_minute)
+    if not hmac.compare_digest(mac.to_bytes(MAC_BYTES, 'big'), expected.to_bytes(MAC_BYTES, 'big')):
+        return None
+    return telegram_user_id, expires_minute * 60
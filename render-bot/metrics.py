@@ -0,0 +1,209 @@
+"""
+Prometheus formatidagi metrikalar (tashqi kutubxonasiz)
+
+- handler latency histogrammalari, xatolar va bir vaqtda ishlayotganlar soni
+- tashqi bog'liqliklar (Telegram get_chat_member, har bir Edge Function) vaqtlari
+- boshqa modullar stats() laridan olinadigan gauge lar
+
+Hammasi bitta event loop ichida yangilanadi - lock kerak emas. Bitta kuzatuv
+narxi: ikki marta perf_counter(), bisect va bir nechta dict amali, shuning uchun
+productionda doim yoqiq turishi mumkin. Metrikalar alohida lokal portda
+(METRICS_PORT) GET /metrics orqali beriladi.
+"""
+
+import functools
+import logging
+import time
+from bisect import bisect_left
+from collections import Counter
+from typing import TYPE_CHECKING, Callable, Dict, Optional, Sequence, Tuple, Union
+
+if TYPE_CHECKING:
+    from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Soniyada; Telegram va Edge Function javoblari uchun mos oraliq
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+GaugeFunc = Callable[[], Union[float, Dict[str, float]]]
+
+
+class Histogram:
+    """Prometheus histogram (kumulyativ bucketlar chiqarishda hisoblanadi)"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs: Dict[str, str]) -> str:
+    return ','.join(f'{key}="{_escape(str(value))}"' for key, value in pairs.items())
+
+
+class _Timer:
+    """`with metrics.timed(...)` - blok vaqtini bog'liqlik histogrammasiga yozish"""
+
+    __slots__ = ('metrics', 'key', 'started')
+
+    def __init__(self, metrics: 'Metrics', key: Tuple[str, str]):
+        self.metrics = metrics
+        self.key = key
+
+    def __enter__(self) -> '_Timer':
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.metrics.observe_dependency(*self.key, time.perf_counter() - self.started, error=exc_type is not None)
+
+
+class Metrics:
+    """Bot metrikalari registri"""
+
+    def __init__(self, prefix: str = 'ravon_bot', buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.prefix = prefix
+        self.buckets = tuple(buckets)
+        self.handler_latency: Dict[str, Histogram] = {}
+        self.handler_errors = Counter()
+        self.handler_in_flight = Counter()
+        self.dependency_latency: Dict[Tuple[str, str], Histogram] = {}
+        self.dependency_errors = Counter()
+        self.gauges: Dict[str, Tuple[str, Optional[str], GaugeFunc]] = {}
+        self._runner: Optional['web.AppRunner'] = None
+
+    # ---------- yozish ----------
+
+    def instrument(self, callback):
+        """Handler callback ini o'rash: latency, xatolar va in-flight"""
+        name = callback.__name__
+        histogram = self.handler_latency.setdefault(name, Histogram(self.buckets))
+
+        @functools.wraps(callback)
+        async def wrapper(update, context):
+            self.handler_in_flight[name] += 1
+            started = time.perf_counter()
+            try:
+                return await callback(update, context)
+            except Exception:
+                self.handler_errors[name] += 1
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - started)
+                self.handler_in_flight[name] -= 1
+        return wrapper
+
+    def observe_dependency(self, service: str, operation: str, seconds: float, error: bool = False) -> None:
+        """Tashqi chaqiruv vaqtini yozish"""
+        key = (service, operation)
+        histogram = self.dependency_latency.get(key)
+        if histogram is None:
+            histogram = self.dependency_latency[key] = Histogram(self.buckets)
+        histogram.observe(seconds)
+        if error:
+            self.dependency_errors[key] += 1
+
+    def timed(self, service: str, operation: str) -> _Timer:
+        """Blok vaqtini o'lchash (istisno - xato sifatida sanaladi)"""
+        return _Timer(self, (service, operation))
+
+    def gauge(self, name: str, help_text: str, func: GaugeFunc, label: Optional[str] = None) -> None:
+        """Chiqarish paytida hisoblanadigan gauge (label berilsa func dict qaytaradi)"""
+        self.gauges[name] = (help_text, label, func)
+
+    # ---------- chiqarish ----------
+
+    def _histogram_lines(self, name: str, histogram: Histogram, labels: Dict[str, str]) -> list:
+        lines = []
+        base = _labels(labels)
+        cumulative = 0
+        for bound, count in zip(self.buckets, histogram.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{base},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{base},le="+Inf"}} {histogram.count}')
+        lines.append(f'{name}_sum{{{base}}} {histogram.sum:.6f}')
+        lines.append(f'{name}_count{{{base}}} {histogram.count}')
+        return lines
+
+    def render(self) -> str:
+        """Prometheus text exposition format (0.0.4)"""
+        p = self.prefix
+        lines = [
+            f'# HELP {p}_handler_duration_seconds Handler bajarilish vaqti',
+            f'# TYPE {p}_handler_duration_seconds histogram',
+        ]
+        for name, histogram in self.handler_latency.items():
+            lines += self._histogram_lines(f'{p}_handler_duration_seconds', histogram, {"handler": name})
+
+        lines += [f'# HELP {p}_handler_errors_total Istisno bilan tugagan handlerlar',
+                  f'# TYPE {p}_handler_errors_total counter']
+        for name in self.handler_latency:
+            lines.append(f'{p}_handler_errors_total{{{_labels({"handler": name})}}} {self.handler_errors[name]}')
+
+        lines += [f'# HELP {p}_handler_in_flight Hozir bajarilayotgan handlerlar',
+                  f'# TYPE {p}_handler_in_flight gauge']
+        for name in self.handler_latency:
+            lines.append(f'{p}_handler_in_flight{{{_labels({"handler": name})}}} {self.handler_in_flight[name]}')
+
+        lines += [f'# HELP {p}_dependency_duration_seconds Tashqi chaqiruvlar vaqti',
+                  f'# TYPE {p}_dependency_duration_seconds histogram']
+        for (service, operation), histogram in self.dependency_latency.items():
+            lines += self._histogram_lines(f'{p}_dependency_duration_seconds', histogram,
+                                           {"service": service, "operation": operation})
+
+        lines += [f'# HELP {p}_dependency_errors_total Xato bilan tugagan tashqi chaqiruvlar',
+                  f'# TYPE {p}_dependency_errors_total counter']
+        for service, operation in self.dependency_latency:
+            labels = _labels({"service": service, "operation": operation})
+            lines.append(f'{p}_dependency_errors_total{{{labels}}} {self.dependency_errors[(service, operation)]}')
+
+        for name, (help_text, label, func) in self.gauges.items():
+            try:
+                value = func()
+            except Exception as e:
+                logger.warning(f"Gauge {name} hisoblanmadi: {e!r}")
+                continue
+            lines += [f'# HELP {p}_{name} {help_text}', f'# TYPE {p}_{name} gauge']
+            if label is None:
+                lines.append(f'{p}_{name} {value}')
+            else:
+                for label_value, item in value.items():
+                    lines.append(f'{p}_{name}{{{_labels({label: label_value})}}} {item}')
+        return '\n'.join(lines) + '\n'
+
+    # ---------- HTTP ----------
+
+    async def start_server(self, host: str, port: int) -> None:
+        """GET /metrics ni alohida portda ochish"""
+        # aiohttp.web faqat shu yerda kerak - polling rejimida ishga tushish tezroq
+        from aiohttp import web
+
+        async def handle_metrics(request: web.Request) -> web.Response:
+            return web.Response(body=self.render().encode(), headers={'Content-Type': CONTENT_TYPE})
+
+        web_app = web.Application()
+        web_app.router.add_get('/metrics', handle_metrics)
+        self._runner = web.AppRunner(web_app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        logger.info(f"Metrikalar http://{host}:{port}/metrics da")
+
+    async def stop_server(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,145 @@
+"""
+Updatelarni yozib olish (replay.py bilan qayta ijro etish uchun)
+
+Yoqilgan bo'lsa (UPDATE_RECORD_FILE), har bir kelgan update kelish vaqti bilan
+append-only JSON Lines fayliga yoziladi ("t" - unix vaqt, "u" - update).
+Fayl nomi .gz bilan tugasa, gzip bilan siqiladi (har bir ishga tushirish -
+alohida gzip a'zosi, fayl baribir bitta oqim sifatida o'qiladi).
+
+Shaxsiy ma'lumotlar yozishdan oldin tozalanadi:
+- user/chat ID lar kalitli HMAC bilan psevdonimlanadi (bir foydalanuvchi -
+  doim bir xil ID, shaxsiy chatda chat.id == from.id saqlanadi)
+- ism, username, sarlavha, telefon - psevdonim satrga
+- matn va caption - uzunligi saqlangan "x..." ga (komandalar nomi qoladi)
+- kontakt, joylashuv, fayl ID lari olib tashlanadi yoki psevdonimlanadi
+"""
+
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import time
+from typing import Any, Iterator, Optional, Tuple
+
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+# Butun son qiymati psevdonimlanadigan kalitlar
+ID_KEYS = frozenset({'id', 'user_id', 'chat_id', 'sender_chat_id', 'migrate_to_chat_id', 'migrate_from_chat_id'})
+# Satri psevdonim bilan almashtiriladigan kalitlar
+NAME_KEYS = frozenset({
+    'first_name', 'last_name', 'username', 'title', 'bio', 'description', 'phone_number',
+    'email', 'invite_link', 'name', 'chat_instance', 'file_id', 'file_unique_id',
+})
+# Matni uzunligi saqlanib yashiriladigan kalitlar
+TEXT_KEYS = frozenset({'text', 'caption', 'query', 'custom_title', 'emoji_status_custom_emoji_id'})
+# Butunlay olib tashlanadigan kalitlar
+DROP_KEYS = frozenset({'contact', 'location', 'venue', 'live_period', 'url', 'vcard', 'shipping_address',
+                       'order_info', 'web_app_data', 'passport_data'})
+
+# Kanal/guruh ID lari -100 prefiksini saqlashi uchun
+ID_SPACE = 10 ** 10
+
+
+class Scrubber:
+    """Kalitli psevdonimlash: bir xil qiymat - doim bir xil natija (shu kalit bilan)"""
+
+    def __init__(self, key: bytes):
+        self.key = key
+
+    def _digest(self, value: Any) -> bytes:
+        return hmac.new(self.key, str(value).encode(), hashlib.sha256).digest()
+
+    def pseudo_id(self, value: int) -> int:
+        mapped = int.from_bytes(self._digest(value)[:8], 'big') % ID_SPACE + 1
+        if value < -10 ** 12:
+            return -10 ** 12 - mapped
+        return -mapped if value < 0 else mapped
+
+    def pseudo_name(self, value: str) -> str:
+        return 'p' + self._digest(value).hex()[:10]
+
+    @staticmethod
+    def blank_text(text: str) -> str:
+        """Komanda nomi qoladi, qolgani shu uzunlikdagi 'x' lar"""
+        if text.startswith('/'):
+            command, sep, rest = text.partition(' ')
+            return command + sep + 'x' * len(rest)
+        return 'x' * len(text)
+
+    def scrub(self, value: Any, key: str = '') -> Any:
+        if isinstance(value, dict):
+            return {k: self.scrub(v, k) for k, v in value.items() if k not in DROP_KEYS}
+        if isinstance(value, list):
+            return [self.scrub(item, key) for item in value]
+        if key in ID_KEYS and isinstance(value, int) and not isinstance(value, bool):
+            return self.pseudo_id(value)
+        if key in NAME_KEYS and isinstance(value, str):
+            return self.pseudo_name(value)
+        if key in TEXT_KEYS and isinstance(value, str):
+            return self.blank_text(value)
+        return value
+
+
+class UpdateRecorder:
+    """Updatelarni tozalab, kelish vaqti bilan faylga yozish"""
+
+    def __init__(self, path: str, key: bytes, flush_interval: float = 1.0):
+        self.path = path
+        self.scrubber = Scrubber(key)
+        self.flush_interval = flush_interval
+        self._file = None
+        self._flushed_at = 0.0
+        self.recorded = 0
+        self.errors = 0
+
+    def open(self) -> None:
+        if self._file is None:
+            self._file = gzip.open(self.path, 'at', encoding='utf-8') if self.path.endswith('.gz') \
+                else open(self.path, 'a', encoding='utf-8')
+            logger.info(f"Updatelar yozib olinmoqda: {self.path}")
+
+    def record(self, update: object) -> None:
+        """Update processor on_arrival hooki - sinxron, tez"""
+        if self._file is None or not isinstance(update, Update):
+            return
+        try:
+            data = self.scrubber.scrub(update.to_dict())
+            self._file.write(json.dumps({"t": round(time.time(), 3), "u": data},
+                                        ensure_ascii=False, separators=(',', ':')) + '\n')
+        except (OSError, TypeError, ValueError) as e:
+            self.errors += 1
+            logger.warning(f"Updateni yozib bo'lmadi: {e!r}")
+            return
+        self.recorded += 1
+        now = time.monotonic()
+        if now - self._flushed_at >= self.flush_interval:
+            self._flushed_at = now
+            self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            logger.info(f"Yozib olingan updatelar: {self.recorded} ({self.errors} xato)")
+
+
+def read_recording(path: str) -> Iterator[Tuple[float, dict]]:
+    """(kelish vaqti, update dict) - fayl tartibida; buzilgan oxirgi qator o'tkazib yuboriladi"""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            yield record['t'], record['u']
+
+
+def recording_key(secret: Optional[str], bot_token: str) -> bytes:
+    """Psevdonim kaliti: UPDATE_RECORD_KEY, bo'lmasa token dan hosil qilinadi"""
+    if secret:
+        return secret.encode()
+    return hashlib.sha256(b'ravon-recorder:' + bot_token.encode()).digest()
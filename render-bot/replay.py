@@ -0,0 +1,182 @@
+"""
+Yozib olingan updatelarni (recorder.py) Application ga qayta ijro etish
+
+Bot shu jarayonda fake Telegram Bot API (fake_telegram.py) va fake Supabase
+(bench.FakeSupabase) ga ulangan holda ko'tariladi - haqiqiy foydalanuvchilarga
+hech narsa yuborilmaydi. Updatelar to'g'ridan-to'g'ri update_queue ga asl
+oraliqlar bilan (--speed 1), tezlashtirilgan (--speed 10) yoki kutishsiz
+(--speed 0) beriladi. Oxirida handlerlar bo'yicha vaqtlar, update navbati
+va yuborish navbati statistikasi chiqariladi; --profile bilan cProfile natijasi.
+
+Ishlatish:
+    python replay.py updates.jsonl.gz
+    python replay.py updates.jsonl.gz --speed 10 --max-gap 5
+    python replay.py updates.0.jsonl updates.1.jsonl --speed 0 --profile replay.prof
+"""
+
+import argparse
+import asyncio
+import cProfile
+import heapq
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from aiohttp import web
+
+from bench import UNLIMITED_ENV, FakeSupabase
+from fake_telegram import FakeTelegram
+from recorder import read_recording
+
+logger = logging.getLogger(__name__)
+
+
+def configure_env(args: argparse.Namespace) -> None:
+    """bot.py import qilinishidan oldin - barcha tashqi chaqiruvlar fake serverlarga"""
+    state_dir = tempfile.mkdtemp(prefix='replay-')
+    os.environ.update({
+        'TELEGRAM_BOT_TOKEN': '123456:REPLAY',
+        'TELEGRAM_API_BASE_URL': f"http://127.0.0.1:{args.telegram_port}",
+        'SUPABASE_URL': f"http://127.0.0.1:{args.supabase_port}",
+        'SUPABASE_ANON_KEY': 'replay',
+        'BOT_SYNC_SECRET': 'replay',
+        'AVATAR_SECRET': 'replay',
+        'BROADCAST_STATE_FILE': os.path.join(state_dir, 'broadcast_state.json'),
+        'STATE_DB_FILE': os.path.join(state_dir, 'bot_state.sqlite3'),
+        'CACHE_SNAPSHOT_FILE': os.path.join(state_dir, 'cache_snapshot.json'),
+        'REFERRAL_QUEUE_FILE': os.path.join(state_dir, 'referral_queue.jsonl'),
+        'UPDATE_RECORD_FILE': '',
+        'METRICS_PORT': '0',
+        'LOG_FORMAT': 'text',
+    })
+    if not args.production_limits:
+        os.environ.update(UNLIMITED_ENV)
+
+
+def load_updates(paths, max_gap: float) -> list:
+    """Bir nechta fayl (masalan sharded ishchilar) vaqt bo'yicha birlashtiriladi
+
+    Natija: (asl boshlanishdan soniya, update dict). max_gap dan uzun jimlik
+    qisqartiriladi - bot qayta ishga tushgan oraliqlar replayni cho'zmaydi.
+    """
+    merged = heapq.merge(*(read_recording(path) for path in paths), key=lambda item: item[0])
+    updates = []
+    offset = 0.0
+    previous = None
+    for arrived, data in merged:
+        if previous is not None:
+            offset += min(arrived - previous, max_gap)
+        previous = arrived
+        updates.append((offset, data))
+    return updates
+
+
+async def wait_idle(application, update_processor, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        stats = update_processor.stats()
+        if application.update_queue.empty() and not stats['active'] and not stats['pending']:
+            return True
+        await asyncio.sleep(0.05)
+    return False
+
+
+def print_report(bot, updates: int, feed_seconds: float, total_seconds: float, fake: FakeTelegram,
+                 supabase: FakeSupabase) -> None:
+    print()
+    rate = updates / total_seconds if total_seconds else 0.0
+    print(f"Updatelar: {updates}, berish: {feed_seconds:.2f}s, jami: {total_seconds:.2f}s ({rate:.1f} upd/s)")
+    print(f"Update processor: {bot.update_processor.stats()}")
+    print(f"Yuborish navbati: {bot.send_limiter.stats()}")
+    print()
+    print('Handler'.ljust(32) + 'soni'.rjust(8) + "o'rtacha ms".rjust(14) + 'xato'.rjust(8))
+    for name, histogram in sorted(bot.metrics.handler_latency.items(), key=lambda item: -item[1].sum):
+        if histogram.count:
+            print(f"{name:<32}{histogram.count:>8}{histogram.sum / histogram.count * 1000:>14.1f}"
+                  f"{bot.metrics.handler_errors[name]:>8}")
+    print()
+    print(f"Telegram: {dict(fake.calls)}")
+    print(f"Supabase: {dict(supabase.calls)}")
+
+
+async def replay(args: argparse.Namespace) -> int:
+    configure_env(args)
+    import bot
+    from telegram import Update
+
+    updates = load_updates(args.files, args.max_gap)
+    if args.limit:
+        updates = updates[:args.limit]
+    if not updates:
+        logger.error("Yozuvlarda update topilmadi")
+        return 1
+    logger.info(f"{len(updates)} ta update, asl davomiylik {updates[-1][0]:.1f}s, tezlik x{args.speed or '∞'}")
+
+    fake = FakeTelegram(member_status='member', latency=args.telegram_latency)
+    supabase = FakeSupabase(latency=args.supabase_latency)
+    runners = []
+    for web_app, port in ((fake.build_web_app(), args.telegram_port), (supabase.build_web_app(), args.supabase_port)):
+        runner = web.AppRunner(web_app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, '127.0.0.1', port, backlog=2048).start()
+        runners.append(runner)
+
+    application = bot.build_application(use_updater=False)
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+
+    profiler = cProfile.Profile() if args.profile else None
+    try:
+        if profiler:
+            profiler.enable()
+        started = time.monotonic()
+        for offset, data in updates:
+            if args.speed:
+                delay = started + offset / args.speed - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            update = Update.de_json(data, application.bot)
+            if update is not None:
+                await application.update_queue.put(update)
+        feed_seconds = time.monotonic() - started
+        if not await wait_idle(application, bot.update_processor, args.drain):
+            logger.warning(f"{args.drain}s ichida barcha updatelar ishlanmadi")
+        total_seconds = time.monotonic() - started
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            logger.info(f"cProfile: {args.profile} (snakeviz {args.profile})")
+    finally:
+        await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+        for runner in runners:
+            await runner.cleanup()
+
+    print_report(bot, len(updates), feed_seconds, total_seconds, fake, supabase)
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Yozib olingan updatelarni qayta ijro etish")
+    parser.add_argument('files', nargs='+', help="UPDATE_RECORD_FILE fayl(lar)i")
+    parser.add_argument('--speed', type=float, default=1.0, help="1 - asl tezlik, 10 - 10 barobar, 0 - kutishsiz")
+    parser.add_argument('--max-gap', type=float, default=10.0, help="bundan uzun jimlik qisqartiriladi (s)")
+    parser.add_argument('--limit', type=int, default=0, help="faqat birinchi N ta update")
+    parser.add_argument('--telegram-latency', type=float, default=0.03)
+    parser.add_argument('--supabase-latency', type=float, default=0.08)
+    parser.add_argument('--production-limits', action='store_true',
+                        help="botning haqiqiy AUTH_*/SEND_* cheklovlarini o'chirmaslik")
+    parser.add_argument('--drain', type=float, default=60, help="berish tugagach kutish (s)")
+    parser.add_argument('--profile', help="cProfile natijasini shu faylga yozish")
+    parser.add_argument('--telegram-port', type=int, default=8791)
+    parser.add_argument('--supabase-port', type=int, default=8792)
+    sys.exit(asyncio.run(replay(parser.parse_args())))
@@ -0,0 +1,237 @@
+"""
+Chiquvchi Telegram so'rovlari uchun rate limiter (PTB BaseRateLimiter)
+
+- Global chegara: soniyasiga SEND_GLOBAL_RATE xabar (Telegram: ~30/s)
+- Chat chegarasi: shaxsiy chatga ~1 xabar/s, guruhga ~20 xabar/daqiqa
+- Ustuvorlik: foydalanuvchiga javoblar (standart) ommaviy yuborishdan oldin o'tadi.
+  Ommaviy yuborish uchun: bot.send_message(..., rate_limit_args={"priority": "low"})
+- RetryAfter (429) bo'lsa, retry_after kutib qayta urinadi. Chat bo'yicha
+  so'rovda faqat shu chat to'xtatiladi; bir necha chat birdan 429 olsa yoki chat
+  noma'lum bo'lsa (inline xabar), barcha xabar yuborishlar to'xtatiladi
+
+Faqat xabar yuboruvchi/tahrirlovchi metodlar cheklanadi va 429 pauzasini kutadi;
+getUpdates, getMe, answerCallbackQuery kabi so'rovlar kutmasdan o'tadi (o'zi 429
+olsa, faqat o'zi kutib qayta urinadi).
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Union
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from ravon_botkit.ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_HIGH = 'high'
+PRIORITY_LOW = 'low'
+
+# "send*"/"edit*" dan tashqari xabar yuboruvchi metodlar
+EXTRA_MESSAGE_METHODS = {'copymessage', 'copymessages', 'forwardmessage', 'forwardmessages'}
+# Shuncha soniya ichida shuncha turli chat 429 olsa - global chegara deb hisoblanadi
+GLOBAL_FLOOD_WINDOW = 1.0
+GLOBAL_FLOOD_CHATS = 3
+
+
+def is_message_endpoint(endpoint: str) -> bool:
+    """Endpoint chatga xabar yuboradimi/tahrirlaydimi"""
+    name = endpoint.lower()
+    return name.startswith('send') or name.startswith('edit') or name in EXTRA_MESSAGE_METHODS
+
+
+class SendRateLimiter(BaseRateLimiter[Dict[str, Any]]):
+    """Global + chat bo'yicha chegaralar, ustuvorlik va RetryAfter qayta urinishlari"""
+
+    def __init__(
+        self,
+        global_rate: float = 30.0,
+        private_chat_rate: float = 1.0,
+        private_chat_burst: float = 3.0,
+        group_rate_per_min: float = 20.0,
+        max_retries: int = 3,
+        max_tracked_chats: int = 100000,
+    ):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.private_chat_rate = private_chat_rate
+        self.private_chat_burst = private_chat_burst
+        self.group_rate = group_rate_per_min / 60
+        self.max_retries = max_retries
+        self.max_tracked_chats = max_tracked_chats
+        self._chat_buckets: OrderedDict = OrderedDict()
+        # RetryAfter: global (barcha xabarlar) va chat bo'yicha pauzalar
+        self._flood_until = 0.0
+        self._chat_flood: Dict[Union[int, str], float] = {}
+        self._recent_floods: deque = deque()
+        self._high_waiting = 0
+        self._low_waiting = 0
+        self._high_idle = asyncio.Event()
+        self._high_idle.set()
+        # Metrikalar
+        self.requests = 0
+        self.delayed = 0
+        self.retries = 0
+        self.failed = 0
+        self.chat_floods = 0
+        self.global_floods = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        # Birinchi muvaffaqiyatli xabar yuborilganda bir marta chaqiriladi
+        self.on_first_message: Optional[Callable[[], None]] = None
+
+    async def initialize(self) -> None:
+        """Boshlang'ich holat"""
+
+    async def shutdown(self) -> None:
+        """Yakuniy statistika"""
+        logger.info(f"Yuborish cheklovchisi: {self.stats()}")
+
+    def _chat_bucket(self, chat_id: Union[int, str]) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            if is_group:
+                bucket = TokenBucket(self.group_rate, 1.0)
+            else:
+                bucket = TokenBucket(self.private_chat_rate, self.private_chat_burst)
+            self._chat_buckets[chat_id] = bucket
+            while len(self._chat_buckets) > self.max_tracked_chats:
+                self._chat_buckets.popitem(last=False)
+        else:
+            self._chat_buckets.move_to_end(chat_id)
+        return bucket
+
+    async def _wait_for_flood(self, chat_id: Optional[Union[int, str]]) -> None:
+        while True:
+            chat_until = self._chat_flood.get(chat_id, 0.0) if chat_id is not None else 0.0
+            delay = max(self._flood_until, chat_until) - time.monotonic()
+            if delay <= 0:
+                if chat_until:
+                    self._chat_flood.pop(chat_id, None)
+                return
+            await asyncio.sleep(delay)
+
+    def _record_flood(self, chat_id: Optional[Union[int, str]], retry_after: float) -> None:
+        """429 pauzasini chatga yoki (bir necha chat birdan olsa) hammaga qo'llash"""
+        now = time.monotonic()
+        until = now + retry_after + 0.1
+        recent = self._recent_floods
+        while recent and recent[0][0] < now - GLOBAL_FLOOD_WINDOW:
+            recent.popleft()
+        if chat_id is not None:
+            recent.append((now, chat_id))
+        if chat_id is None or len({chat for _, chat in recent}) >= GLOBAL_FLOOD_CHATS:
+            self.global_floods += 1
+            self._flood_until = max(self._flood_until, until)
+            return
+        self.chat_floods += 1
+        self._chat_flood[chat_id] = max(self._chat_flood.get(chat_id, 0.0), until)
+        if len(self._chat_flood) > self.max_tracked_chats:
+            # Kutuvchisi qolmagan, muddati o'tgan pauzalar
+            for chat, chat_until in list(self._chat_flood.items()):
+                if chat_until <= now:
+                    del self._chat_flood[chat]
+
+    async def _acquire(self, chat_id: Optional[Union[int, str]], priority: str) -> None:
+        """Chat va global tokenlarni kutib olish"""
+        if chat_id is not None:
+            bucket = self._chat_bucket(chat_id)
+            while not bucket.try_acquire():
+                await asyncio.sleep(bucket.retry_after())
+
+        if priority == PRIORITY_HIGH:
+            self._high_waiting += 1
+            self._high_idle.clear()
+        else:
+            self._low_waiting += 1
+        try:
+            while True:
+                await self._wait_for_flood(chat_id)
+                if priority != PRIORITY_HIGH and self._high_waiting:
+                    # Past ustuvorlikdagilar javoblar navbati bo'shashini kutadi
+                    await self._high_idle.wait()
+                    continue
+                if self.global_bucket.try_acquire():
+                    return
+                await asyncio.sleep(self.global_bucket.retry_after())
+        finally:
+            if priority == PRIORITY_HIGH:
+                self._high_waiting -= 1
+                if not self._high_waiting:
+                    self._high_idle.set()
+            else:
+                self._low_waiting -= 1
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Union[bool, Dict[str, Any], List[Dict[str, Any]]]]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[Dict[str, Any]],
+    ) -> Union[bool, Dict[str, Any], List[Dict[str, Any]]]:
+        """So'rovni cheklovlar bo'yicha bajarish"""
+        options = rate_limit_args or {}
+        priority = options.get('priority', PRIORITY_HIGH)
+        max_retries = options.get('max_retries', self.max_retries)
+        limited = is_message_endpoint(endpoint)
+
+        chat_id = data.get('chat_id')
+        if isinstance(chat_id, str) and chat_id.lstrip('-').isdigit():
+            chat_id = int(chat_id)
+
+        self.requests += 1
+        attempt = 0
+        while True:
+            if limited:
+                started = time.monotonic()
+                await self._acquire(chat_id, priority)
+                waited = time.monotonic() - started
+                if waited > 0.001:
+                    self.delayed += 1
+                    self.wait_time_total += waited
+                    self.wait_time_max = max(self.wait_time_max, waited)
+
+            try:
+                result = await callback(*args, **kwargs)
+            except RetryAfter as exc:
+                retry_after = exc.retry_after
+                if not isinstance(retry_after, (int, float)):
+                    retry_after = retry_after.total_seconds()
+                if attempt == max_retries:
+                    self.failed += 1
+                    logger.error(f"{endpoint}: {max_retries} marta qayta urinishdan keyin ham RetryAfter")
+                    raise
+                attempt += 1
+                self.retries += 1
+                logger.warning(f"{endpoint}: RetryAfter {retry_after}s - kutib qayta urinamiz")
+                if limited:
+                    self._record_flood(chat_id, retry_after)
+                else:
+                    # Xabar yubormaydigan so'rov boshqalarni to'xtatmaydi
+                    await asyncio.sleep(retry_after)
+                continue
+
+            if limited and self.on_first_message is not None:
+                on_first_message, self.on_first_message = self.on_first_message, None
+                on_first_message()
+            return result
+
+    def stats(self) -> dict:
+        """Navbat chuqurligi va kechikish statistikasi"""
+        return {
+            "queue_high": self._high_waiting,
+            "queue_low": self._low_waiting,
+            "requests": self.requests,
+            "delayed": self.delayed,
+            "retries": self.retries,
+            "failed": self.failed,
+            "chat_floods": self.chat_floods,
+            "global_floods": self.global_floods,
+            "wait_avg": round(self.wait_time_total / self.delayed, 4) if self.delayed else 0.0,
+            "wait_max": round(self.wait_time_max, 4),
+        }
@@ -0,0 +1,313 @@
+"""
+Ko'p jarayonli rejim - bitta webhook ingress va N ta ishchi jarayon
+
+Ingress Telegram updatelarini qabul qiladi, ularni to'liq tahlil qilmasdan
+foydalanuvchi ID si bo'yicha ishchiga yo'naltiradi (user_id % N). Har bir
+ishchi oddiy webhook rejimidagi bot: o'z HTTP pooli, keshlari va handlerlari
+bilan 127.0.0.1:<SHARD_BASE_PORT + i> da tinglaydi.
+
+Bitta foydalanuvchining updatelari doim bitta ishchiga, bitta ulanish orqali
+ketma-ket yuboriladi - tartib saqlanadi, o'tkazuvchanlik esa yadrolar soni
+bilan o'sadi.
+
+Endpointlar (ingress):
+- POST <WEBHOOK_PATH> - Telegram updatelari (secret token tekshiriladi)
+- GET /health - ishchilar va navbatlar holati
+"""
+
+import asyncio
+import hmac
+import json
+import logging
+import multiprocessing
+import signal
+import time
+from typing import Callable, List, Optional, Sequence
+
+import aiohttp
+from aiohttp import web
+from telegram import Bot
+
+from webhook import SECRET_HEADER
+
+logger = logging.getLogger(__name__)
+
+# Ishchi qayta ishga tushayotganda update necha soniya kutadi
+FORWARD_RETRY_TIMEOUT = 30.0
+# To'xtashda ishchilar SIGTERM ni ingress navbati bo'shagach yoki ko'pi bilan shuncha soniyadan keyin oladi
+INGRESS_FLUSH_GRACE = 2.0
+
+
+def extract_user_id(data: dict) -> Optional[int]:
+    """Update JSON idan foydalanuvchi ID sini olish (Update.de_json siz)"""
+    for key, payload in data.items():
+        if key == 'update_id' or not isinstance(payload, dict):
+            continue
+        # chat_member/my_chat_member: `from` - o'zgartirgan admin, holat esa a'zoga tegishli
+        member = payload.get('new_chat_member')
+        if isinstance(member, dict):
+            user = member.get('user')
+            if isinstance(user, dict) and 'id' in user:
+                return user['id']
+        for field in ('from', 'user'):
+            user = payload.get(field)
+            if isinstance(user, dict) and 'id' in user:
+                return user['id']
+        chat = payload.get('chat')
+        if isinstance(chat, dict) and 'id' in chat:
+            return chat['id']
+    return None
+
+
+def shard_for(user_id: Optional[int], shards: int) -> int:
+    """Foydalanuvchi -> ishchi raqami"""
+    if user_id is None:
+        return 0
+    return user_id % shards
+
+
+class ShardIngress:
+    """Updatelarni ishchilarga yo'naltiruvchi webhook server"""
+
+    def __init__(self, worker_urls: List[str], secret_token: str, queue_size: int = 10000):
+        self.worker_urls = worker_urls
+        self.secret_token = secret_token
+        self.queues = [asyncio.Queue(maxsize=queue_size) for _ in worker_urls]
+        self.forwarded = [0] * len(worker_urls)
+        self.dropped = 0
+        self.rejected = 0
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        """Ishchilarga ulanishlar va yo'naltiruvchi tasklarni ishga tushirish"""
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit_per_host=1, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=10),
+        )
+        self._tasks = [
+            asyncio.create_task(self._forward(index), name=f"shard-forward-{index}")
+            for index in range(len(self.worker_urls))
+        ]
+
+    async def close(self, timeout: float = FORWARD_RETRY_TIMEOUT) -> None:
+        """Navbatdagi updatelarni yuborib bo'lgach to'xtatish"""
+        try:
+            await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in self.queues)), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Ingress: {sum(q.qsize() for q in self.queues)} ta update yuborilmay qoldi")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._session is not None:
+            await self._session.close()
+        logger.info(f"Ingress: {self.stats()}")
+
+    async def _post(self, index: int, body: bytes) -> bool:
+        deadline = time.monotonic() + FORWARD_RETRY_TIMEOUT
+        delay = 0.1
+        while True:
+            try:
+                async with self._session.post(
+                    self.worker_urls[index],
+                    data=body,
+                    headers={SECRET_HEADER: self.secret_token, 'Content-Type': 'application/json'},
+                ) as response:
+                    if response.status == 200:
+                        return True
+                    logger.warning(f"Ishchi {index}: HTTP {response.status}")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning(f"Ishchi {index} bilan bog'lanib bo'lmadi: {e}")
+            if time.monotonic() + delay > deadline:
+                return False
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 2.0)
+
+    async def _forward(self, index: int) -> None:
+        # Har bir ishchiga bitta task - updatelar kelgan tartibida yuboriladi
+        queue = self.queues[index]
+        while True:
+            body = await queue.get()
+            try:
+                if await self._post(index, body):
+                    self.forwarded[index] += 1
+                else:
+                    self.dropped += 1
+                    logger.error(f"Ishchi {index}: update yuborilmadi, tashlab yuborildi")
+            finally:
+                queue.task_done()
+
+    def build_web_app(self, url_path: str) -> web.Application:
+        """Ingress aiohttp ilovasi"""
+        expected_secret = self.secret_token.encode()
+
+        async def handle_update(request: web.Request) -> web.Response:
+            received = request.headers.get(SECRET_HEADER, '').encode()
+            if not hmac.compare_digest(received, expected_secret):
+                logger.warning(f"Webhook: noto'g'ri secret token ({request.remote})")
+                return web.Response(status=403)
+
+            body = await request.read()
+            try:
+                data = json.loads(body)
+            except json.JSONDecodeError:
+                return web.Response(status=400)
+            if not isinstance(data, dict):
+                return web.Response(status=400)
+
+            queue = self.queues[shard_for(extract_user_id(data), len(self.queues))]
+            try:
+                queue.put_nowait(body)
+            except asyncio.QueueFull:
+                # Telegram updateni keyinroq qayta yuboradi
+                self.rejected += 1
+                return web.Response(status=503)
+            return web.Response()
+
+        async def handle_health(request: web.Request) -> web.Response:
+            return web.json_response(self.stats())
+
+        web_app = web.Application()
+        web_app.router.add_post(url_path, handle_update)
+        web_app.router.add_get('/health', handle_health)
+        return web_app
+
+    def stats(self) -> dict:
+        """Navbatlar va yuborilgan updatelar soni"""
+        return {
+            "queues": [queue.qsize() for queue in self.queues],
+            "forwarded": list(self.forwarded),
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+        }
+
+
+class WorkerSupervisor:
+    """Ishchi jarayonlarni ishga tushirish va yiqilganini qayta ko'tarish"""
+
+    def __init__(self, target: Callable[[int, int, int], None], shards: int, base_port: int):
+        self.target = target
+        self.shards = shards
+        self.base_port = base_port
+        self._context = multiprocessing.get_context('spawn')
+        self.processes: List[Optional[multiprocessing.Process]] = [None] * shards
+        self.restarts = 0
+
+    def port(self, index: int) -> int:
+        return self.base_port + index
+
+    def _spawn(self, index: int) -> None:
+        process = self._context.Process(
+            target=self.target,
+            args=(index, self.shards, self.port(index)),
+            name=f"bot-worker-{index}",
+            daemon=False,
+        )
+        process.start()
+        self.processes[index] = process
+        logger.info(f"Ishchi {index} ishga tushdi (pid={process.pid}, port={self.port(index)})")
+
+    def start(self) -> None:
+        for index in range(self.shards):
+            self._spawn(index)
+
+    async def watch(self, stop_event: asyncio.Event) -> None:
+        """Yiqilgan ishchilarni qayta ishga tushirish"""
+        while not stop_event.is_set():
+            for index, process in enumerate(self.processes):
+                if stop_event.is_set():
+                    return
+                if process is not None and not process.is_alive():
+                    logger.error(f"Ishchi {index} to'xtadi (exitcode={process.exitcode}), qayta ishga tushiriladi")
+                    self.restarts += 1
+                    self._spawn(index)
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=1.0)
+            except asyncio.TimeoutError:
+                pass
+
+    async def stop(self, timeout: float = 30.0) -> None:
+        """Ishchilarga SIGTERM yuborib, barchasini bir vaqtda ko'pi bilan timeout kutish"""
+        processes = [process for process in self.processes if process is not None]
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(None, process.join, timeout) for process in processes))
+        stuck = [process for process in processes if process.is_alive()]
+        for process in stuck:
+            logger.warning(f"{process.name} {timeout:.0f}s ichida to'xtamadi - majburan to'xtatiladi")
+            process.kill()
+        await asyncio.gather(*(loop.run_in_executor(None, process.join, 1.0) for process in stuck))
+
+
+async def serve_sharded(
+    worker_target: Callable[[int, int, int], None],
+    *,
+    bot_token: str,
+    webhook_url: str,
+    secret_token: str,
+    shards: int,
+    base_port: int = 10100,
+    listen: str = '0.0.0.0',
+    port: int = 10000,
+    url_path: str = '/telegram',
+    max_connections: int = 40,
+    allowed_updates: Optional[Sequence[str]] = None,
+    api_base_url: str = 'https://api.telegram.org',
+    shutdown_timeout: float = 25.0,
+) -> None:
+    """Ingress va ishchilarni ishga tushirish (SIGINT/SIGTERM gacha)
+
+    worker_target(index, shards, port) - ishchi jarayonda bajariladigan funksiya
+    (modul darajasida bo'lishi kerak - spawn uchun pickle qilinadi).
+    shutdown_timeout - signaldan keyin ingress va ishchilar to'xtashining umumiy
+    muddati (Render ~30s dan keyin jarayonni o'ldiradi).
+    """
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            pass
+
+    supervisor = WorkerSupervisor(worker_target, shards, base_port)
+    ingress = ShardIngress(
+        [f"http://127.0.0.1:{supervisor.port(index)}{url_path}" for index in range(shards)],
+        secret_token,
+    )
+    runner = web.AppRunner(ingress.build_web_app(url_path), access_log=None)
+
+    supervisor.start()
+    await ingress.start()
+    watcher = asyncio.create_task(supervisor.watch(stop_event))
+    try:
+        await runner.setup()
+        site = web.TCPSite(runner, listen, port)
+        await site.start()
+        logger.info(f"Ingress {listen}:{port}{url_path} da tinglayapti, ishchilar: {shards}")
+
+        bot = Bot(bot_token, base_url=f"{api_base_url}/bot", base_file_url=f"{api_base_url}/file/bot")
+        async with bot:
+            await bot.set_webhook(
+                url=webhook_url.rstrip('/') + url_path,
+                secret_token=secret_token,
+                max_connections=max_connections,
+                allowed_updates=allowed_updates,
+            )
+        logger.info(f"Webhook o'rnatildi: max_connections={max_connections}")
+
+        await stop_event.wait()
+        logger.info("To'xtatish signali qabul qilindi")
+    finally:
+        stop_event.set()
+        await watcher
+        deadline = loop.time() + shutdown_timeout
+        # Avval yangi updatelar qabul qilish to'xtatiladi, navbatdagilar ishchilarga yetkaziladi.
+        # Ingress va ishchilar parallel to'xtaydi - ikkalasi ham bitta muddat ichida
+        await runner.cleanup()
+        flush = asyncio.create_task(ingress.close(max(deadline - loop.time(), 0)))
+        await asyncio.wait((flush,), timeout=INGRESS_FLUSH_GRACE)
+        await asyncio.gather(flush, supervisor.stop(max(deadline - loop.time(), 0)))
+        logger.info(f"Ishchilar to'xtatildi (qayta ishga tushirishlar: {supervisor.restarts})")
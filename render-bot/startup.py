@@ -0,0 +1,83 @@
+"""
+Ishga tushish bosqichlari vaqti va birinchi javobgacha bo'lgan vaqt
+
+Deploydan keyin bot qancha vaqtda javob bera boshlashini o'lchash uchun:
+jarayon boshlanishidan (bot.py dagi birinchi qator) har bir bosqich -
+importlar, Application yaratish, initialize (getMe), post_init dagi
+qizdirish ishlari - alohida yoziladi. Parallel bosqichlar (Supabase
+ulanishlari, kanal, keshlar) phase() orqali o'z davomiyligi bilan yoziladi.
+
+Birinchi muvaffaqiyatli xabar yuborilganda (send_limiter.on_first_message)
+"time-to-first-reply" logga va /metrics ga chiqadi.
+"""
+
+import logging
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Dict, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+class StartupTimer:
+    """Ishga tushish bosqichlarini ketma-ket va parallel o'lchash"""
+
+    def __init__(self, started: float):
+        self.started = started
+        self.phases: Dict[str, float] = {}
+        self.ready_at: Optional[float] = None
+        self.first_reply_at: Optional[float] = None
+        self._last = started
+
+    def mark(self, phase: str) -> None:
+        """Oldingi belgidan hozirgacha o'tgan vaqtni phase nomi bilan yozish"""
+        now = time.monotonic()
+        self.phases[phase] = now - self._last
+        self._last = now
+
+    @contextmanager
+    def phase(self, name: str):
+        """Blok davomiyligini yozish (ketma-ketlik belgisiga ta'sir qilmaydi)"""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.monotonic() - started
+
+    async def run(self, name: str, awaitable: Awaitable[T]) -> Optional[T]:
+        """Qizdirish ishini o'lchab bajarish - xato botni to'xtatmaydi"""
+        with self.phase(name):
+            try:
+                return await awaitable
+            except Exception as e:
+                logger.warning(f"Ishga tushish bosqichi '{name}' bajarilmadi: {e!r}")
+                return None
+
+    def ready(self) -> None:
+        """Updatelarni qabul qilishga tayyor (post_init oxiri)"""
+        self.mark('post_init')
+        self.ready_at = time.monotonic()
+        logger.info(f"🚀 Ishga tushish: {self.report()}")
+
+    def first_reply(self) -> None:
+        """Birinchi muvaffaqiyatli javob yuborildi"""
+        if self.first_reply_at is not None:
+            return
+        self.first_reply_at = time.monotonic()
+        logger.info(f"Birinchi javob jarayon boshlanganidan {self.first_reply_at - self.started:.2f}s keyin")
+
+    def report(self) -> str:
+        parts = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.phases.items())
+        total = (self.ready_at or time.monotonic()) - self.started
+        return f"{parts} - jami {total:.2f}s"
+
+    def stats(self) -> dict:
+        """/metrics uchun: bosqichlar, tayyor bo'lish va birinchi javob vaqti"""
+        result = {name: round(seconds, 4) for name, seconds in self.phases.items()}
+        if self.ready_at is not None:
+            result['ready'] = round(self.ready_at - self.started, 4)
+        if self.first_reply_at is not None:
+            result['first_reply'] = round(self.first_reply_at - self.started, 4)
+        return result
@@ -0,0 +1,379 @@
+"""
+user_data / chat_data uchun chegaralangan holat ombori (PTB BasePersistence)
+
+PTB persistence yoqilganda har bir update foydalanuvchi va chatni
+"yangilanadi" deb belgilaydi va Application ularning dictlarini abadiy
+xotirada saqlaydi. Bu ombor:
+
+- xotirada faqat oxirgi faol max_users foydalanuvchi / max_chats chatni
+  ushlaydi (LRU); eng eskisi diskka yozilib, Application dan chiqariladi
+- ma'lumotni dangasa yuklaydi: startupda hech narsa o'qilmaydi, foydalanuvchi
+  qaytganda refresh_user_data da SQLite dan bitta qator tiklanadi
+- yozuvlarni ixcham JSON qilib saqlaydi; bo'sh dict - qator o'chiriladi,
+  o'zgarmagan dict (diskdagi JSON bilan solishtiriladi) - qayta yozilmaydi
+- yozuvlarni to'plab (debounce) bitta tranzaksiyada, event loopdan tashqarida
+  (asyncio.to_thread) yozadi; WAL rejimi o'qishlarni bloklamaydi
+
+Qiymatlar JSON ga mos bo'lishi kerak (dict kalitlari satrga aylanadi).
+Chiqarilgan foydalanuvchining handleri hali ishlayotgan bo'lsa, chiqarilgandan
+keyingi o'zgarishlar yo'qoladi - shuning uchun max_users parallel
+ishlanayotgan updatelar sonidan ancha katta bo'lishi kerak.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_data (id INTEGER PRIMARY KEY, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS chat_data (id INTEGER PRIMARY KEY, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS bot_data (id INTEGER PRIMARY KEY CHECK (id = 0), data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS conversations (
+    name TEXT NOT NULL, key TEXT NOT NULL, state TEXT NOT NULL, PRIMARY KEY (name, key)
+) WITHOUT ROWID;
+"""
+
+EMPTY = '{}'
+
+
+def _encode(data: Any) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+class _Shelf:
+    """Bitta jadval (user_data yoki chat_data) uchun xotiradagi holat"""
+
+    def __init__(self, table: str, max_entries: int):
+        self.table = table
+        self.max_entries = max_entries
+        # id -> diskdagi (yoki yozilishi kutilayotgan) JSON, bo'sh holat - None; tartib - LRU
+        self.resident: OrderedDict = OrderedDict()
+        # id -> yangi JSON (None - o'chirish)
+        self.pending: Dict[int, Optional[str]] = {}
+        self.writing: Dict[int, Optional[str]] = {}
+        # O'zimiz chiqargan (diskdan o'chirilmasligi kerak) idlar
+        self.evicted: Set[int] = set()
+        self.loads = 0
+        self.evictions = 0
+        self.skipped = 0
+
+    def unwritten(self, key: int) -> Tuple[bool, Optional[str]]:
+        """Hali diskka yetib bormagan yozuv: (bormi, JSON)"""
+        if key in self.pending:
+            return True, self.pending[key]
+        if key in self.writing:
+            return True, self.writing[key]
+        return False, None
+
+    def stats(self) -> dict:
+        return {
+            "resident": len(self.resident),
+            "max": self.max_entries,
+            "pending": len(self.pending) + len(self.writing),
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "skipped": self.skipped,
+        }
+
+
+class SQLitePersistence(BasePersistence):
+    """LRU bilan chegaralangan, SQLite ga to'kiladigan persistence"""
+
+    def __init__(self, path: str, max_users: int = 10000, max_chats: int = 10000,
+                 update_interval: float = 60, write_delay: float = 0.5):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=True, chat_data=True, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.path = path
+        self.write_delay = write_delay
+        self.users = _Shelf('user_data', max_users)
+        self.chats = _Shelf('chat_data', max_chats)
+        self._bot_data: Optional[str] = None
+        self._bot_pending: Optional[str] = None
+        self._conversations_pending: Dict[Tuple[str, str], Optional[str]] = {}
+        self._reader: Optional[sqlite3.Connection] = None
+        self._writer: Optional[sqlite3.Connection] = None
+        self._commit_task: Optional[asyncio.Task] = None
+        self._commit_lock = asyncio.Lock()
+        self.application = None
+        # Hisoblagichlar
+        self.commits = 0
+        self.rows_written = 0
+        self.failures = 0
+
+    def attach(self, application) -> None:
+        """LRU dan chiqarish uchun Application (post_init da)"""
+        self.application = application
+
+    # ---------- SQLite ----------
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        return connection
+
+    @property
+    def reader(self) -> sqlite3.Connection:
+        """Event loop dagi o'qishlar uchun (indeks bo'yicha bitta qator - mikrosekundlar)"""
+        if self._reader is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._writer = self._connect()
+            self._writer.executescript(SCHEMA)
+            self._reader = self._connect()
+            logger.info(f"Holat ombori: {self.path} (max {self.users.max_entries} foydalanuvchi, "
+                        f"{self.chats.max_entries} chat)")
+        return self._reader
+
+    def _select(self, shelf: _Shelf, key: int) -> Optional[str]:
+        found, data = shelf.unwritten(key)
+        if found:
+            return data
+        row = self.reader.execute(f"SELECT data FROM {shelf.table} WHERE id = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _write_batch(self, batch: dict) -> int:
+        """Bitta tranzaksiya (fon oqimida)"""
+        rows = 0
+        writer = self._writer
+        writer.execute('BEGIN')
+        try:
+            for table, items in batch['shelves']:
+                upserts = [(key, data) for key, data in items.items() if data is not None]
+                deletes = [(key,) for key, data in items.items() if data is None]
+                if upserts:
+                    writer.executemany(f"INSERT OR REPLACE INTO {table} (id, data) VALUES (?, ?)", upserts)
+                if deletes:
+                    writer.executemany(f"DELETE FROM {table} WHERE id = ?", deletes)
+                rows += len(items)
+            if batch['bot'] is not None:
+                writer.execute("INSERT OR REPLACE INTO bot_data (id, data) VALUES (0, ?)", (batch['bot'],))
+                rows += 1
+            for (name, key), state in batch['conversations'].items():
+                if state is None:
+                    writer.execute("DELETE FROM conversations WHERE name = ? AND key = ?", (name, key))
+                else:
+                    writer.execute("INSERT OR REPLACE INTO conversations (name, key, state) VALUES (?, ?, ?)",
+                                   (name, key, state))
+                rows += 1
+            writer.execute('COMMIT')
+        except BaseException:
+            writer.execute('ROLLBACK')
+            raise
+        return rows
+
+    # ---------- yozish navbati ----------
+
+    def _schedule(self) -> None:
+        if self._commit_task is None or self._commit_task.done():
+            self._commit_task = asyncio.get_running_loop().create_task(self._commit_later())
+
+    def _has_pending(self) -> bool:
+        return bool(self.users.pending or self.chats.pending or self._bot_pending is not None
+                    or self._conversations_pending)
+
+    async def _commit_later(self) -> None:
+        # update_persistence bir vaqtda yuboradigan barcha yozuvlar bitta paketga tushadi;
+        # yozish paytida kelganlari - keyingi paketga
+        while self._has_pending():
+            await asyncio.sleep(self.write_delay)
+            failures = self.failures
+            await self.commit()
+            if self.failures != failures:
+                break
+
+    async def commit(self) -> None:
+        """Navbatdagi yozuvlarni bitta tranzaksiyada diskka yozish"""
+        async with self._commit_lock:
+            if not self._has_pending():
+                return
+            shelves = (self.users, self.chats)
+            _ = self.reader
+            for shelf in shelves:
+                shelf.writing, shelf.pending = shelf.pending, {}
+            batch = {
+                'shelves': [(shelf.table, shelf.writing) for shelf in shelves],
+                'bot': self._bot_pending,
+                'conversations': self._conversations_pending,
+            }
+            self._bot_pending = None
+            self._conversations_pending = {}
+            try:
+                self.rows_written += await asyncio.to_thread(self._write_batch, batch)
+                self.commits += 1
+            except (sqlite3.Error, OSError) as e:
+                self.failures += 1
+                logger.error(f"Holat omborini yozib bo'lmadi: {e!r}")
+                # Yangiroq yozuvlar ustidan yozilmaydi
+                for shelf in shelves:
+                    for key, data in shelf.writing.items():
+                        shelf.pending.setdefault(key, data)
+                if self._bot_pending is None:
+                    self._bot_pending = batch['bot']
+                for key, state in batch['conversations'].items():
+                    self._conversations_pending.setdefault(key, state)
+            finally:
+                for shelf in shelves:
+                    shelf.writing = {}
+
+    # ---------- LRU ----------
+
+    def _stage(self, shelf: _Shelf, key: int, data: dict, known: Optional[str]) -> Optional[str]:
+        """Dictni navbatga qo'yish (diskdagi bilan bir xil bo'lsa - yo'q). Yangi JSON qaytadi"""
+        try:
+            encoded = _encode(data)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"{shelf.table}[{key}] JSON ga o'girilmadi, saqlanmaydi: {e!r}")
+            return known
+        if encoded == EMPTY:
+            encoded = None
+        if encoded == known:
+            shelf.skipped += 1
+            return known
+        shelf.pending[key] = encoded
+        self._schedule()
+        return encoded
+
+    def _touch(self, shelf: _Shelf, key: int, data: dict, drop) -> None:
+        """Foydalanuvchi/chat faol: kerak bo'lsa diskdan tiklash va LRU ni cheklash"""
+        if key in shelf.resident:
+            shelf.resident.move_to_end(key)
+            return
+        stored = self._select(shelf, key)
+        if stored is not None:
+            shelf.loads += 1
+            for name, value in json.loads(stored).items():
+                data.setdefault(name, value)
+        shelf.resident[key] = stored
+        if self.application is None:
+            return
+        current = self.application.user_data if shelf is self.users else self.application.chat_data
+        while len(shelf.resident) > shelf.max_entries:
+            old_key, known = shelf.resident.popitem(last=False)
+            old_data = current.get(old_key)
+            if old_data is not None:
+                # Keyingi update_persistence kutilmaydi - oxirgi holat hozir navbatga
+                self._stage(shelf, old_key, old_data, known)
+            shelf.evicted.add(old_key)
+            shelf.evictions += 1
+            drop(old_key)
+
+    def _dropped(self, shelf: _Shelf, key: int, mark) -> None:
+        """Application.drop_*_data dan keyin: o'zimiz chiqargan bo'lsa diskda qoladi"""
+        if key in shelf.evicted:
+            shelf.evicted.discard(key)
+            if key in shelf.resident and self.application is not None:
+                # Chiqarilgandan keyin qaytgan - shu davrdagi yangilanish o'tkazib yuborilgan edi
+                mark(key)
+            return
+        shelf.resident.pop(key, None)
+        shelf.pending[key] = None
+        self._schedule()
+
+    def _updated(self, shelf: _Shelf, key: int, data: dict, drop) -> None:
+        if key not in shelf.resident:
+            # Chiqarilgan yozuv handler tomonidan qayta yaratilgan - diskdagisini bo'sh dict bilan almashtirmaymiz
+            if self.application is not None:
+                shelf.evicted.add(key)
+                drop(key)
+            return
+        shelf.resident[key] = self._stage(shelf, key, data, shelf.resident[key])
+
+    # ---------- BasePersistence ----------
+
+    async def get_user_data(self) -> Dict[int, dict]:
+        _ = self.reader
+        return {}
+
+    async def get_chat_data(self) -> Dict[int, dict]:
+        _ = self.reader
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        row = self.reader.execute("SELECT data FROM bot_data WHERE id = 0").fetchone()
+        self._bot_data = row[0] if row else EMPTY
+        return json.loads(self._bot_data)
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        rows = self.reader.execute("SELECT key, state FROM conversations WHERE name = ?", (name,)).fetchall()
+        return {tuple(json.loads(key)): json.loads(state) for key, state in rows}
+
+    async def update_conversation(self, name: str, key: tuple, new_state: Optional[object]) -> None:
+        self._conversations_pending[(name, _encode(list(key)))] = None if new_state is None else _encode(new_state)
+        self._schedule()
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        self._updated(self.users, user_id, data, self._drop_user)
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        self._updated(self.chats, chat_id, data, self._drop_chat)
+
+    async def update_bot_data(self, data: dict) -> None:
+        try:
+            encoded = _encode(data)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"bot_data JSON ga o'girilmadi, saqlanmaydi: {e!r}")
+            return
+        if encoded != self._bot_data:
+            self._bot_data = self._bot_pending = encoded
+            self._schedule()
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._dropped(self.users, user_id, lambda key: self.application.mark_data_for_update_persistence(user_ids=key))
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._dropped(self.chats, chat_id, lambda key: self.application.mark_data_for_update_persistence(chat_ids=key))
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        self._touch(self.users, user_id, user_data, self._drop_user)
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        self._touch(self.chats, chat_id, chat_data, self._drop_chat)
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def flush(self) -> None:
+        """Application.shutdown da - qolgan yozuvlarni yozib, ulanishlarni yopish"""
+        if self._commit_task is not None and not self._commit_task.done():
+            self._commit_task.cancel()
+            await asyncio.gather(self._commit_task, return_exceptions=True)
+        await self.commit()
+        for connection in (self._reader, self._writer):
+            if connection is not None:
+                connection.close()
+        self._reader = self._writer = None
+        logger.info(f"Holat ombori: {self.stats()}")
+
+    def _drop_user(self, user_id: int) -> None:
+        self.application.drop_user_data(user_id)
+
+    def _drop_chat(self, chat_id: int) -> None:
+        self.application.drop_chat_data(chat_id)
+
+    def stats(self) -> dict:
+        """Xotiradagi yozuvlar, yuklashlar, chiqarishlar va yozish statistikasi"""
+        return {
+            "users": self.users.stats(),
+            "chats": self.chats.stats(),
+            "commits": self.commits,
+            "rows_written": self.rows_written,
+            "failures": self.failures,
+        }
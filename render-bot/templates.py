@@ -0,0 +1,364 @@
+"""
+Menyu ekranlari uchun matn va tugma shablonlari
+
+Statik matnlar va klaviaturalar import vaqtida bir marta yaratiladi va qayta
+ishlatiladi (PTB obyektlari o'zgarmas). Foydalanuvchiga bog'liq qismlar (ism,
+rol, referal havola) arzon parametrli shablonlar orqali to'ldiriladi.
+Komanda (/profile) va menyu tugmasi (menu_profile) bir xil shablondan foydalanadi.
+"""
+
+import json
+import math
+from html import escape
+from types import SimpleNamespace
+from typing import NamedTuple, Optional
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+# Rol -> (emoji, nomi)
+ROLE_LABELS = {
+    "admin": ("👑", "Admin"),
+    "teacher": ("🎓", "O'qituvchi"),
+    "user": ("👤", "Foydalanuvchi"),
+}
+
+# Broadcast holati -> nomi
+BROADCAST_LABELS = {
+    "running": "⏳ yuborilmoqda",
+    "done": "✅ yakunlandi",
+    "stopped": "⏸ to'xtatildi",
+    "failed": "❌ xatolik bilan to'xtadi",
+}
+
+CODE_STEPS = (
+    "1️⃣ Kodni nusxalang (bosing)\n"
+    "2️⃣ Web saytga o'ting\n"
+    "3️⃣ Kodni kiriting"
+)
+
+
+class Screen(NamedTuple):
+    """Tayyor ekran: matn + tugmalar"""
+    text: str
+    keyboard: Optional[InlineKeyboardMarkup] = None
+
+
+def _keyboard(*rows) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([list(row) for row in rows])
+
+
+class Templates:
+    """Barcha ekranlar uchun shablonlar (bir marta yaratiladi)"""
+
+    def __init__(self, web_app_url: str, admin_username: str, channel_username: str,
+                 bot_username: str = 'ravonaiweb_bot', code_mode: str = 'table'):
+        self.web_app_url = web_app_url
+        self.admin_username = admin_username
+        self.channel_username = channel_username
+        self.bot_username = bot_username
+
+        back_button = InlineKeyboardButton("🔙 Menyu", callback_data="menu:main")
+        self._back_button = back_button
+        admin_button = InlineKeyboardButton(f"📞 Admin: @{admin_username}", url=f"https://t.me/{admin_username}")
+        # signed rejimda kod imzolangan (20-23 belgi), aks holda auth_codes dagi 6 xonali son
+        code_step = ("2. Kirish kodini oling (XXXXX-XXXXX-XXXXX-XXXXX)\n" if code_mode == 'signed'
+                     else "2. 6 xonali kodni oling\n")
+
+        self.main_menu_keyboard = _keyboard(
+            [
+                InlineKeyboardButton("🎤 Talaffuz testi", callback_data="menu:test"),
+                InlineKeyboardButton("🔊 Matn tinglash", callback_data="menu:tts"),
+            ],
+            [
+                InlineKeyboardButton("👤 Profil", callback_data="menu:profile"),
+                InlineKeyboardButton("📊 Statistika", callback_data="menu:stats"),
+            ],
+            [
+                InlineKeyboardButton("💎 Premium", callback_data="menu:premium"),
+                InlineKeyboardButton("👥 Referal", callback_data="menu:referral"),
+            ],
+            [
+                InlineKeyboardButton("❓ Yordam", callback_data="menu:help"),
+                InlineKeyboardButton("🌐 Web sayt", url=web_app_url),
+            ],
+        )
+
+        self.main_menu = Screen(
+            "📱 <b>Ravon AI - Asosiy menyu</b>\n\n"
+            "Kerakli bo'limni tanlang:",
+            self.main_menu_keyboard,
+        )
+
+        self.join_channel_keyboard = _keyboard(
+            [InlineKeyboardButton("📢 Kanalga a'zo bo'lish", url=f"https://t.me/{channel_username.replace('@', '')}")],
+            [InlineKeyboardButton("✅ Tekshirish", callback_data="auth:check")],
+        )
+
+        self.test = Screen(
+            "🎤 <b>Talaffuz Testi</b>\n\n"
+            "Talaffuzingizni AI yordamida tahlil qiling!\n\n"
+            "📌 <b>Qanday ishlaydi:</b>\n"
+            "1. Matn tanlang yoki o'zingiz yozing\n"
+            "2. Ovozingizni yozib yuboring\n"
+            "3. AI tahlil natijasini oling\n\n"
+            "📊 <b>Baholash ko'rsatkichlari:</b>\n"
+            "• 🎯 Accuracy (To'g'rilik)\n"
+            "• 🌊 Fluency (Ravonlik)\n"
+            "• ✅ Completeness (To'liqlik)\n"
+            "• 🎵 Prosody (Ohang)\n\n"
+            "⏱️ Maks. audio: 30 soniya\n"
+            "📊 Bepul: 10 ta/kun | Premium: 100 ta/kun",
+            _keyboard(
+                [InlineKeyboardButton("🎤 Web saytda test qilish", url=f"{web_app_url}/test")],
+                [back_button],
+            ),
+        )
+
+        self.tts = Screen(
+            "🔊 <b>Matnni Tinglash (TTS)</b>\n\n"
+            "Inglizcha matnni tinglang va talaffuzni o'rganing!\n\n"
+            "📌 <b>Imkoniyatlar:</b>\n"
+            "• Inglizcha matn kiriting\n"
+            "• Brauzer ovozi bilan tinglang\n"
+            "• Takrorlang va mashq qiling\n\n"
+            "📊 Bepul: 5 ta/kun (200 belgi)\n"
+            "💎 Premium: 50 ta/kun (2000 belgi)",
+            _keyboard(
+                [InlineKeyboardButton("🔊 Web saytda tinglash", url=f"{web_app_url}/tts")],
+                [back_button],
+            ),
+        )
+
+        self.stats = Screen(
+            "📊 <b>Statistika</b>\n\n"
+            "Batafsil statistikani ko'rish uchun web saytga o'ting:\n"
+            "• Jami testlar soni\n"
+            "• O'rtacha ball\n"
+            "• Haftalik tahlil\n"
+            "• So'nggi natijalar\n\n"
+            f"🌐 {web_app_url}/stats",
+            _keyboard(
+                [InlineKeyboardButton("📊 Web saytda ko'rish", url=f"{web_app_url}/stats")],
+                [back_button],
+            ),
+        )
+
+        self.premium = Screen(
+            "💎 <b>Premium Rejalar</b>\n\n"
+            "🌟 <b>Premium imkoniyatlari:</b>\n"
+            "✅ Kunlik 100 ta talaffuz testi (bepul: 10)\n"
+            "✅ Kunlik 50 ta TTS (bepul: 5)\n"
+            "✅ 2000 belgigacha matn tinglash\n"
+            "✅ Batafsil tahlil va tavsiyalar\n"
+            "✅ PDF hisobot yuklab olish\n"
+            "✅ Prioritet qo'llab-quvvatlash\n\n"
+            "💰 <b>Narxlar:</b>\n"
+            "📅 Haftalik: 15,000 so'm\n"
+            "📅 Oylik: 45,000 so'm\n"
+            "📅 Yillik: 300,000 so'm\n\n"
+            f"📞 Sotib olish uchun: @{admin_username}",
+            _keyboard(
+                [InlineKeyboardButton("💳 Premium sotib olish", url=f"{web_app_url}/premium")],
+                [admin_button],
+                [back_button],
+            ),
+        )
+
+        self.help = Screen(
+            "🎯 <b>Ravon AI Bot Yordam</b>\n\n"
+            "📌 <b>Buyruqlar:</b>\n"
+            "/start - Kirish kodini olish\n"
+            "/menu - Asosiy menyu\n"
+            "/help - Yordam\n"
+            "/code - Yangi kod olish\n"
+            "/profile - Profilim\n"
+            "/stats - Statistikam\n"
+            "/premium - Premium ma'lumoti\n"
+            "/referral - Referal dasturi\n\n"
+            "📌 <b>Qanday foydalanish:</b>\n"
+            "1. /start buyrug'ini yuboring\n"
+            f"{code_step}"
+            "3. Web saytga o'ting va kodni kiriting\n"
+            "4. Talaffuzni test qiling\n\n"
+            "❓ <b>FAQ:</b>\n"
+            "• Bepul: 10 test/kun, 5 TTS/kun\n"
+            "• Premium: 100 test/kun, 50 TTS/kun\n"
+            "• Limitlar har kuni 12:00 da yangilanadi\n"
+            "• Maks. audio: 30 soniya\n\n"
+            f"📞 Muammo bo'lsa: @{admin_username}",
+            _keyboard(
+                [InlineKeyboardButton("🌐 Yordam markazi", url=f"{web_app_url}/help")],
+                [admin_button],
+                [back_button],
+            ),
+        )
+
+        self.profile_keyboard = _keyboard(
+            [InlineKeyboardButton("🌐 Web saytda ko'rish", url=f"{web_app_url}/profile")],
+            [back_button],
+        )
+
+        self._referral_web_button = InlineKeyboardButton("🌐 Web saytda ko'rish", url=f"{web_app_url}/referral")
+
+    def warm(self) -> int:
+        """Ishga tushishda: har bir ekranni bir marta qurib, tugmalarni serializatsiya qilish
+
+        Birinchi foydalanuvchi javobi PTB ning to_dict/JSON yo'llarini birinchi
+        bo'lib bosib o'tmasligi uchun. Natija - tayyorlangan ekranlar soni.
+        """
+        sample_user = SimpleNamespace(id=0, first_name="Ravon", last_name=None, username=None)
+        screens = [
+            self.main_menu, self.test, self.tts, self.stats, self.premium, self.help,
+            self.profile(sample_user, "user"),
+            self.referral(0),
+            self.join_channel(sample_user.first_name),
+            self.auth_code(sample_user.first_name, "000000"),
+            self.membership_confirmed("000000"),
+            self.auth_error(""),
+            self.rate_limited(1),
+            self.service_unavailable(1),
+            self.broadcast_status({}),
+        ]
+        for screen in screens:
+            if screen.keyboard is not None:
+                json.dumps(screen.keyboard.to_dict())
+        return len(screens)
+
+    # ---------- Foydalanuvchiga bog'liq ekranlar ----------
+
+    def profile(self, user, role: str) -> Screen:
+        """Profil ekrani (ism, username, ID, rol)"""
+        role_emoji, role_name = ROLE_LABELS.get(role, ROLE_LABELS["user"])
+        full_name = escape(f"{user.first_name} {user.last_name or ''}")
+        username = escape(user.username) if user.username else "yo'q"
+        return Screen(
+            f"👤 <b>Mening Profilim</b>\n\n"
+            f"📛 Ism: {full_name}\n"
+            f"👤 Username: @{username}\n"
+            f"🆔 Telegram ID: <code>{user.id}</code>\n"
+            f"{role_emoji} Role: {role_name}\n\n"
+            f"📊 Batafsil statistika uchun web saytga o'ting.",
+            self.profile_keyboard,
+        )
+
+    def referral_link(self, user_id: int) -> str:
+        """Foydalanuvchining referal havolasi"""
+        return f"https://t.me/{self.bot_username}?start=ref_{user_id}"
+
+    def referral(self, user_id: int) -> Screen:
+        """Referal dasturi ekrani"""
+        referral_link = self.referral_link(user_id)
+        share_text = (
+            "Men Ravon AI orqali ingliz tili talaffuzimni yaxshilayapman! "
+            f"Sen ham sinab ko'r: {referral_link}"
+        )
+        return Screen(
+            f"👥 <b>Referal Dasturi</b>\n\n"
+            f"Do'stlaringizni taklif qiling va bonus oling!\n\n"
+            f"🔗 <b>Sizning havolangiz:</b>\n"
+            f"<code>{referral_link}</code>\n\n"
+            f"🎁 <b>Bonuslar:</b>\n"
+            f"• 1 do'st = +1 bonus limit\n"
+            f"• 3 do'st = +3 bonus limit\n"
+            f"• 10 do'st = +1 hafta premium\n\n"
+            f"📤 Havolani ulashing va bonus oling!",
+            _keyboard(
+                [InlineKeyboardButton("📤 Havolani ulashish", switch_inline_query=share_text)],
+                [self._referral_web_button],
+                [self._back_button],
+            ),
+        )
+
+    # ---------- Kirish kodi xabarlari ----------
+
+    def join_channel(self, first_name: str) -> Screen:
+        """Kanalga a'zo bo'lish taklifi"""
+        return Screen(
+            f"👋 Salom, {escape(first_name)}!\n\n"
+            f"🔒 Ravon AI dan foydalanish uchun avval rasmiy kanalimizga a'zo bo'ling:\n\n"
+            f"📢 {self.channel_username}\n\n"
+            f"A'zo bo'lgandan so'ng, \"✅ Tekshirish\" tugmasini bosing.",
+            self.join_channel_keyboard,
+        )
+
+    def auth_code(self, first_name: str, code: str, valid_minutes: int = 5) -> Screen:
+        """/start - kirish kodi va asosiy menyu"""
+        return Screen(
+            f"👋 Salom, {escape(first_name)}!\n\n"
+            f"🎯 <b>Ravon AI</b> - Ingliz tili talaffuzini baholash tizimi\n\n"
+            f"📝 Sizning kirish kodingiz:\n\n"
+            f"<code>{escape(code)}</code>\n\n"
+            f"⏰ Kod {valid_minutes} daqiqa ichida amal qiladi\n\n"
+            f"📌 <b>Qadamlar:</b>\n"
+            f"{CODE_STEPS}\n\n"
+            f"🔒 Xavfsizlik: Kodni boshqalarga bermang!",
+            self.main_menu_keyboard,
+        )
+
+    def membership_confirmed(self, code: str, valid_minutes: int = 5) -> Screen:
+        """A'zolik tasdiqlangandan keyin - kirish kodi"""
+        return Screen(
+            f"✅ A'zolik tasdiqlandi!\n\n"
+            f"📝 Sizning kirish kodingiz:\n\n"
+            f"<code>{escape(code)}</code>\n\n"
+            f"⏰ Kod {valid_minutes} daqiqa ichida amal qiladi\n\n"
+            f"📌 Qadamlar:\n"
+            f"{CODE_STEPS}",
+            self.main_menu_keyboard,
+        )
+
+    def auth_error(self, error_msg: str) -> Screen:
+        """Kod generatsiya qilishda xatolik (/start)"""
+        return Screen(
+            f"❌ Xatolik yuz berdi: {escape(str(error_msg))}\n\n"
+            f"Iltimos, keyinroq qayta urinib ko'ring yoki @{self.admin_username} ga murojaat qiling."
+        )
+
+    def rate_limited(self, retry_after: float) -> Screen:
+        """Juda ko'p kod so'ralganda"""
+        seconds = max(1, math.ceil(retry_after))
+        return Screen(
+            f"⏳ Juda ko'p so'rov yuborildi.\n\n"
+            f"Iltimos, {seconds} soniyadan keyin qayta urinib ko'ring."
+        )
+
+    def service_unavailable(self, retry_after: float, command: str = '/start') -> Screen:
+        """Supabase vaqtincha ishlamayotganda - darhol javob"""
+        seconds = max(1, math.ceil(retry_after))
+        return Screen(
+            f"🔧 Server vaqtincha band.\n\n"
+            f"Iltimos, {seconds} soniyadan keyin {command} ni qayta yuboring."
+        )
+
+    def broadcast_status(self, stats: dict) -> Screen:
+        """Broadcast jarayoni (status xabari tahrirlanadi)"""
+        total = stats.get("total")
+        processed = stats.get("processed", 0)
+        progress = f"{processed} / {total} ({processed * 100 // total}%)" if total else str(processed)
+        eta = stats.get("eta")
+        eta_text = f"~{int(eta // 60)} daq {int(eta % 60)} s" if eta is not None else "-"
+        return Screen(
+            f"📣 <b>Broadcast</b> - {BROADCAST_LABELS.get(stats.get('status'), stats.get('status'))}\n\n"
+            f"Jarayon: {progress}\n"
+            f"✅ Yuborildi: {stats.get('sent', 0)}\n"
+            f"🚫 Bloklagan: {stats.get('skipped', 0)}\n"
+            f"❌ Xato: {stats.get('failed', 0)}\n\n"
+            f"Tezlik: {stats.get('rate', 0)} xabar/s\n"
+            f"Qolgan vaqt: {eta_text}"
+        )
+
+    broadcast_usage = Screen(
+        "📣 <b>Broadcast</b>\n\n"
+        "/broadcast &lt;matn&gt; - barcha foydalanuvchilarga matn (HTML)\n"
+        "/broadcast - xabarga javob sifatida: shu xabar nusxasini yuborish\n"
+        "/broadcast status - joriy holat\n"
+        "/broadcast stop - to'xtatish\n"
+        "/broadcast resume - to'xtatilganini davom ettirish"
+    )
+
+    auth_retry = Screen(
+        "❌ Kod generatsiya qilishda xatolik.\n"
+        "Iltimos, /start buyrug'ini qayta yuboring."
+    )
+
+    not_member_alert = "❌ Siz hali kanalga a'zo emassiz. Avval kanalga a'zo bo'ling!"
@@ -0,0 +1,117 @@
+import asyncio
+import json
+
+from batch_writer import BatchWriter
+
+
+class Sink:
+    """flush funksiyasi: ok=False bo'lsa paket rad etiladi"""
+
+    def __init__(self, ok: bool = True):
+        self.ok = ok
+        self.batches = []
+
+    async def __call__(self, items):
+        self.batches.append(items)
+        return self.ok
+
+
+def read_journal(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_coalesces_by_key():
+    async def scenario():
+        sink = Sink()
+        writer = BatchWriter('test', sink, max_batch=10)
+        writer.add(1, {'v': 'a'})
+        writer.add(2, {'v': 'b'})
+        writer.add(1, {'v': 'c'})
+        assert await writer.flush()
+        return sink, writer
+
+    sink, writer = asyncio.run(scenario())
+    assert sink.batches == [[{'v': 'b'}, {'v': 'c'}]]
+    assert writer.stats()["coalesced"] == 1
+
+
+def test_failed_flush_keeps_newer_items():
+    async def scenario():
+        sink = Sink(ok=False)
+        writer = BatchWriter('test', sink, max_batch=10)
+        writer.add(1, 'old')
+        writer.add(2, 'x')
+        flush = asyncio.ensure_future(writer.flush())
+        await asyncio.sleep(0)
+        assert not await flush
+        writer.add(1, 'new')
+        sink.ok = True
+        assert await writer.flush()
+        return sink
+
+    sink = asyncio.run(scenario())
+    assert sink.batches[-1] == ['x', 'new']
+
+
+def test_journal_restores_pending_after_restart(tmp_path):
+    journal = str(tmp_path / 'writer.jsonl')
+
+    async def first_run():
+        writer = BatchWriter('test', Sink(ok=False), interval=60, journal=journal, journal_interval=0.01)
+        writer.start()
+        writer.add(1, {'v': 'a'})
+        writer.add(2, {'v': 'b'})
+        writer.add(1, {'v': 'c'})
+        await asyncio.sleep(0.05)
+        # Jarayon keskin to'xtadi - close() chaqirilmaydi
+        writer._task.cancel()
+        writer._journal_task.cancel()
+        writer._journal_file.close()
+
+    asyncio.run(first_run())
+    assert read_journal(journal) == [[1, {'v': 'a'}], [2, {'v': 'b'}], [1, {'v': 'c'}]]
+
+    async def second_run():
+        sink = Sink()
+        writer = BatchWriter('test', sink, interval=60, journal=journal)
+        writer.start()
+        assert await writer.flush()
+        await writer.close()
+        return sink
+
+    sink = asyncio.run(second_run())
+    # Takroriy kalitlar tiklashda birlashadi, oxirgi yozuv qoladi
+    assert sink.batches == [[{'v': 'c'}, {'v': 'b'}]]
+    assert read_journal(journal) == []
+
+
+def test_journal_rewritten_after_successful_flush(tmp_path):
+    journal = str(tmp_path / 'writer.jsonl')
+
+    async def scenario():
+        writer = BatchWriter('test', Sink(), max_batch=1, interval=60, journal=journal)
+        writer.start()
+        writer.add('a', 1)
+        writer.add('b', 2)
+        assert await writer.flush()
+        remaining = read_journal(journal)
+        await writer.close()
+        return remaining
+
+    assert asyncio.run(scenario()) == [['b', 2]]
+    assert read_journal(journal) == []
+
+
+def test_close_flushes_everything():
+    async def scenario():
+        sink = Sink()
+        writer = BatchWriter('test', sink, max_batch=2, interval=60)
+        writer.start()
+        for key in range(5):
+            writer.add(key, key)
+        await writer.close()
+        return sink
+
+    sink = asyncio.run(scenario())
+    assert [item for batch in sink.batches for item in batch] == [0, 1, 2, 3, 4]
@@ -0,0 +1,94 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from broadcast import Broadcaster
+from templates import Screen
+
+USERS = [str(uid) for uid in range(1, 41)]
+
+
+class FakeBot:
+    """Broadcaster ishlatadigan Bot qismi - xabar darhol yetadi, javob `delay` soniyadan keyin"""
+
+    def __init__(self, delay: float = 0.01):
+        self.delay = delay
+        self.sent = []
+
+    async def send_message(self, chat_id, text, parse_mode=None, rate_limit_args=None):
+        if rate_limit_args is not None:
+            self.sent.append(chat_id)
+            await asyncio.sleep(self.delay)
+        return SimpleNamespace(message_id=1)
+
+    async def edit_message_text(self, *args, **kwargs):
+        pass
+
+
+async def fetch_page(after, limit):
+    start = USERS.index(after) + 1 if after else 0
+    return USERS[start:start + limit], len(USERS)
+
+
+def make_broadcaster(path, **kwargs):
+    return Broadcaster(fetch_page, lambda stats: Screen("", None), str(path),
+                       concurrency=4, page_size=10, **kwargs)
+
+
+def test_shutdown_and_resume_sends_each_user_once(tmp_path):
+    path = tmp_path / 'broadcast.json'
+    bot = FakeBot()
+
+    async def first_run():
+        broadcaster = make_broadcaster(path)
+        await broadcaster.start(bot, 1, {"type": "text", "text": "salom"})
+        await asyncio.sleep(0.05)
+        await broadcaster.shutdown()
+
+    async def second_run():
+        broadcaster = make_broadcaster(path)
+        assert await broadcaster.resume(bot)
+        await broadcaster._task
+        return broadcaster.state
+
+    asyncio.run(first_run())
+    saved = json.loads(path.read_text())
+    assert saved["status"] == "running"
+    assert 0 < len(bot.sent) < len(USERS)
+
+    state = asyncio.run(second_run())
+    assert state["status"] == "done"
+    assert sorted(bot.sent) == list(range(1, 41))
+    assert state["sent"] == len(USERS)
+
+
+def test_shutdown_grace_expired_keeps_state_resumable(tmp_path):
+    path = tmp_path / 'broadcast.json'
+    bot = FakeBot(delay=10)
+
+    async def scenario():
+        broadcaster = make_broadcaster(path, shutdown_grace=0.05)
+        await broadcaster.start(bot, 1, {"type": "text", "text": "salom"})
+        await asyncio.sleep(0.01)
+        await broadcaster.shutdown()
+
+    asyncio.run(scenario())
+    saved = json.loads(path.read_text())
+    assert saved["status"] == "running" and saved["page_done"] == []
+
+
+def test_admin_stop_marks_stopped(tmp_path):
+    path = tmp_path / 'broadcast.json'
+    bot = FakeBot()
+
+    async def scenario():
+        broadcaster = make_broadcaster(path)
+        await broadcaster.start(bot, 1, {"type": "text", "text": "salom"})
+        await asyncio.sleep(0.03)
+        await broadcaster.stop()
+        return broadcaster.state
+
+    state = asyncio.run(scenario())
+    saved = json.loads(path.read_text())
+    assert state["status"] == saved["status"] == "stopped"
+    assert sorted(saved["page_done"]) == sorted(state["page_done"])
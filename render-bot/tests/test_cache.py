@@ -0,0 +1,30 @@
+from ravon_botkit.cache import TTLCache
+
+
+def test_ttl_cache_expiry(clock):
+    cache = TTLCache(maxsize=10, ttl=5)
+    cache.set('a', 1)
+    cache.set('b', 2, ttl=20)
+    assert cache.get('a') == 1
+    clock.advance(5)
+    assert cache.get('a') is None
+    assert cache.get('a', 'default') == 'default'
+    assert cache.get('b') == 2
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 2
+
+
+def test_ttl_cache_lru_eviction(clock):
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert len(cache) == 2
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+
+
+def test_ttl_cache_falsy_values(clock):
+    cache = TTLCache()
+    cache.set('member', False)
+    assert cache.get('member') is False
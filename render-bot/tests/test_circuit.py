@@ -0,0 +1,90 @@
+import random
+
+from circuit import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, RetryBudget, backoff_delay
+
+
+def test_breaker_opens_after_threshold(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10)
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.retry_after() == 10
+    assert breaker.stats()["rejected"] == 1
+
+
+def test_breaker_success_resets_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+
+def test_breaker_half_open_single_probe(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    clock.advance(10)
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    # Sinov so'rovi tugamaguncha boshqalari rad etiladi
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+
+def test_breaker_failed_probe_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    clock.advance(10)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.retry_after() == 10
+    assert breaker.opened == 2
+
+
+def test_breaker_lost_probe_does_not_stick(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    clock.advance(10)
+    assert breaker.allow()
+    # Natija yozilmadi (so'rov bekor qilindi) - reset_timeout dan keyin yangi sinov
+    clock.advance(10)
+    assert breaker.allow()
+
+
+def test_late_failures_do_not_extend_open(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    clock.advance(5)
+    breaker.record_failure()
+    assert breaker.retry_after() == 5
+
+
+def test_retry_budget_ratio(clock):
+    budget = RetryBudget(ratio=0.5, min_per_sec=0)
+    budget.floor.tokens = 0
+    assert not budget.try_withdraw()
+    budget.deposit()
+    budget.deposit()
+    assert budget.try_withdraw()
+    assert not budget.try_withdraw()
+    assert budget.stats() == {"balance": 0.0, "granted": 1, "exhausted": 2}
+
+
+def test_retry_budget_floor(clock):
+    budget = RetryBudget(ratio=0.1, min_per_sec=1)
+    assert sum(budget.try_withdraw() for _ in range(20)) == 10
+    clock.advance(1)
+    assert budget.try_withdraw()
+
+
+def test_backoff_delay_is_capped():
+    rng = random.Random(1)
+    for attempt in range(10):
+        assert 0 <= backoff_delay(attempt, base=0.2, cap=2.0, rng=rng) <= min(2.0, 0.2 * 2 ** attempt)
@@ -0,0 +1,34 @@
+import pytest
+
+from dispatch import CallbackData, build_callback_data, parse_callback_data
+
+
+@pytest.mark.parametrize('data, expected', [
+    ('menu:profile', CallbackData('menu', 'profile')),
+    ('auth:check', CallbackData('auth', 'check')),
+    ('admin:broadcast:42', CallbackData('admin', 'broadcast', '42')),
+    # Argument ichidagi ":" ajratilmaydi
+    ('page:open:a:b', CallbackData('page', 'open', 'a:b')),
+    # Eski formatdagi tugmalar
+    ('back_to_menu', CallbackData('menu', 'main')),
+    ('check_membership', CallbackData('auth', 'check')),
+    ('menu_profile', CallbackData('menu', 'profile')),
+])
+def test_parse_callback_data(data, expected):
+    assert parse_callback_data(data) == expected
+
+
+@pytest.mark.parametrize('data', ['', None, 'unknown', 'profile'])
+def test_parse_unknown_callback_data(data):
+    assert parse_callback_data(data) is None
+
+
+def test_build_round_trip():
+    assert build_callback_data('menu', 'profile') == 'menu:profile'
+    data = build_callback_data('admin', 'broadcast', '42')
+    assert parse_callback_data(data) == CallbackData('admin', 'broadcast', '42')
+
+
+def test_build_rejects_long_data():
+    with pytest.raises(ValueError):
+        build_callback_data('menu', 'x', 'y' * 64)
@@ -0,0 +1,94 @@
+import pytest
+
+from login_codes import CLOCK_SKEW, MAX_TTL, format_code, mint_login_code, normalize_code, verify_login_code, _decode, _encode
+
+SECRET = b'test-secret'
+NOW = 1_800_000_000
+
+
+def test_round_trip_short_code():
+    code, expires_at = mint_login_code(SECRET, 123456789, ttl=300, now=NOW)
+    assert len(normalize_code(code)) == 20
+    assert code.count('-') == 3
+    assert verify_login_code(SECRET, code, now=NOW) == (123456789, expires_at)
+    assert expires_at % 60 == 0 and NOW + 300 <= expires_at < NOW + 360
+
+
+@pytest.mark.parametrize('user_id', [1 << 40, (1 << 52) - 1, (1 << 55) - 1])
+def test_round_trip_long_code(user_id):
+    code, expires_at = mint_login_code(SECRET, user_id, now=NOW)
+    assert len(normalize_code(code)) == 23
+    assert verify_login_code(SECRET, code, now=NOW) == (user_id, expires_at)
+
+
+def test_user_input_is_normalized():
+    code, expires_at = mint_login_code(SECRET, 987654321, now=NOW)
+    typed = ' ' + code.lower().replace('0', 'o').replace('1', 'l') + ' '
+    assert verify_login_code(SECRET, typed, now=NOW) == (987654321, expires_at)
+
+
+def test_tampered_code_is_rejected():
+    code = normalize_code(mint_login_code(SECRET, 123456789, now=NOW)[0])
+    for index in range(len(code)):
+        replacement = '0' if code[index] != '0' else '1'
+        tampered = code[:index] + replacement + code[index + 1:]
+        assert verify_login_code(SECRET, tampered, now=NOW) is None
+
+
+def test_wrong_secret_is_rejected():
+    code, _ = mint_login_code(SECRET, 123456789, now=NOW)
+    assert verify_login_code(b'other-secret', code, now=NOW) is None
+
+
+def test_expired_code_is_rejected():
+    code, expires_at = mint_login_code(SECRET, 123456789, ttl=300, now=NOW)
+    assert verify_login_code(SECRET, code, now=expires_at - 1) is not None
+    assert verify_login_code(SECRET, code, now=expires_at) is None
+    # Tugash vaqti mod 4096 daqiqa - bir aylanadan keyin ham qabul qilinmaydi
+    assert verify_login_code(SECRET, code, now=NOW + 4096 * 60) is None
+
+
+def test_non_canonical_long_form_is_rejected():
+    code = normalize_code(mint_login_code(SECRET, 123456789, now=NOW)[0])
+    padded = _encode(_decode(code), 23)
+    assert verify_login_code(SECRET, padded, now=NOW) is None
+
+
+@pytest.mark.parametrize('code', ['', 'ABC', 'U' * 20, '0' * 20, '0' * 23, '1' * 17])
+def test_malformed_code_is_rejected(code):
+    assert verify_login_code(SECRET, code, now=NOW) is None
+
+
+@pytest.mark.parametrize('user_id', [0, -1, 1 << 55])
+def test_user_id_out_of_range(user_id):
+    with pytest.raises(ValueError):
+        mint_login_code(SECRET, user_id, now=NOW)
+
+
+@pytest.mark.parametrize('ttl', [0, MAX_TTL + 1])
+def test_ttl_out_of_range(ttl):
+    with pytest.raises(ValueError):
+        mint_login_code(SECRET, 123456789, ttl=ttl, now=NOW)
+
+
+def test_max_ttl_round_trip():
+    code, expires_at = mint_login_code(SECRET, 123456789, ttl=MAX_TTL, now=NOW)
+    assert verify_login_code(SECRET, code, ttl=MAX_TTL, now=NOW) == (123456789, expires_at)
+
+
+def test_expiry_beyond_ttl_is_rejected():
+    # Validly signed, but valid for longer than the verifier's ttl
+    code, _ = mint_login_code(SECRET, 123456789, ttl=3600, now=NOW)
+    assert verify_login_code(SECRET, code, ttl=300, now=NOW) is None
+    assert verify_login_code(SECRET, code, ttl=300, now=NOW + 3600 - 300) is not None
+
+
+def test_clock_skew_is_tolerated():
+    code, expires_at = mint_login_code(SECRET, 123456789, ttl=300, now=NOW)
+    assert verify_login_code(SECRET, code, ttl=300, now=NOW - CLOCK_SKEW + 1) == (123456789, expires_at)
+    assert verify_login_code(SECRET, code, ttl=300, now=NOW - CLOCK_SKEW - 60) is None
+
+
+def test_format_code_groups():
+    assert format_code('A' * 20) == 'AAAAA-AAAAA-AAAAA-AAAAA'
+    assert format_code('A' * 23) == 'AAAAAA-AAAAAA-AAAAAA-AAAAA'
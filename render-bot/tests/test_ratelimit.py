@@ -0,0 +1,57 @@
+import pytest
+
+from ravon_botkit.ratelimit import RateLimiter, TokenBucket
+
+
+def test_token_bucket_burst_and_refill(clock):
+    bucket = TokenBucket(rate=2, capacity=3)
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+    assert bucket.retry_after() == pytest.approx(0.5)
+    clock.advance(0.5)
+    assert bucket.try_acquire()
+    clock.advance(100)
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+
+
+def test_token_bucket_refund_is_capped(clock):
+    bucket = TokenBucket(rate=1, capacity=2)
+    bucket.refund(5)
+    assert bucket.tokens == 2
+
+
+def test_zero_rate_never_refills(clock):
+    bucket = TokenBucket(rate=0, capacity=1)
+    assert bucket.try_acquire()
+    assert bucket.retry_after() == float('inf')
+
+
+def test_rate_limiter_per_user(clock):
+    limiter = RateLimiter(user_rate=1 / 60, user_burst=2, global_rate=100, global_burst=100)
+    assert limiter.check(1) == 0
+    assert limiter.check(1) == 0
+    assert limiter.check(1) == pytest.approx(60)
+    # Boshqa foydalanuvchiga ta'sir qilmaydi
+    assert limiter.check(2) == 0
+    assert limiter.stats()["limited_user"] == 1
+
+
+def test_rate_limiter_global_refunds_user_token(clock):
+    limiter = RateLimiter(user_rate=1, user_burst=5, global_rate=1, global_burst=1)
+    assert limiter.check('a') == 0
+    assert limiter.check('a') == pytest.approx(1)
+    # Global limitda olingan token qaytarilgan
+    assert limiter._buckets['a'].tokens == 4
+    clock.advance(1)
+    assert limiter.check('a') == 0
+    assert limiter.stats()["limited_global"] == 1
+
+
+def test_rate_limiter_evicts_least_recent(clock):
+    limiter = RateLimiter(user_rate=0, user_burst=1, global_rate=100, global_burst=100, max_keys=2)
+    limiter.check(1)
+    limiter.check(2)
+    limiter.check(1)
+    limiter.check(3)
+    assert list(limiter._buckets) == [1, 3]
+    # Chiqarilgan foydalanuvchi to'la bucket bilan qaytadi
+    assert limiter.check(2) == 0
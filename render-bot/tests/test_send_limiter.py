@@ -0,0 +1,83 @@
+import asyncio
+import time
+
+from telegram.error import RetryAfter
+
+from send_limiter import SendRateLimiter
+
+
+def make_limiter():
+    return SendRateLimiter(global_rate=1000, private_chat_rate=1000, private_chat_burst=1000, max_retries=1)
+
+
+async def request(limiter, endpoint, chat_id=None, flood_once=False):
+    """Limiter orqali so'rov; flood_once - birinchi urinishda 429 (1s)"""
+    calls = []
+
+    async def callback():
+        calls.append(time.monotonic())
+        if flood_once and len(calls) == 1:
+            raise RetryAfter(1)
+        return True
+
+    data = {'chat_id': chat_id} if chat_id is not None else {}
+    await limiter.process_request(callback, (), {}, endpoint, data, None)
+    return calls
+
+
+def test_chat_flood_does_not_block_other_chats_or_reads():
+    async def scenario():
+        limiter = make_limiter()
+        flooded = asyncio.create_task(request(limiter, 'sendMessage', 1, flood_once=True))
+        await asyncio.sleep(0.05)
+        started = time.monotonic()
+        await asyncio.gather(request(limiter, 'sendMessage', 2), request(limiter, 'getMe'),
+                             request(limiter, 'answerCallbackQuery'))
+        others = time.monotonic() - started
+        # Shu chatdagi keyingi xabar pauzani kutadi
+        same_chat = await request(limiter, 'sendMessage', 1)
+        calls = await flooded
+        return others, calls, same_chat, limiter.stats()
+
+    others, calls, same_chat, stats = asyncio.run(scenario())
+    assert others < 0.5
+    assert calls[1] - calls[0] >= 1.0
+    assert same_chat[0] >= calls[0] + 1.0
+    assert stats["chat_floods"] == 1 and stats["global_floods"] == 0
+
+
+def test_many_flooded_chats_pause_everyone():
+    async def scenario():
+        limiter = make_limiter()
+        flooded = [asyncio.create_task(request(limiter, 'sendMessage', chat, flood_once=True))
+                   for chat in (1, 2, 3)]
+        await asyncio.sleep(0.05)
+        started = time.monotonic()
+        await request(limiter, 'sendMessage', 4)
+        waited = time.monotonic() - started
+        reads_started = time.monotonic()
+        await request(limiter, 'getMe')
+        reads = time.monotonic() - reads_started
+        await asyncio.gather(*flooded)
+        return waited, reads, limiter.stats()
+
+    waited, reads, stats = asyncio.run(scenario())
+    assert waited >= 0.9
+    assert reads < 0.5
+    assert stats["global_floods"] == 1
+
+
+def test_read_method_flood_retries_without_pausing_sends():
+    async def scenario():
+        limiter = make_limiter()
+        read = asyncio.create_task(request(limiter, 'getChatMember', 5, flood_once=True))
+        await asyncio.sleep(0.05)
+        started = time.monotonic()
+        await request(limiter, 'sendMessage', 5)
+        sent = time.monotonic() - started
+        calls = await read
+        return sent, calls
+
+    sent, calls = asyncio.run(scenario())
+    assert sent < 0.5
+    assert calls[1] - calls[0] >= 1.0
@@ -0,0 +1,38 @@
+from sharding import extract_user_id, shard_for
+
+
+def test_message_routes_by_sender():
+    update = {'update_id': 1, 'message': {'from': {'id': 42}, 'chat': {'id': -100}}}
+    assert extract_user_id(update) == 42
+
+
+def test_callback_query_routes_by_sender():
+    update = {'update_id': 1, 'callback_query': {'id': 'x', 'from': {'id': 7}, 'message': {'chat': {'id': 7}}}}
+    assert extract_user_id(update) == 7
+
+
+def test_chat_member_routes_by_member_not_admin():
+    # Admin (from) boshqa foydalanuvchini o'zgartirdi - update a'zoning ishchisiga tushadi
+    update = {'update_id': 1, 'chat_member': {
+        'chat': {'id': -100},
+        'from': {'id': 1},
+        'old_chat_member': {'status': 'member', 'user': {'id': 99}},
+        'new_chat_member': {'status': 'kicked', 'user': {'id': 99}},
+    }}
+    assert extract_user_id(update) == 99
+
+
+def test_my_chat_member_routes_by_member():
+    update = {'update_id': 1, 'my_chat_member': {
+        'chat': {'id': 5},
+        'from': {'id': 5},
+        'new_chat_member': {'status': 'kicked', 'user': {'id': 123, 'is_bot': True}},
+    }}
+    assert extract_user_id(update) == 123
+
+
+def test_chat_fallback_and_unknown():
+    assert extract_user_id({'update_id': 1, 'channel_post': {'chat': {'id': -5}}}) == -5
+    assert extract_user_id({'update_id': 1}) is None
+    assert shard_for(None, 4) == 0
+    assert shard_for(10, 4) == 2
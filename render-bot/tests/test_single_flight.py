@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+from ravon_botkit.cache import SingleFlight
+
+
+def test_single_flight_coalesces():
+    calls = []
+
+    async def fetch(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return key * 2
+
+    async def scenario():
+        flight = SingleFlight()
+        results = await asyncio.gather(*(flight.run('k', fetch, 21) for _ in range(5)))
+        assert results == [42] * 5
+        assert flight.stats() == {"inflight": 0, "calls": 1, "coalesced": 4}
+        # Tugagan so'rov unutiladi - keyingisi qayta bajariladi
+        assert await flight.run('k', fetch, 1) == 2
+
+    asyncio.run(scenario())
+    assert calls == [21, 1]
+
+
+def test_single_flight_cancelled_waiter_does_not_cancel_call():
+    async def fetch():
+        await asyncio.sleep(0.02)
+        return 'ok'
+
+    async def scenario():
+        flight = SingleFlight()
+        first = asyncio.ensure_future(flight.run('k', fetch))
+        second = asyncio.ensure_future(flight.run('k', fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert await second == 'ok'
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+    asyncio.run(scenario())
+
+
+def test_single_flight_propagates_errors():
+    async def fail():
+        raise RuntimeError('down')
+
+    async def scenario():
+        flight = SingleFlight()
+        with pytest.raises(RuntimeError):
+            await flight.run('k', fail)
+        assert flight.stats()["inflight"] == 0
+
+    asyncio.run(scenario())
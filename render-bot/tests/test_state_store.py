@@ -0,0 +1,117 @@
+import asyncio
+import sqlite3
+
+from state_store import SQLitePersistence
+
+
+class FakeApplication:
+    """SQLitePersistence ishlatadigan Application qismi"""
+
+    def __init__(self):
+        self.user_data = {}
+        self.chat_data = {}
+        self.marked = []
+
+    def drop_user_data(self, user_id):
+        self.user_data.pop(user_id, None)
+
+    def drop_chat_data(self, chat_id):
+        self.chat_data.pop(chat_id, None)
+
+    def mark_data_for_update_persistence(self, user_ids=None, chat_ids=None):
+        self.marked.append((user_ids, chat_ids))
+
+
+def rows(path, table='user_data'):
+    with sqlite3.connect(path) as connection:
+        return dict(connection.execute(f"SELECT id, data FROM {table}").fetchall())
+
+
+async def touch(store, app, user_id, **values):
+    data = app.user_data.setdefault(user_id, {})
+    await store.refresh_user_data(user_id, data)
+    data.update(values)
+    await store.update_user_data(user_id, data)
+    return data
+
+
+def test_round_trip_after_restart(tmp_path):
+    path = str(tmp_path / 'state.sqlite3')
+
+    async def first_run():
+        store = SQLitePersistence(path, write_delay=0)
+        app = FakeApplication()
+        store.attach(app)
+        await touch(store, app, 1, lang='uz')
+        await store.flush()
+
+    async def second_run():
+        store = SQLitePersistence(path)
+        data = {}
+        await store.refresh_user_data(1, data)
+        await store.flush()
+        return data, store.users.loads
+
+    asyncio.run(first_run())
+    assert asyncio.run(second_run()) == ({'lang': 'uz'}, 1)
+
+
+def test_empty_and_unchanged_data_is_not_written(tmp_path):
+    path = str(tmp_path / 'state.sqlite3')
+
+    async def scenario():
+        store = SQLitePersistence(path)
+        app = FakeApplication()
+        store.attach(app)
+        for user_id in range(100):
+            await touch(store, app, user_id)
+        await touch(store, app, 1, lang='uz')
+        await store.commit()
+        await touch(store, app, 1)
+        await store.flush()
+        return store
+
+    store = asyncio.run(scenario())
+    assert rows(path) == {1: '{"lang":"uz"}'}
+    assert store.rows_written == 1
+    # 100 ta bo'sh dict + o'zgarmagan 1-foydalanuvchi
+    assert store.users.stats()["skipped"] == 101
+
+
+def test_lru_evicts_to_disk(tmp_path):
+    path = str(tmp_path / 'state.sqlite3')
+
+    async def scenario():
+        store = SQLitePersistence(path, max_users=2)
+        app = FakeApplication()
+        store.attach(app)
+        await touch(store, app, 1, step=1)
+        await touch(store, app, 2)
+        await touch(store, app, 3)
+        assert list(app.user_data) == [2, 3]
+        assert list(store.users.resident) == [2, 3]
+        # Chiqarilgan foydalanuvchi qaytganda diskdan tiklanadi
+        data = await touch(store, app, 1)
+        await store.flush()
+        return data, store.users.stats()
+
+    data, stats = asyncio.run(scenario())
+    assert data == {'step': 1}
+    assert stats["evictions"] == 2 and stats["loads"] == 1
+    assert rows(path) == {1: '{"step":1}'}
+
+
+def test_dropped_user_is_deleted(tmp_path):
+    path = str(tmp_path / 'state.sqlite3')
+
+    async def scenario():
+        store = SQLitePersistence(path)
+        app = FakeApplication()
+        store.attach(app)
+        await touch(store, app, 1, lang='uz')
+        await store.commit()
+        await store.drop_user_data(1)
+        await store.flush()
+
+    asyncio.run(scenario())
+    assert rows(path) == {}
@@ -0,0 +1,158 @@
+import asyncio
+import random
+
+from telegram import Update
+
+from ravon_botkit.update_processor import ChatOrderedUpdateProcessor, ordering_key
+
+
+def make_update(update_id: int, chat_id: int) -> Update:
+    return Update.de_json({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Test"},
+            "text": "/start",
+        },
+    }, None)
+
+
+def make_chat_member_update(update_id: int, user_id: int) -> Update:
+    member = {"user": {"id": user_id, "is_bot": False, "first_name": "Test"}}
+    return Update.de_json({
+        "update_id": update_id,
+        "chat_member": {
+            "chat": {"id": -100, "type": "channel", "title": "Kanal"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Test"},
+            "date": 0,
+            "old_chat_member": dict(member, status="left"),
+            "new_chat_member": dict(member, status="member"),
+        },
+    }, None)
+
+
+def test_ordering_key():
+    assert ordering_key(make_update(1, 42)) == 42
+    # Kanal a'zoligi updatelari foydalanuvchi bo'yicha
+    assert ordering_key(make_chat_member_update(2, 7)) == 7
+    assert ordering_key(object()) is None
+
+
+def test_per_chat_order_and_parallel_chats():
+    seen = {}
+    running = {"now": 0, "max": 0}
+
+    async def handler(update: Update):
+        running["now"] += 1
+        running["max"] = max(running["max"], running["now"])
+        await asyncio.sleep(random.uniform(0, 0.005))
+        seen.setdefault(update.effective_chat.id, []).append(update.update_id)
+        running["now"] -= 1
+
+    async def scenario():
+        processor = ChatOrderedUpdateProcessor(workers=8, max_pending=1000)
+        updates = [make_update(update_id, chat_id=update_id % 5) for update_id in range(1, 101)]
+        await asyncio.gather(*(processor.process_update(update, handler(update)) for update in updates))
+        return processor
+
+    random.seed(0)
+    processor = asyncio.run(scenario())
+    for chat_id, update_ids in seen.items():
+        assert update_ids == sorted(update_ids)
+    assert sum(len(ids) for ids in seen.values()) == 100
+    # Bitta chat ichida ketma-ket, 5 ta chat parallel
+    assert 1 < running["max"] <= 5
+    stats = processor.stats()
+    assert stats["processed"] == 100
+    assert stats["pending"] == 0 and stats["active"] == 0 and stats["chats_queued"] == 0
+    assert processor.last_update_id == 100
+
+
+def test_workers_limit_concurrency():
+    running = {"now": 0, "max": 0}
+
+    async def handler():
+        running["now"] += 1
+        running["max"] = max(running["max"], running["now"])
+        await asyncio.sleep(0.001)
+        running["now"] -= 1
+
+    async def scenario():
+        processor = ChatOrderedUpdateProcessor(workers=3, max_pending=1000)
+        await asyncio.gather(*(processor.process_update(make_update(i, chat_id=i), handler())
+                               for i in range(1, 31)))
+
+    asyncio.run(scenario())
+    assert running["max"] == 3
+
+
+def test_cancelled_update_keeps_chat_order():
+    order = []
+
+    async def handler(name: str, delay: float):
+        await asyncio.sleep(delay)
+        order.append(name)
+
+    async def scenario():
+        processor = ChatOrderedUpdateProcessor(workers=4)
+        first = asyncio.ensure_future(processor.process_update(make_update(1, 9), handler('first', 0.02)))
+        second = asyncio.ensure_future(processor.process_update(make_update(2, 9), handler('second', 0)))
+        third = asyncio.ensure_future(processor.process_update(make_update(3, 9), handler('third', 0)))
+        await asyncio.sleep(0.005)
+        # Navbatda kutayotgan update bekor qilinadi - keyingisi birinchidan oldin boshlanmaydi
+        second.cancel()
+        await asyncio.gather(first, second, third, return_exceptions=True)
+        return processor
+
+    processor = asyncio.run(scenario())
+    assert order == ['first', 'third']
+    assert processor.stats()["pending"] == 0
+
+
+def test_wait_idle_tracks_updates_waiting_on_base_semaphore():
+    release = asyncio.Event()
+
+    async def handler():
+        await release.wait()
+
+    async def scenario():
+        processor = ChatOrderedUpdateProcessor(workers=4, max_pending=1)
+        queue = asyncio.Queue()
+        first = asyncio.ensure_future(processor.process_update(make_update(1, 1), handler()))
+        second = asyncio.ensure_future(processor.process_update(make_update(2, 2), handler()))
+        await asyncio.sleep(0.01)
+        # Ikkinchisi hali do_process_update ga yetmagan - bazaviy semaforni kutmoqda
+        busy = await processor.wait_idle(queue, 0.1)
+        running, waiting = processor.abandon()
+        release.set()
+        await asyncio.gather(first, second, return_exceptions=True)
+        return busy, running, waiting, await processor.wait_idle(queue, 0.1)
+
+    busy, running, waiting, idle = asyncio.run(scenario())
+    assert not busy
+    assert (running, waiting) == (1, 1)
+    assert idle
+
+
+def test_wait_idle_covers_update_taken_from_queue():
+    async def scenario():
+        processor = ChatOrderedUpdateProcessor()
+        queue = asyncio.Queue()
+        queue.put_nowait(make_update(1, 1))
+        # Application navbatdan oldi, lekin process_update hali chaqirilmagan
+        update = queue.get_nowait()
+        busy = await processor.wait_idle(queue, 0.1)
+
+        async def handler():
+            pass
+
+        async def finish():
+            await processor.process_update(update, handler())
+            queue.task_done()
+
+        asyncio.get_running_loop().call_later(0.05, lambda: asyncio.ensure_future(finish()))
+        return busy, await processor.wait_idle(queue, 1.0)
+
+    assert asyncio.run(scenario()) == (False, True)
@@ -0,0 +1,128 @@
+"""
+Update turlari: allowed_updates ni handlerlardan aniqlash va statistika
+
+Telegram faqat ro'yxatdan o'tgan handlerlar qayta ishlaydigan update turlarini
+yuborishi uchun allowed_updates ro'yxati handlerlardan avtomatik hosil qilinadi.
+UpdateStats har bir tur bo'yicha qabul qilingan va qayta ishlangan updatelarni sanaydi.
+"""
+
+import functools
+import logging
+from collections import Counter
+from typing import Callable, List, Sequence
+
+from telegram import Update
+from telegram.ext import (
+    Application, BaseHandler, CallbackQueryHandler, ChatJoinRequestHandler,
+    ChatMemberHandler, ChosenInlineResultHandler, CommandHandler, ConversationHandler,
+    InlineQueryHandler, MessageHandler, PollAnswerHandler, PollHandler,
+    PreCheckoutQueryHandler, PrefixHandler, ShippingQueryHandler, TypeHandler,
+)
+
+logger = logging.getLogger(__name__)
+
+# Handler turi -> u qayta ishlaydigan update turlari
+HANDLER_UPDATE_TYPES = {
+    CommandHandler: [Update.MESSAGE],
+    PrefixHandler: [Update.MESSAGE],
+    MessageHandler: [Update.MESSAGE, Update.EDITED_MESSAGE, Update.CHANNEL_POST, Update.EDITED_CHANNEL_POST],
+    CallbackQueryHandler: [Update.CALLBACK_QUERY],
+    InlineQueryHandler: [Update.INLINE_QUERY],
+    ChosenInlineResultHandler: [Update.CHOSEN_INLINE_RESULT],
+    ShippingQueryHandler: [Update.SHIPPING_QUERY],
+    PreCheckoutQueryHandler: [Update.PRE_CHECKOUT_QUERY],
+    PollHandler: [Update.POLL],
+    PollAnswerHandler: [Update.POLL_ANSWER],
+    ChatJoinRequestHandler: [Update.CHAT_JOIN_REQUEST],
+}
+
+CHAT_MEMBER_UPDATE_TYPES = {
+    ChatMemberHandler.MY_CHAT_MEMBER: [Update.MY_CHAT_MEMBER],
+    ChatMemberHandler.CHAT_MEMBER: [Update.CHAT_MEMBER],
+    ChatMemberHandler.ANY_CHAT_MEMBER: [Update.MY_CHAT_MEMBER, Update.CHAT_MEMBER],
+}
+
+
+def update_type(update: object) -> str:
+    """Update turini aniqlash (masalan: 'message', 'callback_query')"""
+    if isinstance(update, Update):
+        for type_name in Update.ALL_TYPES:
+            if getattr(update, type_name, None) is not None:
+                return str(type_name)
+    return 'other'
+
+
+class UpdateStats:
+    """Update turlari bo'yicha qabul qilingan/qayta ishlangan hisoblagichlar"""
+
+    def __init__(self):
+        self.received = Counter()
+        self.handled = Counter()
+
+    async def count_received(self, update: object, context) -> None:
+        """TypeHandler callback - har bir kelgan updateni sanash"""
+        self.received[update_type(update)] += 1
+
+    def count_handled(self, callback):
+        """Handler callback ini o'rab, qayta ishlangan updatelarni sanash"""
+        @functools.wraps(callback)
+        async def wrapper(update, context):
+            self.handled[update_type(update)] += 1
+            return await callback(update, context)
+        return wrapper
+
+    def install(self, application: Application, group: int = -100) -> None:
+        """Hisoblagichlarni barcha handlerlarga ulash (handlerlar qo'shilgandan keyin)"""
+        for handlers in application.handlers.values():
+            for handler in handlers:
+                if not isinstance(handler, ConversationHandler):
+                    handler.callback = self.count_handled(handler.callback)
+        application.add_handler(TypeHandler(Update, self.count_received), group=group)
+
+    def stats(self) -> dict:
+        """Tur bo'yicha {received, handled}"""
+        return {
+            type_name: {"received": self.received[type_name], "handled": self.handled[type_name]}
+            for type_name in sorted(set(self.received) | set(self.handled))
+        }
+
+
+def _handler_update_types(handler: BaseHandler) -> List[str]:
+    if isinstance(handler, ConversationHandler):
+        nested = list(handler.entry_points) + list(handler.fallbacks)
+        for state_handlers in handler.states.values():
+            nested.extend(state_handlers)
+        return [t for h in nested for t in _handler_update_types(h)]
+    if isinstance(handler, ChatMemberHandler):
+        return CHAT_MEMBER_UPDATE_TYPES[handler.chat_member_types]
+    if isinstance(handler, TypeHandler):
+        return list(Update.ALL_TYPES)
+    for handler_class, types in HANDLER_UPDATE_TYPES.items():
+        if isinstance(handler, handler_class):
+            return types
+    logger.warning(f"{type(handler).__name__} uchun update turi noma'lum - barcha turlar yoqiladi")
+    return list(Update.ALL_TYPES)
+
+
+def derive_allowed_updates(application: Application, stats: UpdateStats = None,
+                           observers: Sequence[Callable] = ()) -> List[str]:
+    """Ro'yxatdan o'tgan handlerlar asosida allowed_updates ro'yxatini hosil qilish
+
+    observers - faqat kuzatuvchi TypeHandler callbacklari (update turlarini kengaytirmaydi)
+    """
+    passive = list(observers)
+    if stats is not None:
+        passive.append(stats.count_received)
+    allowed = set()
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            # Statistika va kuzatuvchi TypeHandlerlar hisobga olinmaydi
+            if isinstance(handler, TypeHandler) and handler.callback in passive:
+                continue
+            allowed.update(_handler_update_types(handler))
+
+    allowed_updates = [str(t) for t in Update.ALL_TYPES if t in allowed]
+    excluded = [str(t) for t in Update.ALL_TYPES if t not in allowed]
+    logger.info(f"allowed_updates: {', '.join(allowed_updates)}")
+    logger.info(f"Yuborilmaydigan update turlari: {', '.join(excluded) or '-'}")
+    return allowed_updates
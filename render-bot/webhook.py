@@ -0,0 +1,145 @@
+"""
+Webhook rejimi - updatelarni o'rnatilgan aiohttp server orqali qabul qilish
+
+Telegram updatelarni to'g'ridan-to'g'ri POST qiladi (getUpdates kutish yo'q),
+shuning uchun bir nechta replika bitta webhook URL ortida ishlashi mumkin.
+
+Endpointlar:
+- POST <WEBHOOK_PATH> - Telegram updatelari (secret token tekshiriladi)
+- GET /health - holat tekshiruvi (Render health check uchun)
+
+To'xtatish signalidan keyin (drain) yangi updatelarga 503 qaytariladi -
+Telegram ularni keyinroq qayta yuboradi, boshlanganlari esa tugatiladi.
+"""
+
+import asyncio
+import hmac
+import json
+import logging
+import signal
+from typing import TYPE_CHECKING, Optional, Sequence
+
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+
+if TYPE_CHECKING:
+    from drain import GracefulDrain
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+def build_web_app(application: Application, url_path: str, secret_token: str,
+                  drain: Optional['GracefulDrain'] = None) -> web.Application:
+    """Webhook va health endpointlari bilan aiohttp ilovasini yaratish"""
+    expected_secret = secret_token.encode()
+
+    async def handle_update(request: web.Request) -> web.Response:
+        received = request.headers.get(SECRET_HEADER, '').encode()
+        if not hmac.compare_digest(received, expected_secret):
+            logger.warning(f"Webhook: noto'g'ri secret token ({request.remote})")
+            return web.Response(status=403)
+        if drain is not None and drain.draining:
+            drain.rejected += 1
+            return web.Response(status=503)
+
+        try:
+            data = await request.json()
+        except json.JSONDecodeError:
+            return web.Response(status=400)
+        if not isinstance(data, dict):
+            return web.Response(status=400)
+
+        try:
+            update = Update.de_json(data, application.bot)
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning(f"Webhook: noto'g'ri update ({e!r})")
+            return web.Response(status=400)
+        if update is not None:
+            await application.update_queue.put(update)
+        return web.Response()
+
+    async def handle_health(request: web.Request) -> web.Response:
+        draining = drain is not None and drain.draining
+        status = 200 if application.running and not draining else 503
+        return web.json_response({
+            "status": "draining" if draining else "ok" if application.running else "starting",
+            "update_queue": application.update_queue.qsize(),
+        }, status=status)
+
+    web_app = web.Application()
+    web_app.router.add_post(url_path, handle_update)
+    web_app.router.add_get('/health', handle_health)
+    return web_app
+
+
+async def serve_webhook(
+    application: Application,
+    *,
+    webhook_url: str,
+    secret_token: str,
+    listen: str = '0.0.0.0',
+    port: int = 10000,
+    url_path: str = '/telegram',
+    max_connections: int = 40,
+    allowed_updates: Optional[Sequence[str]] = None,
+    set_webhook: bool = True,
+    drain: Optional['GracefulDrain'] = None,
+) -> None:
+    """Botni webhook rejimida ishga tushirish (SIGINT/SIGTERM gacha)
+
+    run_polling bilan bir xil tartibda post_init/post_stop/post_shutdown chaqiriladi.
+    set_webhook=False - webhookni boshqa jarayon o'rnatadi (masalan, sharding ingress).
+    drain berilsa, signaldan keyin boshlangan updatelar muddat ichida tugatiladi.
+    """
+    stop_event = asyncio.Event()
+
+    def on_signal() -> None:
+        if stop_event.is_set() and drain is not None:
+            drain.force()
+        stop_event.set()
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, on_signal)
+        except NotImplementedError:
+            pass
+
+    runner = web.AppRunner(build_web_app(application, url_path, secret_token, drain), access_log=None)
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+
+        await runner.setup()
+        site = web.TCPSite(runner, listen, port)
+        await site.start()
+        logger.info(f"Webhook server {listen}:{port}{url_path} da tinglayapti")
+
+        await application.start()
+        if set_webhook:
+            await application.bot.set_webhook(
+                url=webhook_url.rstrip('/') + url_path,
+                secret_token=secret_token,
+                max_connections=max_connections,
+                allowed_updates=allowed_updates,
+            )
+            logger.info(f"Webhook o'rnatildi: max_connections={max_connections}")
+
+        await stop_event.wait()
+        logger.info("To'xtatish signali qabul qilindi")
+        if drain is not None:
+            await drain.drain(application)
+    finally:
+        # Webhook o'chirilmaydi - boshqa replikalar ishlashda davom etadi
+        await runner.cleanup()
+        if application.running:
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
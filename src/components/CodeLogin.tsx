@@ -3,6 +3,18 @@ import { Button } from '@/components/ui/button';
 import { Input } from '@/components/ui/input';
 import { Send, Loader2, ArrowRight } from 'lucide-react';
 
+// 6-digit codes from auth_codes, or signed codes: 20 chars (XXXXX-XXXXX-XXXXX-XXXXX), 23 for very large user ids
+const SIGNED_CODE_LENGTHS = [20, 23];
+const MAX_SIGNED_CODE_LENGTH = 23;
+
+function normalizeCode(value: string): string {
+  return value.toUpperCase().replace(/[^0-9A-Z]/g, '');
+}
+
+function isValidCode(code: string): boolean {
+  return /^\d{6}$/.test(code) || SIGNED_CODE_LENGTHS.includes(code.length);
+}
+
 interface CodeLoginProps {
   onVerify: (code: string) => Promise<boolean>;
   isLoading: boolean;
@@ -17,8 +29,8 @@ export function CodeLogin({ onVerify, isLoading, botName }: CodeLoginProps) {
     e.preventDefault();
     setError('');
     
-    if (code.length !== 6) {
-      setError('Kod 6 ta raqamdan iborat bo\'lishi kerak');
+    if (!isValidCode(code)) {
+      setError('Kod 6 ta raqam yoki botdagi to\'liq koddan iborat bo\'lishi kerak');
       return;
     }
 
@@ -52,7 +64,7 @@ export function CodeLogin({ onVerify, isLoading, botName }: CodeLoginProps) {
           <ArrowRight className="h-4 w-4 ml-auto" />
         </Button>
         <p className="text-xs text-muted-foreground text-center">
-          Botga /start yuboring va 6 raqamli kod oling
+          Botga /start yuboring va kirish kodini oling
         </p>
       </div>
 
@@ -65,17 +77,16 @@ export function CodeLogin({ onVerify, isLoading, botName }: CodeLoginProps) {
         <form onSubmit={handleSubmit} className="space-y-3">
           <Input
             type="text"
-            inputMode="numeric"
-            pattern="[0-9]*"
-            maxLength={6}
-            placeholder="6 raqamli kod"
+            autoCapitalize="characters"
+            autoComplete="one-time-code"
+            maxLength={MAX_SIGNED_CODE_LENGTH + 3}
+            placeholder="Kirish kodi"
             value={code}
             onChange={(e) => {
-              const value = e.target.value.replace(/\D/g, '');
-              setCode(value);
+              setCode(normalizeCode(e.target.value).slice(0, MAX_SIGNED_CODE_LENGTH));
               setError('');
             }}
-            className="text-center text-2xl tracking-[0.5em] font-mono"
+            className={`text-center font-mono ${code.length > 6 ? 'text-base tracking-wider' : 'text-2xl tracking-[0.5em]'}`}
             disabled={isLoading}
           />
           {error && (
@@ -85,7 +96,7 @@ export function CodeLogin({ onVerify, isLoading, botName }: CodeLoginProps) {
             type="submit"
             size="lg"
             className="w-full"
-            disabled={code.length !== 6 || isLoading}
+            disabled={!isValidCode(code) || isLoading}
           >
             {isLoading ? (
               <>
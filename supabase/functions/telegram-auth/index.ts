@@ -11,6 +11,120 @@ function generateCode(): string {
   return Math.floor(100000 + Math.random() * 900000).toString();
 }
 
+// ---- Stateless signed login codes (minted by the bot, see render-bot/login_codes.py) ----
+// Layout (bits, Crockford base32):
+//   telegram_user_id | expiry minute mod 4096 (12 bits) | HMAC-SHA256 (48 bits)
+// 20 chars for user ids up to 40 bits, 23 chars for up to 55 bits. The full expiry
+// minute is recovered as the nearest future minute and covered by the HMAC.
+// verify is not rate-limited, so the MAC is sized for online guessing (~2^47 tries),
+// and codes that expire later than the bot's TTL allows are rejected.
+const LOGIN_CODE_SECRET = Deno.env.get('LOGIN_CODE_SECRET') ?? '';
+const SIGNED_CODE_ID_BITS: Record<number, bigint> = { 20: 40n, 23: 55n };
+const MAC_BITS = 48n;
+const MAC_BYTES = 6;
+const EXPIRY_BITS = 12n;
+// Same as AUTH_CODE_TTL in render-bot; expiry is rounded up to the minute, plus clock skew
+const SIGNED_CODE_TTL = 5 * 60;
+const SIGNED_CODE_CLOCK_SKEW = 60;
+const CROCKFORD = '0123456789ABCDEFGHJKMNPQRSTVWXYZ';
+const encoder = new TextEncoder();
+
+// Shared secret for bot-only actions (sync_profiles, sync_avatars, list_users, record_referrals), sent as X-Bot-Secret
+const BOT_SYNC_SECRET = Deno.env.get('BOT_SYNC_SECRET') ?? '';
+const MAX_PROFILE_BATCH = 1000;
+const MAX_REFERRAL_BATCH = 1000;
+const MAX_USERS_PAGE = 1000;
+
+function isBotRequest(req: Request): boolean {
+  const received = encoder.encode(req.headers.get('x-bot-secret') ?? '');
+  return BOT_SYNC_SECRET !== '' && timingSafeEqual(received, encoder.encode(BOT_SYNC_SECRET));
+}
+
+function normalizeSignedCode(code: string): string {
+  return code.replace(/[\s-]/g, '').toUpperCase().replace(/O/g, '0').replace(/[IL]/g, '1');
+}
+
+function decodeBase32(code: string): bigint | null {
+  let value = 0n;
+  for (const char of code) {
+    const digit = CROCKFORD.indexOf(char);
+    if (digit < 0) return null;
+    value = (value << 5n) | BigInt(digit);
+  }
+  return value;
+}
+
+async function hmacSha256(context: string, data: Uint8Array): Promise<Uint8Array> {
+  const key = await crypto.subtle.importKey(
+    'raw', encoder.encode(LOGIN_CODE_SECRET), { name: 'HMAC', hash: 'SHA-256' }, false, ['sign']
+  );
+  const message = new Uint8Array(context.length + data.length);
+  message.set(encoder.encode(context));
+  message.set(data, context.length);
+  return new Uint8Array(await crypto.subtle.sign('HMAC', key, message));
+}
+
+function timingSafeEqual(a: Uint8Array, b: Uint8Array): boolean {
+  if (a.length !== b.length) return false;
+  let diff = 0;
+  for (let i = 0; i < a.length; i++) diff |= a[i] ^ b[i];
+  return diff === 0;
+}
+
+async function signedCodeMac(telegramUserId: bigint, expiresMinute: number): Promise<Uint8Array> {
+  const payload = new Uint8Array(12);
+  const view = new DataView(payload.buffer);
+  view.setBigUint64(0, telegramUserId);
+  view.setUint32(8, expiresMinute);
+  const digest = await hmacSha256('ravon-login-v3', payload);
+  let mac = 0n;
+  for (const byte of digest.slice(0, MAC_BYTES)) mac = (mac << 8n) | BigInt(byte);
+  return bigintBytes(mac >> (BigInt(MAC_BYTES * 8) - MAC_BITS), MAC_BYTES);
+}
+
+function bigintBytes(value: bigint, length: number): Uint8Array {
+  const bytes = new Uint8Array(length);
+  for (let i = length - 1; i >= 0; i--) {
+    bytes[i] = Number(value & 0xffn);
+    value >>= 8n;
+  }
+  return bytes;
+}
+
+function isSignedCode(code: string): boolean {
+  return code.length in SIGNED_CODE_ID_BITS;
+}
+
+// Returns { telegramUserId, expiresAt } for a valid, unexpired signed code
+async function verifySignedCode(code: string): Promise<{ telegramUserId: number; expiresAt: number } | null> {
+  const idBits = SIGNED_CODE_ID_BITS[code.length];
+  if (!LOGIN_CODE_SECRET || idBits === undefined) return null;
+  const value = decodeBase32(code);
+  if (value === null) return null;
+
+  const mac = value & ((1n << MAC_BITS) - 1n);
+  const expiryLow = Number((value >> MAC_BITS) & ((1n << EXPIRY_BITS) - 1n));
+  const telegramUserId = value >> (MAC_BITS + EXPIRY_BITS);
+  // One code string per (user, expiry): ids that fit the short form are rejected in the long one
+  if (telegramUserId === 0n) return null;
+  for (const bits of Object.values(SIGNED_CODE_ID_BITS)) {
+    if (bits < idBits && telegramUserId < 1n << bits) return null;
+  }
+
+  const now = Date.now() / 1000;
+  const nowMinute = Math.floor(now / 60);
+  const cycle = 2 ** Number(EXPIRY_BITS);
+  const ahead = (((expiryLow - nowMinute) % cycle) + cycle) % cycle;
+  if (ahead >= cycle / 2) return null;
+  const expiresMinute = nowMinute + ahead;
+  const remaining = expiresMinute * 60 - now;
+  if (remaining <= 0 || remaining >= SIGNED_CODE_TTL + 60 + SIGNED_CODE_CLOCK_SKEW) return null;
+
+  const expected = await signedCodeMac(telegramUserId, expiresMinute);
+  if (!timingSafeEqual(bigintBytes(mac, MAC_BYTES), expected)) return null;
+  return { telegramUserId: Number(telegramUserId), expiresAt: expiresMinute * 60 };
+}
+
 serve(async (req) => {
   // Handle CORS preflight
   if (req.method === 'OPTIONS') {
@@ -70,7 +184,8 @@ serve(async (req) => {
         );
       }
 
-      console.log(`Auth code generated successfully: ${code}`);
+      // The code itself is a credential and is never logged
+      console.log(`Auth code generated for Telegram user: ${telegram_user_id}`);
 
       return new Response(
         JSON.stringify({ 
@@ -82,6 +197,187 @@ serve(async (req) => {
       );
     }
 
+    // Action: sync_profiles - Bot flushes its write-behind queue as one bulk upsert
+    if (action === 'sync_profiles') {
+      if (!isBotRequest(req)) {
+        return new Response(
+          JSON.stringify({ error: 'Invalid bot secret' }),
+          { status: 403, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
+        );
+      }
+
+      const { profiles } = body;
+      if (!Array.isArray(profiles) || profiles.length === 0 || profiles.length > MAX_PROFILE_BATCH) {
+        return new Response(
+          JSON.stringify({ error: `profiles must be an array of 1-${MAX_PROFILE_BATCH} items` }),
+          { status: 400, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
+        );
+      }
+
+      // Same keys on every row - photo_url is left untouched
+      const rows = profiles
+        .filter((p) => p && p.telegram_user_id)
+        .map((p) => ({
+          telegram_user_id: p.telegram_user_id.toString(),
+          telegram_first_name: p.telegram_first_name ?? null,
+          telegram_last_name: p.telegram_last_name ?? null,
+          telegram_username: p.telegram_username ?? null,
+          last_seen_at: p.last_seen_at ?? new Date().toISOString(),
+        }));
+
+      const { error } = await supabase
+        .from('users_cache')
+        .upsert(rows, { onConflict: 'telegram_user_id' });
+
+      if (error) {
+        console.error('Error syncing profiles:', error);
+        return new Response(
+          JSON.stringify({ error: 'Failed to sync profiles' }),
+          { status: 500, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
+        );
+      }
+
+      return new Response(
+        JSON.stringify({ success: true, upserted: rows.length }),
+        { status: 200, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
+      );
+    }
+
+    // Action: sync_avatars - Bot flushes changed avatar URLs (signed telegram-avatar links)
+    if (action === 'sync_avatars') {
+      if (!isBotRequest(req)) {
+        return new Response(
+          JSON.stringify({ error: 'Invalid bot secret' }),
+          { status: 403, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
+        );
+      }
+
+      const { avatars } = body;
+      if (!Array.isArray(avatars) || avatars.length === 0 || avatars.length > MAX_PROFILE_BATCH) {
+        return new Response(
+          JSON.stringify({ error: `avatars must be an array of 1-${MAX_PROFILE_BATCH} items` }),
+          { status: 400, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
+        );
+      }
+
+      // Only the photo column - names and last_seen_at are left untouched
+      const rows = avatars
+        .filter((a) => a && a.telegram_user_id)
+        .map((a) => ({
+          telegram_user_id: a.telegram_user_id.toString(),
+          telegram_photo_url: a.telegram_photo_url ?? null,
+        }));
+
+      const { error } = await supabase
+        .from('users_cache')
+        .upsert(rows, { onConflict: 'telegram_user_id' });
+
+      if (error) {
+        console.error('Error syncing avatars:', error);
+        return new Response(
+          JSON.stringify({ error: 'Failed to sync avatars' }),
+          { status: 500, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
+        );
+      }
+
+      return new Response(
+        JSON.stringify({ success: true, upserted: rows.length }),
+        { status: 200, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
+      );
+    }
+
+    // Action: record_referrals - Bot flushes queued deep-link attributions; first referrer wins
+    if (action === 'record_referrals') {
+      if (!isBotRequest(req)) {
+        return new Response(
+          JSON.stringify({ error: 'Invalid bot secret' }),
+          { status: 403, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
+        );
+      }
+
+      const { referrals } = body;
+      if (!Array.isArray(referrals) || referrals.length === 0 || referrals.length > MAX_REFERRAL_BATCH) {
+        return new Response(
+          JSON.stringify({ error: `referrals must be an array of 1-${MAX_REFERRAL_BATCH} items` }),
+          { status: 400, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
+        );
+      }
+
+      const rows = referrals
+        .filter((r) => r && r.referred_telegram_user_id && r.referrer_telegram_user_id
+          && r.referred_telegram_user_id !== r.referrer_telegram_user_id)
+        .map((r) => ({
+          referred_telegram_user_id: r.referred_telegram_user_id,
+          referrer_telegram_user_id: r.referrer_telegram_user_id,
+          created_at: r.created_at ?? new Date().toISOString(),
+        }));
+
+      if (rows.length === 0) {
+        return new Response(
+          JSON.stringify({ success: true, inserted: 0, received: referrals.length }),
+          { status: 200, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
+        );
+      }
+
+      const { data: inserted, error } = await supabase
+        .from('referrals')
+        .upsert(rows, { onConflict: 'referred_telegram_user_id', ignoreDuplicates: true })
+        .select('referred_telegram_user_id');
+
+      if (error) {
+        console.error('Error recording referrals:', error);
+        return new Response(
+          JSON.stringify({ error: 'Failed to record referrals' }),
+          { status: 500, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
+        );
+      }
+
+      return new Response(
+        JSON.stringify({ success: true, inserted: inserted?.length ?? 0, received: referrals.length }),
+        { status: 200, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
+      );
+    }
+
+    // Action: list_users - Bot pages through users_cache for admin broadcasts (keyset pagination)
+    if (action === 'list_users') {
+      if (!isBotRequest(req)) {
+        return new Response(
+          JSON.stringify({ error: 'Invalid bot secret' }),
+          { status: 403, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
+        );
+      }
+
+      const after = typeof body.after === 'string' ? body.after : '';
+      const limit = Math.min(Math.max(Number(body.limit) || MAX_USERS_PAGE, 1), MAX_USERS_PAGE);
+
+      let query = supabase
+        .from('users_cache')
+        .select('telegram_user_id', body.with_count ? { count: 'exact' } : undefined)
+        .order('telegram_user_id')
+        .limit(limit);
+      if (after) {
+        query = query.gt('telegram_user_id', after);
+      }
+
+      const { data, error, count } = await query;
+      if (error) {
+        console.error('Error listing users:', error);
+        return new Response(
+          JSON.stringify({ error: 'Failed to list users' }),
+          { status: 500, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
+        );
+      }
+
+      return new Response(
+        JSON.stringify({
+          success: true,
+          users: (data ?? []).map((row) => row.telegram_user_id),
+          total: count ?? null,
+        }),
+        { status: 200, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
+      );
+    }
+
     // Action: verify - Web app calls this to verify a code
     if (action === 'verify') {
       const { code } = body;
@@ -93,7 +389,64 @@ serve(async (req) => {
         );
       }
 
-      console.log(`Verifying auth code: ${code}`);
+      // Signed codes: validated without a table lookup, replay blocked by one INSERT
+      const signedCode = normalizeSignedCode(String(code));
+      if (isSignedCode(signedCode)) {
+        const signed = await verifySignedCode(signedCode);
+        if (!signed) {
+          return new Response(
+            JSON.stringify({
+              error: 'Kod topilmadi yoki muddati tugagan. Iltimos, botdan yangi kod oling.',
+              valid: false
+            }),
+            { status: 400, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
+          );
+        }
+
+        const { error: redeemError } = await supabase
+          .from('login_code_redemptions')
+          .insert({
+            code: signedCode,
+            telegram_user_id: signed.telegramUserId,
+            expires_at: new Date(signed.expiresAt * 1000).toISOString(),
+          });
+
+        if (redeemError) {
+          const replay = redeemError.code === '23505';
+          console.log(replay ? 'Signed code already used' : `Error redeeming signed code: ${redeemError.message}`);
+          return new Response(
+            JSON.stringify({
+              error: replay
+                ? 'Bu kod allaqachon ishlatilgan. Iltimos, botdan yangi kod oling.'
+                : 'Failed to verify code',
+              valid: false
+            }),
+            { status: replay ? 400 : 500, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
+          );
+        }
+
+        const { data: profile } = await supabase
+          .from('users_cache')
+          .select('telegram_first_name, telegram_last_name, telegram_username, telegram_photo_url')
+          .eq('telegram_user_id', signed.telegramUserId.toString())
+          .maybeSingle();
+
+        console.log(`Signed auth code verified for user: ${signed.telegramUserId}`);
+
+        return new Response(
+          JSON.stringify({
+            valid: true,
+            user: {
+              telegramUserId: signed.telegramUserId,
+              firstName: profile?.telegram_first_name ?? 'Foydalanuvchi',
+              lastName: profile?.telegram_last_name ?? null,
+              username: profile?.telegram_username ?? null,
+              photoUrl: profile?.telegram_photo_url ?? null,
+            }
+          }),
+          { status: 200, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
+        );
+      }
 
       // Clean up expired codes first
       await supabase.rpc('cleanup_expired_auth_codes');
@@ -124,17 +477,20 @@ serve(async (req) => {
         .update({ used: true })
         .eq('id', authCode.id);
 
-      // Update users_cache for future lookups
-      await supabase
+      // Update users_cache for future lookups; an avatar synced by the bot is kept
+      // when the code was generated before it was resolved
+      const { data: cached } = await supabase
         .from('users_cache')
         .upsert({
           telegram_user_id: authCode.telegram_user_id.toString(),
           telegram_username: authCode.telegram_username,
           telegram_first_name: authCode.telegram_first_name,
           telegram_last_name: authCode.telegram_last_name,
-          telegram_photo_url: authCode.telegram_photo_url,
+          ...(authCode.telegram_photo_url ? { telegram_photo_url: authCode.telegram_photo_url } : {}),
           last_seen_at: new Date().toISOString()
-        }, { onConflict: 'telegram_user_id' });
+        }, { onConflict: 'telegram_user_id' })
+        .select('telegram_photo_url')
+        .maybeSingle();
 
       console.log(`Auth code verified successfully for user: ${authCode.telegram_user_id}`);
 
@@ -146,7 +502,7 @@ serve(async (req) => {
             firstName: authCode.telegram_first_name,
             lastName: authCode.telegram_last_name,
             username: authCode.telegram_username,
-            photoUrl: authCode.telegram_photo_url,
+            photoUrl: cached?.telegram_photo_url ?? authCode.telegram_photo_url,
           }
         }),
         { status: 200, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
@@ -154,7 +510,7 @@ serve(async (req) => {
     }
 
     return new Response(
-      JSON.stringify({ error: 'Invalid action. Use "generate" or "verify"' }),
+      JSON.stringify({ error: 'Invalid action. Use "generate", "verify", "sync_profiles", "sync_avatars", "list_users" or "record_referrals"' }),
       { status: 400, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
     );
 
@@ -0,0 +1,83 @@
+import { serve } from "https://deno.land/std@0.190.0/http/server.ts";
+
+// Serves Telegram profile photos without exposing the bot token.
+// Telegram file URLs embed the token and expire after about an hour, so the bots
+// store /functions/v1/telegram-avatar?f=<file_id>&s=<signature> in
+// users_cache.telegram_photo_url instead; the signature (AVATAR_SECRET, shared
+// with the bots) keeps this from being an open proxy for arbitrary file ids.
+
+const corsHeaders = {
+  'Access-Control-Allow-Origin': '*',
+  'Access-Control-Allow-Headers': 'authorization, x-client-info, apikey, content-type',
+};
+
+const AVATAR_SECRET = Deno.env.get('AVATAR_SECRET') ?? '';
+const BOT_TOKEN = Deno.env.get('TELEGRAM_BOT_TOKEN') ?? '';
+const SIGNATURE_SIZE = 16;
+// file_id content never changes, so browsers and the CDN may keep it for long
+const CACHE_CONTROL = 'public, max-age=604800, immutable';
+const encoder = new TextEncoder();
+
+function base64url(bytes: Uint8Array): string {
+  return btoa(String.fromCharCode(...bytes)).replace(/\+/g, '-').replace(/\//g, '_').replace(/=+$/, '');
+}
+
+function timingSafeEqual(a: Uint8Array, b: Uint8Array): boolean {
+  if (a.length !== b.length) return false;
+  let diff = 0;
+  for (let i = 0; i < a.length; i++) diff |= a[i] ^ b[i];
+  return diff === 0;
+}
+
+async function sign(fileId: string): Promise<string> {
+  const key = await crypto.subtle.importKey(
+    'raw', encoder.encode(AVATAR_SECRET), { name: 'HMAC', hash: 'SHA-256' }, false, ['sign']
+  );
+  const mac = new Uint8Array(await crypto.subtle.sign('HMAC', key, encoder.encode(`ravon-avatar-v1:${fileId}`)));
+  return base64url(mac.slice(0, SIGNATURE_SIZE));
+}
+
+function notFound(status = 404): Response {
+  return new Response(null, { status, headers: corsHeaders });
+}
+
+serve(async (req) => {
+  if (req.method === 'OPTIONS') {
+    return new Response(null, { headers: corsHeaders });
+  }
+  if (req.method !== 'GET' || !AVATAR_SECRET || !BOT_TOKEN) {
+    return notFound();
+  }
+
+  const url = new URL(req.url);
+  const fileId = url.searchParams.get('f') ?? '';
+  const signature = url.searchParams.get('s') ?? '';
+  if (!fileId || !timingSafeEqual(encoder.encode(signature), encoder.encode(await sign(fileId)))) {
+    return notFound(403);
+  }
+
+  try {
+    const fileResponse = await fetch(`https://api.telegram.org/bot${BOT_TOKEN}/getFile?file_id=${encodeURIComponent(fileId)}`);
+    const file = await fileResponse.json();
+    if (!file.ok || !file.result?.file_path) {
+      return notFound();
+    }
+
+    const image = await fetch(`https://api.telegram.org/file/bot${BOT_TOKEN}/${file.result.file_path}`);
+    if (!image.ok || !image.body) {
+      return notFound(502);
+    }
+
+    return new Response(image.body, {
+      status: 200,
+      headers: {
+        ...corsHeaders,
+        'Content-Type': image.headers.get('content-type') ?? 'image/jpeg',
+        'Cache-Control': CACHE_CONTROL,
+      },
+    });
+  } catch (error) {
+    console.error('Error fetching avatar:', error instanceof Error ? error.message : 'unknown');
+    return notFound(502);
+  }
+});
@@ -0,0 +1,28 @@
+-- Redeemed stateless (HMAC-signed) login codes.
+-- Signed codes are validated without a table lookup; a single INSERT here
+-- rejects replays (primary key conflict) until the code expires.
+CREATE TABLE IF NOT EXISTS public.login_code_redemptions (
+  code TEXT NOT NULL PRIMARY KEY,
+  telegram_user_id BIGINT NOT NULL,
+  expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+  redeemed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+);
+
+-- Enable RLS (edge functions only, service role)
+ALTER TABLE public.login_code_redemptions ENABLE ROW LEVEL SECURITY;
+
+CREATE INDEX IF NOT EXISTS idx_login_code_redemptions_expires_at
+  ON public.login_code_redemptions(expires_at);
+
+-- Expired redemptions can no longer be replayed, clean them up with the codes
+CREATE OR REPLACE FUNCTION public.cleanup_expired_auth_codes()
+RETURNS void
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  DELETE FROM public.auth_codes WHERE expires_at < now();
+  DELETE FROM public.login_code_redemptions WHERE expires_at < now();
+END;
+$$;
@@ -0,0 +1,15 @@
+-- Deep-link referral attributions (t.me/<bot>?start=ref_<referrer_id>).
+-- Written in batches by the bot via telegram-auth (action record_referrals).
+-- One row per invitee: the first referrer wins, later links are ignored.
+CREATE TABLE IF NOT EXISTS public.referrals (
+  referred_telegram_user_id BIGINT NOT NULL PRIMARY KEY,
+  referrer_telegram_user_id BIGINT NOT NULL,
+  created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+  CHECK (referred_telegram_user_id <> referrer_telegram_user_id)
+);
+
+-- Enable RLS (edge functions only, service role)
+ALTER TABLE public.referrals ENABLE ROW LEVEL SECURITY;
+
+CREATE INDEX IF NOT EXISTS idx_referrals_referrer
+  ON public.referrals(referrer_telegram_user_id);